@@ -0,0 +1,54 @@
+
+'''compares decoding whole columns with codec against from_field one value at a time
+
+usage: python benchmarks/bench_codec.py [years]'''
+
+import os
+import sys
+import random
+from time import perf_counter
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spacew'))
+
+from database import to_field, from_field, intlist, timelist
+from codec import decode_column
+from synthetic import synthetic_rows
+
+
+def synthetic_columns(days: int, seed: int = 0) -> dict[str, tuple[type, list[str]]]:
+    '''encodes some fields of synthetic daily rows, with some nulls'''
+    rng = random.Random(seed)
+    columns = {'date': (date, []), 'f107': (int, []), 'kp': (intlist, []), 'ap': (intlist, []), \
+               'regions': (intlist, []), 'flare_starts': (timelist, [])}
+    start = date(1932, 1, 1)
+    for day, fields in synthetic_rows(start, start + timedelta(days=days), seed):
+        fields['date'] = day
+        for name, (_, out) in columns.items():
+            out.append(to_field(None if rng.random() < 0.02 else fields[name]))
+    columns['wind_speed'] = (float, [to_field(None if rng.random() < 0.02 else rng.uniform(250, 900)) \
+                                     for _ in range(days)])
+    return columns
+
+
+def bench(func, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main(years: int = 90) -> None:
+    columns = synthetic_columns(years * 365)
+    print(f'{years} years, {years * 365} rows')
+    print(f'{"column":<14}{"from_field":>12}{"codec":>12}{"speedup":>10}')
+    for name, (dtype, fields) in columns.items():
+        scalar = bench(lambda: [from_field(field, dtype) for field in fields])
+        vector = bench(lambda: decode_column(fields, dtype))
+        print(f'{name:<14}{scalar * 1000:>10.1f}ms{vector * 1000:>10.1f}ms{scalar / vector:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
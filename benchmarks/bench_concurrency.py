@@ -0,0 +1,84 @@
+
+'''hammers one database with concurrent writer and reader processes
+
+every save sets a field of every row to the same new value, so a reader that sees more than one
+value in a database it opened has seen a half written state
+
+usage: python benchmarks/bench_concurrency.py [writers] [readers] [seconds] [sdb|sdbc]'''
+
+import os
+import sys
+import shutil
+import tempfile
+import multiprocessing
+from time import perf_counter
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spacew'))
+
+from database import Database
+
+ROWS = 100
+
+
+def writer(filename: str, number: int, seconds: float, results) -> None:
+    db = Database(filename)
+    saves = 0
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        value = number * 1000000 + saves
+        for index in range(len(db)):
+            row = db[index]
+            row.v = value
+            row.save()
+        db.save()
+        saves += 1
+    results.put(('write', saves, 0))
+
+
+def reader(filename: str, seconds: float, results) -> None:
+    reads = bad = 0
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        if reads % 2:
+            values = {row.v for row in Database.scan(filename, fields=('v',))}
+        else:
+            values = set(Database(filename).column('v'))
+        reads += 1
+        if len(values) != 1:
+            bad += 1
+    results.put(('read', reads, bad))
+
+
+def main(writers: int = 2, readers: int = 6, seconds: float = 5, fmt: str = 'sdb') -> None:
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, f'bench.{fmt}')
+        db = Database(filename, {'v': int}, date)
+        for day in range(ROWS):
+            row = db.new_row(date(2000, 1, 1) + timedelta(days=day))
+            row.v = 0
+            row.save()
+        db.save()
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=writer, args=(filename, i + 1, seconds, results)) for i in range(writers)]
+        procs += [multiprocessing.Process(target=reader, args=(filename, seconds, results)) for _ in range(readers)]
+        for proc in procs:
+            proc.start()
+        totals = {'write': [0, 0], 'read': [0, 0]}
+        for _ in procs:
+            kind, count, bad = results.get()
+            totals[kind][0] += count
+            totals[kind][1] += bad
+        for proc in procs:
+            proc.join()
+        print(f'{fmt}, {writers} writers, {readers} readers, {seconds}s, {ROWS} rows written per save')
+        print(f'saves: {totals["write"][0] / seconds:.1f}/s')
+        print(f'reads: {totals["read"][0] / seconds:.1f}/s, inconsistent: {totals["read"][1]}')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(*[int(arg) for arg in args[:2]], *[float(arg) for arg in args[2:3]], *args[3:4])
@@ -0,0 +1,103 @@
+'''latency and throughput of the prediction server under concurrent clients, on the cpu
+
+the server runs in its own process on synthetic databases. without --model it serves a numpy
+model with the forecaster's input and output shapes, so what's measured is the server and not
+keras, with --model it serves that keras model (trained on the same fields). each client asks for
+predictions one day at a time, first with an empty prediction cache and then with a warm one
+
+usage: python benchmarks/bench_predict.py [clients] [requests per client] [--model file]'''
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from time import perf_counter, sleep
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spacew'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spacew-old'))
+
+import numpy as np
+
+import predict
+from windows import Windows
+from synthetic import make_database
+
+YEARS = (2021, 2022)
+
+
+class Linear:
+    '''a stand in for the keras model, the mean of the window times a fixed matrix'''
+
+    def __init__(self, features: int, outputs: int) -> None:
+        self.weights = np.random.default_rng(0).normal(size=(features, outputs)).astype(np.float32)
+
+    def predict(self, x: np.ndarray, verbose: int = 0) -> np.ndarray:
+        return x.mean(axis=1) @ self.weights
+
+
+def server(directory: str, model_file: str, socket_file: str, stand_in: bool) -> None:
+    predictor = predict.Predictor(model_file, directory, model=Linear(1, 1) if stand_in else None)
+    if stand_in:
+        predictor.model = Linear(len(predictor.stats['names']), predictor.horizon * 8)
+    predict.serve(socket_file, predictor)
+
+
+def clients(socket_file: str, days: list[date], count: int, requests: int) -> tuple[float, list[float]]:
+    latencies = []
+    lock = threading.Lock()
+    def client(number: int) -> None:
+        out = []
+        for day in days[number::count][:requests]:
+            start = perf_counter()
+            predict.request([day], socket_file)
+            out.append(perf_counter() - start)
+        with lock:
+            latencies.extend(out)
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(count)]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return perf_counter() - start, sorted(latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='measures the prediction server under concurrent clients')
+    parser.add_argument('clients', type=int, nargs='?', default=16, help='concurrent clients')
+    parser.add_argument('requests', type=int, nargs='?', default=40, help='requests per client')
+    parser.add_argument('--model', help='a keras model saved by ai.py, with its json file')
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        for year in YEARS:
+            make_database(os.path.join(directory, f'{year}.sdb'), date(year, 1, 1), date(year + 1, 1, 1), seed=year)
+        model_file = args.model
+        if model_file is None:
+            model_file = os.path.join(directory, 'model.keras')
+            predict.save_meta(model_file, Windows(directory))
+        socket_file = os.path.join(directory, 'predict.sock')
+        proc = multiprocessing.Process(target=server, args=(directory, model_file, socket_file, args.model is None))
+        proc.start()
+        while not os.path.exists(socket_file):
+            sleep(0.01)
+        # every request is for a different day, so a different window, until the cache is warm
+        first = date(YEARS[0], 2, 1)
+        days = [first + timedelta(days=i) for i in range(args.clients * args.requests)]
+        print(f'{args.clients} clients, {args.requests} requests each, {"stand in" if args.model is None else "keras"} model')
+        for name in ('cold', 'warm'):
+            seconds, latencies = clients(socket_file, days, args.clients, args.requests)
+            print(f'{name}: {len(latencies) / seconds:.0f} requests/s, latency p50 {latencies[len(latencies) // 2] * 1000:.2f}ms ' \
+                  f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f}ms max {latencies[-1] * 1000:.2f}ms')
+        proc.terminate()
+        proc.join()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
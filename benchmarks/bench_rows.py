@@ -0,0 +1,75 @@
+
+'''compares the slotted row classes against the old dict backed Row, for memory and attribute access
+
+usage: python benchmarks/bench_rows.py [years]'''
+
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spacew'))
+
+from database import row_class
+from spacew_db import SCHEMA
+
+
+class DictRow:
+    '''the Row from before row_class, kept here for comparison'''
+
+    def __init__(self, db, name, fields):
+        self._db = db
+        self.name = name
+        self._fields = fields
+
+    def __getattr__(self, attr):
+        if attr in self._fields:
+            return self._fields[attr]
+        else:
+            raise AttributeError(f'attribute not found: \'{attr}\'')
+
+    def __setattr__(self, attr, value):
+        if attr.startswith('_') or attr == 'name':
+            self.__dict__[attr] = value
+        elif attr in self._fields:
+            self._fields[attr] = value
+        else:
+            self.__dict__[attr] = value
+
+
+def materialize(cls, days: int) -> tuple[list, float, int]:
+    start = date(1932, 1, 1)
+    values = {field: None for field in SCHEMA}
+    tracemalloc.start()
+    t = perf_counter()
+    rows = [cls(None, start + timedelta(days=i), dict(values)) for i in range(days)]
+    elapsed = perf_counter() - t
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return rows, elapsed, size
+
+
+def access(rows: list, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t = perf_counter()
+        for row in rows:
+            row.kp
+            row.f107
+            row.wind_speed
+        best = min(best, perf_counter() - t)
+    return best
+
+
+def main(years: int = 30) -> None:
+    days = years * 365
+    print(f'{years} years, {days} rows of {len(SCHEMA)} fields')
+    print(f'{"row":<10}{"memory":>12}{"build":>12}{"3 attrs/row":>14}')
+    for label, cls in (('dict', DictRow), ('slots', row_class(tuple(SCHEMA)))):
+        rows, build, size = materialize(cls, days)
+        print(f'{label:<10}{size / 1e6:>10.1f}MB{build * 1000:>10.1f}ms{access(rows) * 1000:>12.1f}ms')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
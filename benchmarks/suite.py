@@ -0,0 +1,229 @@
+
+'''the benchmark suite for the database and ingestion layers, it runs offline on synthetic data
+
+usage: python benchmarks/suite.py [--scale 1y,30y,full] [--out results.json] [--compare old.json]
+
+each benchmark reports its best time over a few runs and its peak memory from a separate run under
+tracemalloc. results are written as json, and --compare prints the ratio to an earlier run and
+flags regressions. the pipeline benchmarks give the training windows' throughput in samples per
+second, they run on the cpu and don't need tensorflow. the startup benchmarks time whole processes, a cli query answered from a warm
+cache is flagged if it takes more than STARTUP_BUDGET longer than starting python itself'''
+
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from time import perf_counter
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'spacew'))
+sys.path.insert(0, os.path.join(ROOT, 'spacew-old'))
+
+from cache import CacheStore
+from database import Database
+from dataset import Dataset
+from rollup import rollup_file, load as load_rollups
+from windows import Windows, column_stats, STATS
+from spacew_db import load_txt_data
+from textdata import TextFile, GFZ_KP, SWPC_DSD, SWPC_DPD
+from synthetic import SCALES, SWPC_FIRST_DATE, days_of, make_database, gfz_text, dsd_text, dpd_text
+
+# a benchmark this much slower than in the compared run is reported as a regression
+REGRESSION = 1.2
+# seconds a cached cli query may take on top of starting python
+STARTUP_BUDGET = 0.1
+
+
+def measure(func, repeat: int = 3) -> dict[str, float]:
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        best = min(best, perf_counter() - start)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': best, 'peak_bytes': peak}
+
+
+def database_benchmarks(directory: str, scale: str, years: int) -> dict[str, dict[str, float]]:
+    start, end = days_of(years)
+    out = {}
+    rng = random.Random(0)
+    days = [start + timedelta(days=rng.randrange((end - start).days)) for _ in range(1000)]
+    window = (end - timedelta(days=365), end)
+    for fmt in ('sdb', 'sdbc'):
+        filename = os.path.join(directory, f'{scale}.{fmt}')
+        make_database(filename, start, end)
+        db = Database(filename)
+        def lookup():
+            for day in days:
+                db[day].kp
+        def save():
+            row = db[days[0]]
+            row.f107 = row.f107 + 1
+            row.save()
+            db.save()
+        out[f'{fmt}.open'] = measure(lambda: Database(filename))
+        out[f'{fmt}.lookup_1000'] = measure(lookup)
+        out[f'{fmt}.range_1y'] = measure(lambda: [row.kp for row in db.range(*window)])
+        out[f'{fmt}.scan_kp'] = measure(lambda: [row.kp for row in Database.scan(filename, fields=('kp',))])
+        out[f'{fmt}.column_f107'] = measure(lambda: list(db.column('f107')))
+        out[f'{fmt}.array_kp'] = measure(lambda: db.array('kp'))
+        out[f'{fmt}.to_arrays_1y'] = measure(lambda: db.to_arrays(('kp', 'ap', 'f107', 'regions'), *window))
+        out[f'{fmt}.save_1_row'] = measure(save)
+        out[f'{fmt}.compact'] = measure(db.compact)
+        def build_rollups():
+            if os.path.exists(rollup_file(filename)):
+                os.remove(rollup_file(filename))
+            load_rollups(filename)
+        def scan_months():
+            months = {}
+            for row in Database.scan(filename, fields=('f107',)):
+                months.setdefault((row.name.year, row.name.month), []).append(row.f107)
+            return {month: sum(values) / len(values) for month, values in months.items()}
+        out[f'{fmt}.rollup_build'] = measure(build_rollups)
+        out[f'{fmt}.scan_month_f107'] = measure(scan_months)
+        out[f'{fmt}.aggregate_month_f107'] = measure(lambda: db.aggregate('month', ('f107',)))
+        out[f'{fmt}.save_1_row_rollups'] = measure(save)
+    return out
+
+
+def pipeline_benchmarks(directory: str, scale: str, years: int) -> dict[str, dict[str, float]]:
+    '''one epoch of training windows from a dataset of per year shards'''
+    shards = os.path.join(directory, f'{scale}-shards')
+    os.makedirs(shards)
+    start, end = days_of(years)
+    for year in range(start.year, end.year):
+        make_database(os.path.join(shards, f'{year}.sdb'), date(year, 1, 1), date(year + 1, 1, 1), seed=year)
+    dataset = Dataset(shards)
+    def stats():
+        os.remove(os.path.join(shards, STATS))
+        column_stats(dataset)
+    column_stats(dataset)
+    windows = Windows(dataset, seed=0)
+    out = {
+        'pipeline.stats': measure(stats),
+        'pipeline.epoch': measure(lambda: sum(len(y) for _, y in windows)),
+    }
+    out['pipeline.epoch']['samples_per_second'] = windows.samples / out['pipeline.epoch']['seconds']
+    return out
+
+
+def parse_benchmarks(years: int) -> dict[str, dict[str, float]]:
+    start, end = days_of(years, date.today())
+    gfz = gfz_text(start, end)
+    last = end - timedelta(days=30)
+    out = {
+        'parse.gfz_all': measure(lambda: load_txt_data(gfz, start, end - timedelta(days=1), None, mul=8)),
+        'parse.gfz_30d': measure(lambda: load_txt_data(gfz, last, end - timedelta(days=1), None, mul=8)),
+        'stream.gfz_all': measure(lambda: list(TextFile(gfz, GFZ_KP).records())),
+        'stream.gfz_30d': measure(lambda: list(TextFile(gfz, GFZ_KP).records(last, end))),
+    }
+    warehouse = range(max(start.year, SWPC_FIRST_DATE.year), end.year)
+    if warehouse:
+        dsd = [dsd_text(year) for year in warehouse]
+        dpd = [dpd_text(year) for year in warehouse]
+        def parse(texts):
+            for year, text in zip(warehouse, texts):
+                load_txt_data(text, date(year, 1, 1), date(year, 12, 31), date(year, 1, 1))
+        out['parse.dsd'] = measure(lambda: parse(dsd))
+        out['parse.dpd'] = measure(lambda: parse(dpd))
+        out['stream.dsd'] = measure(lambda: [list(TextFile(text, SWPC_DSD).records()) for text in dsd])
+        out['stream.dpd'] = measure(lambda: [list(TextFile(text, SWPC_DPD).records()) for text in dpd])
+    return out
+
+
+def startup_benchmarks(directory: str) -> dict[str, dict[str, float]]:
+    '''times whole processes, a cli query for today with everything it needs fresh in the cache'''
+    home = os.path.join(directory, 'home')
+    cache = CacheStore(os.path.join(home, '.spacew', 'cache'))
+    today = date.today()
+    cache.put('gfz/Kp_ap_since_1932.txt', gfz_text(end=today - timedelta(days=1)), 3600)
+    cache.put('gfz/Kp_ap_nowcast.txt', gfz_text(today - timedelta(days=30), today + timedelta(days=1), seed=1), 3600)
+    forecast = ['#'] * 14 + [f'{hour:02}-{hour + 3:02}UT       2.33       3.00       1.67' for hour in range(0, 24, 3)]
+    cache.put('swpc/3-day-forecast.txt', '\n'.join(forecast) + '\n', 3600)
+    env = dict(os.environ, HOME=home)
+    def process(*args):
+        return lambda: subprocess.run([sys.executable, *args], env=env, stdout=subprocess.DEVNULL, check=True)
+    spacew = os.path.join(ROOT, 'spacew')
+    return {
+        'startup.python': measure(process('-c', 'pass'), 5),
+        'startup.import_database': measure(process('-c', f'import sys; sys.path.insert(0, {spacew!r}); import database'), 5),
+        'startup.import_dataset': measure(process('-c', f'import sys; sys.path.insert(0, {spacew!r}); import dataset'), 5),
+        'startup.cli_cached': measure(process(os.path.join(ROOT, 'spacew-old', 'main.py'), '--nocolor'), 5),
+    }
+
+
+def run(scales: list[str]) -> dict:
+    results = {}
+    directory = tempfile.mkdtemp()
+    try:
+        results |= startup_benchmarks(directory)
+        for scale in scales:
+            years = SCALES[scale]
+            print(f'{scale}: {years} years', file=sys.stderr)
+            for name, result in (database_benchmarks(directory, scale, years) | parse_benchmarks(years) | \
+                                 pipeline_benchmarks(directory, scale, years)).items():
+                results[f'{scale}.{name}'] = result
+    finally:
+        shutil.rmtree(directory)
+    return {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scales': scales,
+        },
+        'results': results,
+    }
+
+
+def report(results: dict, compare: dict | None = None) -> None:
+    old = compare['results'] if compare else {}
+    for name, result in results['results'].items():
+        line = f'{name:<32}{result["seconds"] * 1000:>11.2f}ms{result["peak_bytes"] / 1e6:>10.2f}MB'
+        if 'samples_per_second' in result:
+            line += f'{result["samples_per_second"]:>10.0f}/s'
+        if name in old:
+            ratio = result['seconds'] / old[name]['seconds']
+            line += f'{ratio:>8.2f}x'
+            if ratio > REGRESSION:
+                line += '  regression'
+        print(line)
+    startup = results['results'].get('startup.cli_cached')
+    if startup is not None:
+        overhead = startup['seconds'] - results['results']['startup.python']['seconds']
+        line = f'{"startup overhead":<32}{overhead * 1000:>11.2f}ms'
+        if overhead > STARTUP_BUDGET:
+            line += f'  over the {STARTUP_BUDGET * 1000:.0f}ms budget'
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='runs the database and ingestion benchmarks')
+    parser.add_argument('--scale', default='1y,30y', help=f'comma separated scales ({",".join(SCALES)})')
+    parser.add_argument('--out', help='write the results to this json file')
+    parser.add_argument('--compare', help='compare against the results in this json file')
+    args = parser.parse_args()
+    results = run(args.scale.split(','))
+    compare = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            compare = json.load(file)
+    report(results, compare)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+
+'''deterministic synthetic space weather data, shaped like the real sources, for the benchmarks'''
+
+import os
+import sys
+import random
+from datetime import date, time, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spacew'))
+
+from database import Database
+from spacew_db import SCHEMA
+
+
+GFZ_FIRST_DATE = date(1932, 1, 1)
+SWPC_FIRST_DATE = date(1996, 1, 1)
+
+# ap for each kp in thirds, 0 to 9+
+KP_AP = (0, 2, 3, 4, 5, 6, 7, 9, 12, 15, 18, 22, 27, 32, 39, 48, 56, 67, 80, 94, 111, 132, 154, 179, 207, 236, 300, 400, 500)
+# quiet days are far more common than storms
+KP_WEIGHTS = [max(1, 400 // (kp + 1) ** 2) for kp in range(len(KP_AP))]
+
+SCALES = {
+    '1y': 1,
+    '30y': 30,
+    'full': date.today().year - GFZ_FIRST_DATE.year + 1,
+}
+
+
+def days_of(years: int, end: date | None = None) -> tuple[date, date]:
+    '''the start and end dates of a span of whole years ending with the current year'''
+    if end is None:
+        end = date(date.today().year + 1, 1, 1)
+    return date(end.year - years, 1, 1), end
+
+
+def kps(rng: random.Random, n: int = 8) -> list[int]:
+    return rng.choices(range(len(KP_AP)), KP_WEIGHTS, k=n)
+
+
+def synthetic_rows(start: date, end: date, seed: int = 0):
+    '''yields (date, fields) for each day, with values for every field of the daily schema'''
+    rng = random.Random(seed)
+    day = start
+    while day < end:
+        kp = kps(rng)
+        nregions = rng.randint(0, 12)
+        nflares = rng.randint(0, 6)
+        starts = sorted(time(rng.randint(0, 23), rng.randint(0, 59)) for _ in range(nflares))
+        fields = {
+            'spots': rng.randint(0, 300),
+            'f107': rng.randint(64, 300),
+            'new_regions': rng.randint(0, 3),
+            'bg_flux': f'{rng.choice("ABC")}{rng.uniform(1, 9.9):.1f}',
+            'max_flux': f'{rng.choice("BCMX")}{rng.uniform(1, 9.9):.1f}',
+            'c_flares': rng.randint(0, 10),
+            'm_flares': rng.randint(0, 3),
+            'x_flares': rng.choice((0, 0, 0, 0, 1)),
+            'regions': [rng.randint(10000, 14000) for _ in range(nregions)],
+            'region_spots': [rng.randint(1, 40) for _ in range(nregions)],
+            'region_sizes': [rng.randint(10, 900) for _ in range(nregions)],
+            'region_mags': [rng.choice(('A', 'B', 'BG', 'BGD')) for _ in range(nregions)],
+            'region_zmcls': [rng.choice(('Axx', 'Bxo', 'Cso', 'Dai', 'Ekc')) for _ in range(nregions)],
+            'region_locs': [f'{rng.choice("NS")}{rng.randint(0, 40):02}{rng.choice("EW")}{rng.randint(0, 90):02}' \
+                            for _ in range(nregions)],
+            'kp': kp,
+            'ap': [KP_AP[value] for value in kp],
+            'noaa_kp': [value // 3 for value in kp],
+            'flare_regions': [rng.randint(10000, 14000) for _ in range(nflares)],
+            'flares': [rng.randint(10, 99) for _ in range(nflares)],
+            'flare_starts': starts,
+            'flare_maxes': starts,
+            'flare_ends': starts,
+            'flux_p_1mev': [rng.randint(100, 100000) for _ in range(8)],
+            'flux_p_10mev': [rng.randint(1, 1000) for _ in range(8)],
+            'flux_p_50mev': [rng.randint(0, 100) for _ in range(8)],
+            'flux_p_100mev': [rng.randint(0, 50) for _ in range(8)],
+            'flux_e_08mev': [rng.randint(1000, 10000000) for _ in range(8)],
+            'flux_e_2mev': [rng.randint(10, 100000) for _ in range(8)],
+            'wind_speed': [rng.randint(250, 900) for _ in range(24)],
+            'wind_density': [rng.randint(1, 50) for _ in range(24)],
+            'imf_bt': [rng.randint(1, 40) for _ in range(24)],
+            'imf_bz': [rng.randint(-30, 30) for _ in range(24)],
+        }
+        yield day, fields
+        day += timedelta(days=1)
+
+
+def make_database(filename: str, start: date, end: date, seed: int = 0) -> Database:
+    '''writes a database with the daily schema and a row for every day in [start, end)'''
+    db = Database(filename, SCHEMA, date)
+    for day, fields in synthetic_rows(start, end, seed):
+        row = db.new_row(day)
+        for field, value in fields.items():
+            row[field] = value
+        row.save()
+    db.save()
+    return db
+
+
+def gfz_text(start: date = GFZ_FIRST_DATE, end: date | None = None, seed: int = 0) -> str:
+    '''text in the format of GFZ's Kp_ap_since_1932.txt, 8 lines per day'''
+    if end is None:
+        end = date.today()
+    rng = random.Random(seed)
+    lines = [
+        '# PURPOSE: This file distributes the geomagnetic planetary three-hour index Kp and associated geomagnetic indices',
+        '#YYY MM DD hh.h hh._m        days      days_m    Kp        ap  D',
+    ]
+    day = start
+    while day < end:
+        days = (day - date(1932, 1, 1)).days
+        for i, kp in enumerate(kps(rng)):
+            lines.append(f'{day.year} {day.month:02} {day.day:02} {i * 3:02}.0 {i * 3 + 1:02}.50 {days + i / 8:12.5f} ' \
+                         f'{days + i / 8 + 0.0625:12.5f} {kp / 3:5.3f} {KP_AP[kp]:4} 1')
+        day += timedelta(days=1)
+    return '\n'.join(lines) + '\n'
+
+
+def dsd_text(year: int, seed: int = 0) -> str:
+    '''text in the format of SWPC's warehouse YYYY_DSD.txt, one line per day'''
+    rng = random.Random(seed + year)
+    lines = [
+        ':Product: Daily Solar Data            DSD.txt',
+        '#  Daily Solar Data',
+        '#  Date     10.7cm Number  Hemis. Regions Field  Flux   C  M  X  S  1  2  3',
+        '#---------------------------------------------------------------------------',
+    ]
+    day = date(year, 1, 1)
+    while day.year == year:
+        lines.append(f'{day.year} {day.month:02} {day.day:02}  {rng.randint(64, 300):4}   {rng.randint(0, 300):4}' \
+                     f'    {rng.randint(0, 2000):4}    {rng.randint(0, 3):2}    -999   {rng.choice("ABC")}{rng.uniform(1, 9.9):.1f}' \
+                     f'  {rng.randint(0, 10):2} {rng.randint(0, 3):2} {rng.choice((0, 0, 0, 1)):2}  0  0  0  0')
+        day += timedelta(days=1)
+    return '\n'.join(lines) + '\n'
+
+
+def dpd_text(year: int, seed: int = 0) -> str:
+    '''text in the format of SWPC's warehouse YYYY_DPD.txt, one line per day'''
+    rng = random.Random(seed + year)
+    lines = [
+        ':Product: Daily Particle Data         DPD.txt',
+        '#  Daily Particle Data',
+        '#                 Proton Fluence          Electron Fluence    -- Fredericksburg --  -- College --  -- Planetary --',
+        '#  Date        >1 Mev  >10 Mev >100 Mev   >0.6 Mev >2MeV      A  K-indices          A  K-indices   A  K-indices',
+    ]
+    day = date(year, 1, 1)
+    while day.year == year:
+        k = ' '.join(str(value // 3) for value in kps(rng))
+        lines.append(f'{day.year} {day.month:02} {day.day:02}  {rng.uniform(1e4, 1e7):9.1e} {rng.uniform(1e3, 1e5):9.1e} ' \
+                     f'{rng.uniform(1e3, 1e4):9.1e}  {rng.uniform(1e6, 1e9):9.1e} {rng.uniform(1e5, 1e8):9.1e}' \
+                     f'  {rng.randint(0, 50):3} {k}  {rng.randint(0, 50):3} {k}  {rng.randint(0, 50):3} {k}')
+        day += timedelta(days=1)
+    return '\n'.join(lines) + '\n'
@@ -1,8 +1,70 @@
 
+'''the keras kp forecaster, trained on windows of the daily databases
+
+usage: python ai.py [first year] [last year] [--validate years] [--epochs n] [--batch n] [--horizon days] [--out model.keras]
+
+the model sees the previous 27 days (a solar rotation) of every field and gives the kp of each
+three hours of the next 3 days, or --horizon days. the training data is streamed from the per year
+databases by windows.Windows, the last `--validate` years are kept apart to validate on. the model
+is saved with a json file of what it was trained on, for predict.py'''
+
 import os
+import sys
+import argparse
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spacew'))
+
 os.environ["KERAS_BACKEND"] = "tensorflow"
 import keras
 from keras import layers
 
-x = keras
-x = layers
+from dataset import Dataset
+from windows import Windows
+from predict import MODEL_FILE, save_meta
+
+HISTORY = 27
+HORIZON = 3
+
+
+def build_model(history: int, features: int, outputs: int) -> keras.Model:
+    model = keras.Sequential([
+        keras.Input((history, features)),
+        layers.LSTM(64),
+        layers.Dense(64, activation='relu'),
+        layers.Dense(outputs),
+    ])
+    model.compile(optimizer='adam', loss='mse', metrics=['mae'])
+    return model
+
+
+def train(first: int, last: int, validate: int = 1, epochs: int = 10, batch_size: int = 64, \
+          horizon: int = HORIZON, directory: str | None = None) -> tuple[keras.Model, Windows]:
+    dataset = Dataset(directory)
+    split = date(last - validate + 1, 1, 1)
+    data = Windows(dataset, date(first, 1, 1), split, HISTORY, horizon, batch_size=batch_size)
+    # validated with the training data's statistics, in date order
+    val = Windows(dataset, split, date(last + 1, 1, 1), HISTORY, horizon, batch_size=batch_size, \
+                  shuffle=0, stats=data.stats)
+    model = build_model(HISTORY, len(data.names), horizon * 8)
+    model.fit(data.tf_dataset(), validation_data=val.tf_dataset() if validate else None, epochs=epochs)
+    return model, data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='trains the kp forecaster on the daily databases')
+    parser.add_argument('first', type=int, help='first year')
+    parser.add_argument('last', type=int, nargs='?', default=date.today().year, help='last year')
+    parser.add_argument('--validate', type=int, default=1, help='years at the end to validate on')
+    parser.add_argument('--epochs', type=int, default=10, help='epochs')
+    parser.add_argument('--batch', type=int, default=64, help='batch size')
+    parser.add_argument('--horizon', type=int, default=HORIZON, help='days after the window to predict')
+    parser.add_argument('--out', default=MODEL_FILE, help='file to save the model to')
+    args = parser.parse_args()
+    model, data = train(args.first, args.last, args.validate, args.epochs, args.batch, args.horizon)
+    model.save(args.out)
+    save_meta(args.out, data)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+
+'''the conversions in const over whole arrays at once
+
+kp is kept as an integer number of thirds, 0 for 0 up to 28 for 9+ (KP_TO_INT). the scalar
+conversions in const call these with a single value, so the two always agree. each function takes
+a scalar or an array of any shape and gives an array of the same shape'''
+
+from __future__ import annotations
+
+import numpy as np
+
+from const import KP_TO_INT, INT_TO_KP, AP_BY_THIRDS, G_BY_THIRDS, FLARE_BASE, R_LEVELS, S_PFU
+
+
+__all__ = ['kp_to_thirds', 'thirds_to_kp', 'kp_values_to_thirds', 'thirds_to_ap', 'ap_to_thirds', 'g_scale', \
+           'flare_flux', 'r_scale', 's_scale', 'daily']
+
+
+_AP_BY_THIRDS = np.array(AP_BY_THIRDS)
+_G_BY_THIRDS = np.array(G_BY_THIRDS)
+_KP_BY_THIRDS = np.array([INT_TO_KP[thirds] for thirds in range(len(INT_TO_KP))])
+_S_PFU = np.array(S_PFU, dtype=float)
+_LETTERS = tuple(FLARE_BASE)
+_FLARE_BASE = np.array(tuple(FLARE_BASE.values()))
+
+
+def kp_to_thirds(kps) -> np.ndarray:
+    '''kp strings like '4+' to thirds'''
+    return np.vectorize(KP_TO_INT.__getitem__, otypes=[int])(kps)
+
+
+def thirds_to_kp(thirds) -> np.ndarray:
+    '''thirds to kp strings'''
+    return _KP_BY_THIRDS[np.asarray(thirds)]
+
+
+def kp_values_to_thirds(kps) -> np.ndarray:
+    '''kp as numbers like 4.333 or 4.33, what KP_VALUE looks up from text, to thirds'''
+    return np.rint(np.asarray(kps, dtype=float) * 3).astype(int)
+
+
+def thirds_to_ap(thirds) -> np.ndarray:
+    '''KP_TO_AP'''
+    return _AP_BY_THIRDS[np.asarray(thirds)]
+
+
+def ap_to_thirds(ap) -> np.ndarray:
+    '''const.ap_to_thirds, the smallest kp whose ap is at least `ap`, -1 if it's over 9+'''
+    ap = np.asarray(ap)
+    thirds = np.searchsorted(_AP_BY_THIRDS, ap, side='left')
+    return np.where(ap < 2, 0, np.where(thirds == len(_AP_BY_THIRDS), -1, thirds))
+
+
+def g_scale(thirds) -> np.ndarray:
+    '''KP_TO_G'''
+    return _G_BY_THIRDS[np.asarray(thirds)]
+
+
+def flare_flux(flares) -> np.ndarray:
+    '''flare classes like 'M2.5' to their peak x-ray flux in W/m^2'''
+    flares = np.asarray(flares, dtype=str)
+    letters = np.char.ljust(flares, 1).astype('U1')
+    numbers = np.char.lstrip(flares, ''.join(_LETTERS)).astype(float)
+    out = np.zeros(flares.shape)
+    for letter, base in FLARE_BASE.items():
+        out[letters == letter] = base
+    return out * numbers
+
+
+def r_scale(flux) -> np.ndarray:
+    '''the R level of x-ray fluxes in W/m^2, as flare_to_r gives for the flare class of each flux'''
+    flux = np.asarray(flux, dtype=float)
+    letter = np.searchsorted(_FLARE_BASE, flux, side='right') - 1
+    out = np.zeros(flux.shape, dtype=int)
+    for i, name in enumerate(_LETTERS):
+        if name not in R_LEVELS:
+            continue
+        first, numbers = R_LEVELS[name]
+        mask = letter == i
+        # the class's number as it would be written, so 2e-3 is X20 and not X19.999999999999996
+        level = np.searchsorted(numbers, np.round(flux[mask] / FLARE_BASE[name], 6), side='right')
+        out[mask] = np.where(level == 0, 0, first + level - 1)
+    return out
+
+
+def s_scale(pfu) -> np.ndarray:
+    '''pfu_to_s'''
+    pfu = np.asarray(pfu, dtype=float)
+    return np.where(pfu >= 0, np.searchsorted(_S_PFU, pfu, side='right'), 0)
+
+
+def daily(kp_thirds, ap=None) -> dict[str, np.ndarray]:
+    '''the daily mean, min and max of kp and ap, and the G levels of the kps
+
+    `kp_thirds` and `ap` have a row per day and a column per three hour interval, a day with fewer
+    intervals has the rest as nan. the mean is rounded like the cli rounds it, halves to even'''
+    kp_thirds = np.asarray(kp_thirds, dtype=float)
+    out = {
+        'kp': np.rint(np.nanmean(kp_thirds, axis=1)).astype(int),
+        'kp_min': np.nanmin(kp_thirds, axis=1).astype(int),
+        'kp_max': np.nanmax(kp_thirds, axis=1).astype(int),
+    }
+    out['g'] = g_scale(out['kp'])
+    out['g_min'] = g_scale(out['kp_min'])
+    out['g_max'] = g_scale(out['kp_max'])
+    if ap is not None:
+        ap = np.asarray(ap, dtype=float)
+        out['ap'] = np.rint(np.nanmean(ap, axis=1)).astype(int)
+        out['ap_min'] = np.nanmin(ap, axis=1).astype(int)
+        out['ap_max'] = np.nanmax(ap, axis=1).astype(int)
+    return out
@@ -7,7 +7,15 @@ import re
 import math
 from datetime import date
 
-__all__ = ['SpaceWError', 'Namespace']
+__all__ = [
+    'SpaceWError', 'Namespace', 'VERSION',
+    'EARTH', 'HOUR', 'SUN', 'FLARES', 'AP', 'TEXT_FLAG_MAP', 'ANSI_ESCAPE',
+    'GFZ_URL', 'GFZ_FIRST_DATE', 'SWPC_FIRST_DATE', 'GOES14_END_DATE', 'DAYS_IN_MONTH',
+    'KP_VALUE', 'KP_TO_INT', 'INT_TO_KP', 'KP_TO_AP', 'AP_BY_THIRDS', 'ap_to_thirds', 'ap_to_kp', 'KP_TO_G',
+    'G_BY_THIRDS', 'FLARE_BASE', 'R_LEVELS', 'flare_to_r', 'S_PFU', 'pfu_to_s',
+    'color_log_scale', 'KP_COLOR', 'RSG_COLOR',
+    'KP', 'RSG', 'SFU', 'SPOTS', 'AREA', 'NARS', 'FLARE', 'C_FLARE_COUNT', 'M_FLARE_COUNT', 'X_FLARE_COUNT', 'COLOR',
+]
 
 class SpaceWError(Exception):
     pass
@@ -112,15 +120,20 @@ KP_TO_AP = {
     '9-': 300, '9': 400, '9+': 500,
 }
 
-_AP_TO_KP = {v: k for k, v in KP_TO_AP.items()}
+# the tables below are used by classify.py, which does the conversions over whole arrays, the
+# functions here call it with one value at a time
 
-def ap_to_kp(ap: int) -> str:
-    if ap < 2:
-        return '0'
-    else:
-        for k, v in _AP_TO_KP.items():
-            if ap <= k:
-                return v
+# the ap of each kp by its thirds, KP_TO_INT
+AP_BY_THIRDS = tuple(KP_TO_AP.values())
+
+def ap_to_thirds(ap: int) -> int:
+    '''the smallest kp whose ap is at least `ap`, in thirds, -1 if it's over 9+'''
+    import classify
+    return int(classify.ap_to_thirds(ap))
+
+def ap_to_kp(ap: int) -> str | None:
+    thirds = ap_to_thirds(ap)
+    return None if thirds < 0 else INT_TO_KP[thirds]
 
 KP_TO_G = {
     '0': 0, '0+': 0,
@@ -135,36 +148,26 @@ KP_TO_G = {
     '9-': 5, '9': 5, '9+': 5,
 }
 
+G_BY_THIRDS = tuple(KP_TO_G.values())
+
+# the peak x-ray flux of each flare class letter in W/m^2, an M2.5 flare is 2.5 * FLARE_BASE['M']
+FLARE_BASE = {'A': 1e-8, 'B': 1e-7, 'C': 1e-6, 'M': 1e-5, 'X': 1e-4}
+
+# the R level of a flare by its letter, and the numbers that start each level after the first
+R_LEVELS = {'M': (1, (1, 5)), 'X': (3, (1, 10, 20))}
+
 def flare_to_r(flare):
-    let = flare[0]
-    num = float(flare[1:])
-    if let == 'X' and num >= 20:
-        return 5
-    elif let == 'X' and num >= 10:
-        return 4
-    elif let == 'X' and num >= 1:
-        return 3
-    elif let == 'M' and num >= 5:
-        return 2
-    elif let == 'M' and num >= 1:
-        return 1
-    else:
-        return 0
+    '''the R level of a flare class like 'M2.5', by its flux, so C10 is the same as M1'''
+    import classify
+    return int(classify.r_scale(classify.flare_flux(flare)))
+
 
+# the proton flux in pfu that starts each S level
+S_PFU = (10, 100, 1000, 10000, 100000)
 
 def pfu_to_s(pfu):
-    if pfu >= 100000:
-        return 5
-    elif pfu >= 10000:
-        return 4
-    elif pfu >= 1000:
-        return 3
-    elif pfu >= 100:
-        return 2
-    elif pfu >= 10:
-        return 1
-    else:
-        return 0
+    import classify
+    return int(classify.s_scale(pfu))
 
 
 def color_log_scale(mul: int | float, add: int | float = 0) -> Callable:
@@ -1,77 +1,369 @@
 
 from datetime import date, timedelta
 import os
-import ftplib
-import pickle
-from time import time
-import requests
+import sys
+import threading
+from time import monotonic
+from typing import Callable
+from functools import partial
 from const import *
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spacew'))
+
+from cache import CacheStore
+from lock import locked
+from textdata import TextFile, DSDRecord, DPDRecord, GFZ_KP, SWPC_DSD, SWPC_DPD
+
+# cache keys for each source, gfz's kp/ap file is kept up to date by fetching only what was added
+GFZ_KEY = 'gfz/Kp_ap_since_1932.txt'
+GFZ_NOWCAST_KEY = 'gfz/Kp_ap_nowcast.txt'
+SWPC_FORECAST_KEY = 'swpc/3-day-forecast.txt'
+SWPC_FORECAST_URL = 'https://services.swpc.noaa.gov/text/3-day-forecast.txt'
+# seconds before each source is fetched again, past years of the warehouse never change
+KP_TTL = 3600
+FORECAST_TTL = 3600
+WAREHOUSE_TTL = 86400
+# seconds each source gets to answer, and all of them together
+SOURCE_TIMEOUTS = {'gfz': 15, 'gfz nowcast': 5, 'swpc forecast': 5, 'swpc DSD': 15, 'swpc DPD': 15}
+GATHER_TIMEOUT = 15
+
+REFRESHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'refresher.py')
+
+# the gfz file is kept up to date by fetch.sync_file, which keeps what it knows next to it (SYNC_SUFFIX)
+cache = CacheStore(sidecars=('.sync',))
+_session = None
+_session_lock = threading.Lock()
+
+def session():
+    '''the shared http session, requests is only imported once something is fetched'''
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            _session = requests.Session()
+        return _session
+
 
 def get_swpc_ftp_file(file: str, encoding='utf-8') -> str:
     '''retrieves a file using ftp from swpc'''
-    fdir, file = os.path.split(file)
-    ftp = ftplib.FTP('ftp.swpc.noaa.gov', encoding=encoding)
-    ftp.login()
-    ftp.cwd(fdir)
+    from fetch import get_ftp_file, swpc_pool
+    return get_ftp_file(swpc_pool(), file, encoding)
+
+
+def warehouse_key(year: int, kind: str) -> str:
+    return f'swpc/warehouse/{year}_{kind}.txt'
+
+
+def expired_warehouse_years(kind: str) -> list[int]:
+    '''the years whose cached DSD or DPD file has expired, a past year's file that was fetched while
+    it was the current year expires once, and never again once it's fetched after the year ended'''
+    suffix = f'_{kind}.txt'
+    return sorted(int(key.rsplit('/', 1)[1].removesuffix(suffix)) for key in cache.expired('swpc/warehouse/') \
+                  if key.endswith(suffix))
+
+
+def update_http_file(key: str, url: str, ttl: float | None) -> None:
+    '''fetches a file using http into the cache'''
+    response = session().get(url)
+    response.raise_for_status()
+    cache.put(key, response.content, ttl)
+
+
+def update_warehouse_files(years: list[int], kind: str) -> None:
+    '''fetches years' DSD or DPD files from swpc's warehouse into the cache, all at once
+
+    the ones that were fetched are kept even if others failed, past years never expire'''
+    from fetch import FetchError, fetch_files, swpc_pool
+    keys = {f'pub/warehouse/{year}/{year}_{kind}.txt': (year, warehouse_key(year, kind)) for year in years}
+    results = fetch_files(swpc_pool(), {path: cache.path(key) for path, (_, key) in keys.items()})
+    errors = []
+    for path, result in results.items():
+        year, key = keys[path]
+        if isinstance(result, FetchError):
+            errors.append(str(result))
+        else:
+            cache.commit(key, None if year < date.today().year else WAREHOUSE_TTL)
+    if errors:
+        raise FetchError('; '.join(errors))
+
+
+def update_kp_file() -> None:
+    '''brings gfz's kp/ap file since 1932 in the cache up to date'''
+    from fetch import sync_file
+    sync_file(GFZ_URL + 'Kp_ap_since_1932.txt', cache.path(GFZ_KEY), session())
+    cache.commit(GFZ_KEY, KP_TTL)
+
+
+def source(name: str, years: list[int] = ()) -> tuple[list[str], Callable[[], None]]:
+    '''the cache keys a source fills and the function that fetches it, `years` are the warehouse's'''
+    if name == 'gfz':
+        return [GFZ_KEY], update_kp_file
+    if name == 'gfz nowcast':
+        return [GFZ_NOWCAST_KEY], partial(update_http_file, GFZ_NOWCAST_KEY, GFZ_URL + 'Kp_ap_nowcast.txt', KP_TTL)
+    if name == 'swpc forecast':
+        return [SWPC_FORECAST_KEY], partial(update_http_file, SWPC_FORECAST_KEY, SWPC_FORECAST_URL, FORECAST_TTL)
+    kind = name.removeprefix('swpc ')
+    return [warehouse_key(year, kind) for year in years], partial(update_warehouse_files, list(years), kind)
+
+
+def update_source(name: str, func: Callable[[], None]) -> None:
+    '''fetches a source, unless another process or thread already is, then waits for it to finish
+
+    the cli and the refresher share the cache, this keeps them from fetching the same file at once'''
+    os.makedirs(cache.directory, exist_ok=True)
+    lockfile = os.path.join(cache.directory, 'fetch-' + name.replace(' ', '-') + '.lock')
+    try:
+        with locked(lockfile, blocking=False):
+            func()
+    except BlockingIOError:
+        with locked(lockfile):
+            pass
+
+
+def refresher_running() -> bool:
+    '''whether a refresher is keeping the cache warm, it holds refresher.lock while it runs'''
+    os.makedirs(cache.directory, exist_ok=True)
+    try:
+        with locked(os.path.join(cache.directory, 'refresher.lock'), blocking=False):
+            return False
+    except BlockingIOError:
+        return True
+
+
+_revalidating = False
+
+def revalidate_later() -> None:
+    '''refreshes what has expired in a process of its own that outlives this one, started once per run'''
+    global _revalidating
+    if _revalidating:
+        return
+    _revalidating = True
+    import subprocess
+    subprocess.Popen([sys.executable, REFRESHER, '--once'], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, \
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def get_http_file(key: str, url: str, ttl: float | None, refresh: bool = False, offline: bool = False) -> str | None:
+    '''retrieves a file using http, through the cache
+
+    when offline, whatever is cached is used even if it expired, None if there's nothing'''
+    if not offline and (refresh or not cache.fresh(key)):
+        update_http_file(key, url, ttl)
+    data = cache.get(key, stale=True)
+    return None if data is None else data.decode('utf-8')
+
+
+def year_segments(start: date, end: date) -> list[tuple[int, date, date]]:
+    '''splits [start, end) into the parts in each year'''
     out = []
-    ftp.retrbinary(f'RETR {file}', out.append)
-    return ''.join([x.decode(encoding) for x in out])
+    while start < end:
+        stop = min(end, date(start.year + 1, 1, 1))
+        out.append((start.year, start, stop))
+        start = stop
+    return out
+
+
+# the type and number of values of each field of the parsed warehouse files. in their .sdbc shards
+# a field with several values, the k indices of a day, has a column for each so any of them can be missing
+WAREHOUSE_FIELDS = {
+    'DSD': {field: ('str' if field == 'bg_flux' else 'int', 1) for field in DSDRecord._fields[1:]},
+    'DPD': {field: ('float' if field.endswith('mev') else 'int', 8 if field.startswith('k_') else 1) \
+            for field in DPDRecord._fields[1:]},
+}
+
+# the parsed warehouse files by year and kind, with the stamp of the cache entry they were parsed from
+_warehouse_records = {}
+_warehouse_records_lock = threading.Lock()
+
+def warehouse_shard_schema(kind: str) -> dict[str, type]:
+    '''the columns of the .sdbc shards of DSD or DPD files'''
+    from database import DATA_TYPES
+    out = {}
+    for field, (dtype, count) in WAREHOUSE_FIELDS[kind].items():
+        for column in [field] if count == 1 else [f'{field}_{i}' for i in range(1, count + 1)]:
+            out[column] = DATA_TYPES[dtype]
+    return out
+
 
+def _read_warehouse_shard(shard_key: str, kind: str, stamp: str) -> dict[date, DSDRecord | DPDRecord] | None:
+    '''the records kept in a year's shard, None if there isn't one or it's from another version of the file'''
+    from database import Database
+    if not cache.fresh(shard_key):
+        return None
+    try:
+        db = Database(cache.path(shard_key))
+    except (ValueError, OSError):
+        return None
+    with db:
+        if db.meta.get('parsed_from') != stamp or db.fields != tuple(warehouse_shard_schema(kind)):
+            return None
+        make = (DSDRecord if kind == 'DSD' else DPDRecord)._make
+        counts = [count for _, count in WAREHOUSE_FIELDS[kind].values()]
+        out = {}
+        for row in db.range():
+            values = iter([row[field] for field in db.fields])
+            out[row.name] = make([row.name] + [next(values) if count == 1 else tuple(next(values) for _ in range(count)) \
+                                               for count in counts])
+        return out
 
-def load_txt_data(data: str | None, start: date, end: date, first: date | None, mul: int = 1) -> list[list[str]]:
-    '''loads data in the .txt format used by api's'''
-    lines = [line for line in data.split('\n') if len(line) > 0 and not line[0] in ('#', ':')]
-    lines += [''] * mul
-    if first is None:
-        first = date.fromisoformat('-'.join(lines[0].split(' ')[:3]))
-    info = lines[(start - first).days * mul:(end - first).days * mul]
+
+def _write_warehouse_shard(shard_key: str, kind: str, stamp: str, records: dict[date, DSDRecord | DPDRecord]) -> None:
+    '''keeps a year's parsed records in a shard next to the file, written elsewhere and renamed into place
+
+    the shard is a cache entry of its own that never expires, so it's counted and evicted like the others'''
+    from database import Database
+    shard = cache.path(shard_key)
+    schema = warehouse_shard_schema(kind)
+    counts = [count for _, count in WAREHOUSE_FIELDS[kind].values()]
+    tmp = f'{shard}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with Database(tmp, schema, date, 'sdbc', parsed_from=stamp) as db:
+            for day, record in records.items():
+                row = db.new_row(day)
+                values = [item for value, count in zip(record[1:], counts) for item in ((value,) if count == 1 else value)]
+                for field, value in zip(schema, values):
+                    row[field] = value
+                row.save()
+            db.save()
+        os.replace(tmp, shard)
+        cache.commit(shard_key)
+    except OSError:
+        # no room for it, or the cache is read only, the next process parses the file again
+        pass
+    finally:
+        for name in (tmp, tmp + '.lock'):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+
+def warehouse_records(year: int, kind: str) -> dict[date, DSDRecord | DPDRecord]:
+    '''a year's cached DSD or DPD records by date, empty if it isn't cached
+
+    a file is parsed once for each time it's stored in the cache, the records are kept in a .sdbc
+    shard next to it (cached as `<key>.sdbc`) that later runs read instead, and in memory for the
+    rest of this one'''
+    key = warehouse_key(year, kind)
+    stamp = cache.stamp(key)
+    if stamp is None or not cache.fresh(key, stale=True):
+        return {}
+    filename = cache.path(key)
+    stamp = f'{stamp[0]!r}:{stamp[1]}'
+    with _warehouse_records_lock:
+        memo = _warehouse_records.get((year, kind))
+        if memo is not None and memo[0] == stamp:
+            return memo[1]
+    records = _read_warehouse_shard(key + '.sdbc', kind, stamp)
+    if records is None:
+        try:
+            with TextFile.open(filename, SWPC_DSD if kind == 'DSD' else SWPC_DPD) as data:
+                records = {record.date: record for record in data.records()}
+        except FileNotFoundError:
+            return {}
+        _write_warehouse_shard(key + '.sdbc', kind, stamp, records)
+    with _warehouse_records_lock:
+        _warehouse_records[year, kind] = (stamp, records)
+    return records
+
+
+def warehouse_years(start: date, end: date, kind: str, refresh: bool = False) -> list[int]:
+    '''the years of [start, end) in the warehouse whose DSD or DPD file isn't cached or has expired'''
+    return [year for year, _, _ in year_segments(max(start, SWPC_FIRST_DATE), end) \
+            if refresh or not cache.fresh(warehouse_key(year, kind))]
+
+
+def get_warehouse_records(start: date, end: date, kind: str, refresh: bool = False, \
+                          offline: bool = False) -> list[DSDRecord | DPDRecord]:
+    '''the DSD or DPD records in [start, end) in date order, from each year's file
+
+    only the files that aren't cached are fetched, at once. when offline, or for the years that
+    couldn't be fetched, whatever is cached is used'''
+    if not offline:
+        years = warehouse_years(start, end, kind, refresh)
+        if years:
+            update_warehouse_files(years, kind)
     out = []
-    for line in info:
-        line = line.split(' ')
-        line = [x for x in line if x != '']
-        out.append(line)
-    if out[-1] == []:
-        out = out[:-mul]
+    for year, first, stop in year_segments(max(start, SWPC_FIRST_DATE), end):
+        records = warehouse_records(year, kind)
+        out += [records[day] for day in sorted(records) if first <= day < stop]
     return out
 
 
-def get_kp_ap_data(start: date, end: date, refresh: bool = False) -> dict[str, dict[str, str | int]]:
+def get_kp_file(refresh: bool = False, offline: bool = False) -> TextFile | None:
+    '''gfz's kp/ap file since 1932, through the cache'''
+    if not offline and (refresh or not cache.fresh(GFZ_KEY)):
+        update_kp_file()
+    if not cache.fresh(GFZ_KEY, stale=True):
+        return None
+    return TextFile.open(cache.path(GFZ_KEY), GFZ_KP)
+
+
+def kp_placeholder() -> Namespace:
+    return Namespace(
+        kps = ('0',) * 8,
+        aps = (0,) * 8,
+    )
+
+
+def solar_placeholder() -> Namespace:
+    return Namespace(
+        f107 = 9999,
+        spots = 99999,
+        nars = 9999,
+        area = 9999,
+        bgflux = 'X99.99',
+        mxflux = 'X99.99',
+        cfs = 99,
+        mfs = 99,
+        xfs = 99,
+    )
+
+
+def goes_placeholder() -> Namespace:
+    return Namespace(
+        p1 = -1,
+        p10 = -1,
+        p100 = -1,
+        e08 = -1,
+        e2 = -1,
+    )
+
+
+def get_kp_ap_data(start: date, end: date, refresh: bool = False, offline: bool = False) -> dict[str, dict[str, str | int]]:
     '''gets the kp/ap values for certain date(s)'''
     out = {}
     today = date.today()
     if end <= today + timedelta(days=3):
-        if os.path.exists('.spacew_cache'):
-            with open('.spacew_cache', 'rb') as file:
-                cache_time, data, preds, _, _ = pickle.loads(file.read())
-            if time() - cache_time > 3600:
-                refresh = True
-        else:
-            refresh = True
-        if refresh:
-            data = requests.get(GFZ_URL + 'Kp_ap_since_1932.txt').text
-            data += '\n'.join(requests.get(GFZ_URL + 'Kp_ap_nowcast.txt').text.split('\n')[-9:])
-            preds = requests.get('https://services.swpc.noaa.gov/text/3-day-forecast.txt').text
+        preds = get_http_file(SWPC_FORECAST_KEY, SWPC_FORECAST_URL, FORECAST_TTL, refresh, offline)
+        if preds is not None:
             preds = [x.split(' ')[1:] for x in preds.split('\n')[14:22]]
             preds = [[y for y in x if y != ''] for x in preds]
             preds = [[preds[j][i] for j in range(8)] for i in range(3)]
-            with open('.spacew_cache', 'wb+') as file:
-                file.write(pickle.dumps([time(), data, preds, None, None]))
-        data = load_txt_data(data, start, end, GFZ_FIRST_DATE if (today - start).days < 28 else None, mul=8)
-        for i, line in enumerate(data):
-            if line[7] == '-1.000':
-                data[i][7] = preds[0][i % 8]
-        for i, day in enumerate(preds):
-            for hour in day:
-                dd = today + timedelta(days=i)
-                data.append((str(dd.year).zfill(4), str(dd.month).zfill(2), str(dd.day).zfill(2), \
-                            0, 0, 0, 0, hour, KP_TO_AP[KP_VALUE[hour]], '0'))
-        for i in range(len(data)//8):
-            kps, aps = [], []
-            for line in data[i*8:i*8+8]:
-                kps.append(KP_VALUE[line[7]])
-                aps.append(int(line[8]))
-            key = date.fromisoformat('-'.join(data[i*8][:3]))
+        records, last = [], None
+        data = get_kp_file(refresh, offline)
+        if data is not None:
+            with data:
+                records = list(data.records(start, end))
+                last = data.last()
+        # the nowcast has the days that aren't in the file since 1932 yet
+        nowcast = get_http_file(GFZ_NOWCAST_KEY, GFZ_URL + 'Kp_ap_nowcast.txt', KP_TTL, refresh, offline)
+        if nowcast is not None:
+            records += TextFile(nowcast, GFZ_KP).records(start if last is None else max(start, last + timedelta(days=1)), end)
+        days = {}
+        for record in records:
+            if record.kp is not None and record.kp >= 0:
+                kp = KP_VALUE[f'{record.kp:.3f}']
+            elif preds is not None:
+                kp = KP_VALUE[preds[0][int(record.hour) // 3]]
+            else:
+                kp = '0'
+            days.setdefault(record.date, ([], []))
+            days[record.date][0].append(kp)
+            days[record.date][1].append(record.ap)
+        for i, day in enumerate(preds or ()):
+            days[today + timedelta(days=i)] = ([KP_VALUE[hour] for hour in day], [KP_TO_AP[KP_VALUE[hour]] for hour in day])
+        for key, (kps, aps) in days.items():
             out[key] = Namespace(
                 kps = tuple(kps),
                 aps = tuple(aps),
@@ -79,67 +371,111 @@ def get_kp_ap_data(start: date, end: date, refresh: bool = False) -> dict[str, d
     return out
 
 
-def get_solar_data(start: date, end: date, refresh: bool = False):
+def get_solar_data(start: date, end: date, refresh: bool = False, offline: bool = False):
     '''gets data on the sun's activity for date(s)'''
     out = {}
-    if end.year < date.today().year:
-        data = get_swpc_ftp_file(f'pub/warehouse/{start.year}/{start.year}_DSD.txt')
-        data = load_txt_data(data, start, end, date(start.year, 1, 1))
-        for line in data:
-            key = date.fromisoformat('-'.join(line[:3]))
-            out[key] = Namespace(
-                f107 = int(line[3]),
-                spots = int(line[4]),
-                area = int(line[5]),
-                nars = int(line[6]),
-                bgflux = str(line[8]),
-                mxflux = 'X99.99',
-                cfs = int(line[9]),
-                mfs = int(line[10]),
-                xfs = int(line[11]),
-            )
-    elif end <= date.today():
-        for day in range((end - start).days):
-            out[start + timedelta(days=day)] = Namespace(
-                f107 = 9999,
-                spots = 99999,
-                nars = 9999,
-                area = 9999,
-                bgflux = 'X99.99',
-                mxflux = 'X99.99',
-                cfs = 99,
-                mfs = 99,
-                xfs = 99,
-            )
-    else:
-        pass
-    return out
+    # the current year's file changes every day, it's only used if the refresher keeps it in the cache
+    split = date(date.today().year, 1, 1)
+    records = get_warehouse_records(start, min(end, split), 'DSD', refresh, offline)
+    if end <= date.today():
+        for day in range((end - max(start, split)).days):
+            out[max(start, split) + timedelta(days=day)] = solar_placeholder()
+    for record in records + get_warehouse_records(max(start, split), end, 'DSD', offline=True):
+        out[record.date] = Namespace(
+            f107 = record.f107,
+            spots = record.spots,
+            area = record.area,
+            nars = record.new_regions,
+            bgflux = record.bg_flux or '*',
+            mxflux = 'X99.99',
+            cfs = record.c_flares,
+            mfs = record.m_flares,
+            xfs = record.x_flares,
+        )
+    return dict(sorted(out.items()))
 
 
-def get_goes_data(start: date, end: date, refresh: bool = False):
+def get_goes_data(start: date, end: date, refresh: bool = False, offline: bool = False):
     '''gets GOES data for date(s)'''
     out = {}
-    if end < GOES14_END_DATE:
-        data = get_swpc_ftp_file(f'pub/warehouse/{start.year}/{start.year}_DPD.txt')
-        data = load_txt_data(data, start, end, date(start.year, 1, 1))
-        for line in data:
-            key = date.fromisoformat('-'.join(line[:3]))
-            out[key] = Namespace(
-                p1 = float(line[3])/86400,
-                p10 = float(line[4])/86400,
-                p100 = float(line[5])/86400,
-                e08 = float(line[6])/86400,
-                e2 = float(line[7])/86400,
-            )
-    elif end <= date.today():
-        for day in range((end - start).days):
-            out[start + timedelta(days=day)] = Namespace(
-                p1 = -1,
-                p10 = -1,
-                p100 = -1,
-                e08 = -1,
-                e2 = -1,
-            )
-    else:
-        pass
+    for record in get_warehouse_records(start, min(end, GOES14_END_DATE), 'DPD', refresh, offline):
+        out[record.date] = Namespace(
+            p1 = record.p1mev/86400,
+            p10 = record.p10mev/86400,
+            p100 = record.p100mev/86400,
+            e08 = record.e08mev/86400,
+            e2 = record.e2mev/86400,
+        )
+    if end <= date.today():
+        for day in range((end - max(start, GOES14_END_DATE)).days):
+            out[max(start, GOES14_END_DATE) + timedelta(days=day)] = goes_placeholder()
+    return out
+
+
+def source_updates(start: date, end: date, refresh: bool = False) -> dict[str, tuple[list[str], Callable[[], None]]]:
+    '''the fetches that bring the cache up to date for a query, by source, with the cache keys they fill'''
+    out = {}
+    today = date.today()
+    if end <= today + timedelta(days=3):
+        for name in ('gfz', 'gfz nowcast', 'swpc forecast'):
+            keys, func = source(name)
+            if refresh or not cache.fresh(keys[0]):
+                out[name] = (keys, func)
+    for kind, until in (('DSD', date(today.year, 1, 1)), ('DPD', GOES14_END_DATE)):
+        years = warehouse_years(start, min(end, until), kind, refresh)
+        if years:
+            out[f'swpc {kind}'] = source(f'swpc {kind}', years)
     return out
+
+
+def _start(func: Callable[[], None]) -> 'Future':
+    '''runs func in a daemon thread, one that misses its deadline doesn't keep the program from exiting'''
+    from concurrent.futures import Future
+    future = Future()
+    def run():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def gather_data(start: date, end: date, refresh: bool = False, timeout: float = GATHER_TIMEOUT) -> tuple[dict, dict, dict, list[str]]:
+    '''gets the kp/ap, solar and GOES data for date(s), fetching from all sources at once
+
+    a source that expired but is still in the cache is answered from it right away, and fetched
+    again in the background, by the refresher if one is running or else by a process started for
+    it. unless `refresh` is true, then every source is fetched now. the ones fetched now have until
+    their own timeout in SOURCE_TIMEOUTS, and all of them until `timeout`. the sources that miss
+    their deadline or fail are answered from the cache even if it expired, or with placeholders, and
+    a note for each of them is returned'''
+    started = monotonic()
+    updates = source_updates(start, end, refresh)
+    stale = [name for name, (keys, _) in updates.items() if not refresh and all(cache.age(key) is not None for key in keys)]
+    if stale and not refresher_running():
+        revalidate_later()
+    futures = {name: (keys, _start(partial(update_source, name, func))) for name, (keys, func) in updates.items() \
+               if name not in stale}
+    notes = []
+    for name, (keys, future) in futures.items():
+        left = min(started + SOURCE_TIMEOUTS.get(name, timeout), started + timeout) - monotonic()
+        try:
+            future.result(timeout=max(0, left))
+            continue
+        except TimeoutError:
+            problem = 'didn\'t answer in time'
+        except Exception as e:
+            problem = f'failed ({e})'
+        ages = [age for age in map(cache.age, keys) if age is not None]
+        if not ages:
+            notes.append(f'{name} {problem}, using placeholder data')
+        elif len(ages) < len(keys):
+            notes.append(f'{name} {problem}, using cached data for some days and placeholder data for the rest')
+        else:
+            notes.append(f'{name} {problem}, using cached data from {max(ages) / 3600:.1f} hours ago')
+    kp_ap = get_kp_ap_data(start, end, offline=True)
+    solar = get_solar_data(start, end, offline=True)
+    goes = get_goes_data(start, end, offline=True)
+    return kp_ap, solar, goes, notes
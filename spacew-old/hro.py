@@ -1,8 +1,63 @@
+from typing import Any, Callable, TextIO
 
-from typing import Any
+import io
+import math
+from bisect import bisect_right
+from itertools import batched
+from datetime import date
 
 from const import *
 
+RESET = '\x1b[0m'
+# days written at a time, their daily kp and ap are worked out together
+CHUNK = 256
+
+
+class Table(dict):
+    '''a lookup table filled in the first time each key is looked up, for values from a small set'''
+
+    def __init__(self, func: Callable[[Any], Any]):
+        super().__init__()
+        self.func = func
+
+    def __missing__(self, key: Any) -> Any:
+        value = self[key] = self.func(key)
+        return value
+
+
+def log_scale_thresholds(mul: int | float, add: int | float = 0) -> tuple[float, ...]:
+    '''the values color_log_scale(mul, add) starts each level above 0 at'''
+    return tuple(math.exp((math.log(pfu) - add) / mul) for pfu in (10, 100, 1000, 10000, 100000))
+
+
+def log_scale_color(thresholds: tuple[float, ...]) -> Callable[[int | float], str]:
+    def wrapper(value: int | float):
+        return RSG_COLOR[bisect_right(thresholds, value)]
+    return wrapper
+
+
+# the color codes of each map, the same as COLOR but the log scales are bisections of precomputed thresholds
+COLOR_CODE = COLOR | {
+    SFU: log_scale_color(log_scale_thresholds(1.45)),
+    SPOTS: log_scale_color(log_scale_thresholds(1.45)),
+    AREA: log_scale_color(log_scale_thresholds(1.45, -2.3)),
+}
+
+ESCAPES = {name: Table(lambda value, code=code: f'\x1b[{code(value)}m') for name, code in COLOR_CODE.items()}
+FLARE_R = Table(flare_to_r)
+
+_cells = {}
+
+def cell(value: Any, map_name: str, width: int) -> str:
+    '''the same as color(value, map_name, width), looked up from a table for each map and width'''
+    try:
+        table = _cells[map_name, width]
+    except KeyError:
+        escapes = ESCAPES[map_name]
+        table = _cells[map_name, width] = Table(lambda value: f'{escapes[value]}{str(value).ljust(width)}{RESET}')
+    return table[value]
+
+
 def color(value: Any, map_name: str, width: int | None = None, display: bool = True, reset: bool = True) -> str:
     after = ''
     if display:
@@ -11,56 +66,90 @@ def color(value: Any, map_name: str, width: int | None = None, display: bool = T
         else:
             after = f'{value}'
         if reset:
-            after += '\x1b[0m'
-    return f'\x1b[{COLOR[map_name](value)}m{after}'
+            after += RESET
+    return f'{ESCAPES[map_name][value]}{after}'
 
-def main(output):
-    out = ''
-    mode = output.mode
-    data = output.data
-    out += '\x1b[96mdate       '
+
+def header(mode: int) -> str:
+    out = ['\x1b[96mdate       ']
     if mode & EARTH:
-        out += 'kp -  +  R-+ S-+ G-+ '
+        out.append('kp -  +  R-+ S-+ G-+ ')
         if mode & AP:
-            out += 'ap  -   +   '
+            out.append('ap  -   +   ')
         if mode & HOUR:
-            out += '00 03 06 09 12 15 18 21 '.replace(' ', (' ap  ' if mode & AP else ' '))
+            out.append('00 03 06 09 12 15 18 21 '.replace(' ', (' ap  ' if mode & AP else ' ')))
     if mode & SUN:
-        out += 'f10.7 spots area   +ars bgflux mxflux C  M  X  '
+        out.append('f10.7 spots area   +ars bgflux mxflux C  M  X  ')
         if mode & FLARES:
-            out += 'flares '
-    out += '\x1b[0m\n'
-    for day, info in data.items():
-        int_kps = tuple(KP_TO_INT[x] for x in info.kps)
-        kp = INT_TO_KP[round(sum(int_kps)/len(int_kps))]
-        out += f'{color(kp, KP, display=False)}{day.strftime('%x'):<10} '
-        if mode & EARTH:
-            min_kp = INT_TO_KP[min(int_kps)]
-            max_kp = INT_TO_KP[max(int_kps)]
-            out += f'{color(kp, KP, 2)} {color(min_kp, KP, 2)} {color(max_kp, KP, 2)} '
-            out += f'9{color(flare_to_r(info.bgflux), RSG, 1)}{color(flare_to_r(info.mxflux), RSG, 1)} '
-            out += f'{color(pfu_to_s(info.p10), RSG, 1)}99 '
-            out += f'{color(KP_TO_G[kp], RSG, 1)}{color(KP_TO_G[min_kp], RSG, 1)}{color(KP_TO_G[max_kp], RSG, 1)} '
+            out.append('flares ')
+    out.append(RESET + '\n')
+    return ''.join(out)
+
+
+def daily(infos: list[Namespace]) -> dict[str, list[int]]:
+    '''the daily mean, min and max kp in thirds and ap of the days' data, see classify.daily
+
+    numpy is only imported once there's a table to write, not when the cli starts'''
+    import numpy as np
+    import classify
+    width = max(len(info.kps) for info in infos)
+    kps = np.full((len(infos), width), np.nan)
+    aps = np.full((len(infos), width), np.nan)
+    for i, info in enumerate(infos):
+        kps[i, :len(info.kps)] = [KP_TO_INT[kp] for kp in info.kps]
+        aps[i, :len(info.aps)] = info.aps
+    return {name: values.tolist() for name, values in classify.daily(kps, aps).items()}
+
+
+def row(mode: int, day: date, info: Namespace, kps: tuple[int, int, int], aps: tuple[int, int, int]) -> str:
+    '''a day's row, `kps` and `aps` are its mean, min and max kp in thirds and ap'''
+    kp, min_kp, max_kp = (INT_TO_KP[thirds] for thirds in kps)
+    out = [ESCAPES[KP][kp], f'{day.strftime('%x'):<10} ']
+    if mode & EARTH:
+        out += (cell(kp, KP, 2), ' ', cell(min_kp, KP, 2), ' ', cell(max_kp, KP, 2), ' ')
+        out += ('9', cell(FLARE_R[info.bgflux], RSG, 1), cell(FLARE_R[info.mxflux], RSG, 1), ' ')
+        out += (cell(pfu_to_s(info.p10), RSG, 1), '99 ')
+        out += (cell(KP_TO_G[kp], RSG, 1), cell(KP_TO_G[min_kp], RSG, 1), cell(KP_TO_G[max_kp], RSG, 1), ' ')
+        if mode & AP:
+            out += (cell(aps[0], AP, 3), cell(aps[1], AP, 3), cell(aps[2], AP, 3))
+        if mode & HOUR:
             if mode & AP:
-                ap = round(sum(info.aps)/len(info.aps))
-                min_ap = min(info.aps)
-                max_ap = max(info.aps)
-                out += f'{color(ap, AP, 3)}{color(min_ap, AP, 3)}{color(max_ap, AP, 3)}'
-            if mode & HOUR:
-                if mode & AP:
-                    for h_kp, h_ap in zip(info.kps, info.aps):
-                        out += f'{color(h_kp, KP, 2)} {h_ap:<3} '
-                else:
-                    for h_kp in info.kps:
-                        out += f'{color(h_kp, KP, 2)} '
-        if mode & SUN:
-            out += f'{color(info.f107, SFU, 5)} {color(info.spots, SPOTS, 5)} '
-            out += f'{color(info.area, AREA, 6)} {color(info.nars, NARS, 4)} '
-            out += f'{color(info.bgflux, FLARE, 6)} {color(info.mxflux, FLARE, 6)} '
-            out += f'{color(info.cfs, C_FLARE_COUNT, 2)} '
-            out += f'{color(info.mfs, M_FLARE_COUNT, 2)} '
-            out += f'{color(info.xfs, X_FLARE_COUNT, 2)} '
-            if mode & FLARES:
-                pass
-        out += '\n'
-    return out
+                for h_kp, h_ap in zip(info.kps, info.aps):
+                    out += (cell(h_kp, KP, 2), f' {h_ap:<3} ')
+            else:
+                for h_kp in info.kps:
+                    out += (cell(h_kp, KP, 2), ' ')
+    if mode & SUN:
+        out += (cell(info.f107, SFU, 5), ' ', cell(info.spots, SPOTS, 5), ' ')
+        out += (cell(info.area, AREA, 6), ' ', cell(info.nars, NARS, 4), ' ')
+        out += (cell(info.bgflux, FLARE, 6), ' ', cell(info.mxflux, FLARE, 6), ' ')
+        out += (cell(info.cfs, C_FLARE_COUNT, 2), ' ')
+        out += (cell(info.mfs, M_FLARE_COUNT, 2), ' ')
+        out += (cell(info.xfs, X_FLARE_COUNT, 2), ' ')
+        if mode & FLARES:
+            pass
+    out.append('\n')
+    return ''.join(out)
+
+
+def write(output, stream: TextIO, nocolor: bool = False) -> None:
+    '''writes the table a row at a time as the days come in, `output.data` can be a dict or an
+    iterable of (day, data) pairs, so a long date range never has to be in memory at once'''
+    mode = output.mode
+    days = output.data.items() if isinstance(output.data, dict) else output.data
+    if nocolor:
+        put = lambda text: stream.write(ANSI_ESCAPE.sub('', text))
+    else:
+        put = stream.write
+    put(header(mode))
+    for chunk in batched(days, CHUNK):
+        stats = daily([info for _, info in chunk])
+        kps = zip(stats['kp'], stats['kp_min'], stats['kp_max'])
+        aps = zip(stats['ap'], stats['ap_min'], stats['ap_max'])
+        put(''.join(row(mode, day, info, *agg) for (day, info), *agg in zip(chunk, kps, aps)))
+
+
+def main(output) -> str:
+    out = io.StringIO()
+    write(output, out)
+    return out.getvalue()
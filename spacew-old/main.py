@@ -1,42 +1,74 @@
 
 import re
+import sys
 import argparse
 import pprint
 from datetime import date as ddate, timedelta
-import dateutil
 from const import *
 import hro
 import data
 
-def cli(args):
+def predictions(keys: list[ddate]) -> dict[ddate, Namespace]:
+    '''the kp/ap the model predicts for days the sources have none for, see predict.py
+
+    only days within the model's horizon of yesterday are asked for, the model predicts that many
+    days past the last day in the databases, which is yesterday at the latest'''
+    if not keys:
+        return {}
+    import predict
+    horizon = predict.horizon()
+    if horizon is None:
+        return {}
+    keys = [key for key in keys if key < ddate.today() + timedelta(days=horizon)]
+    try:
+        kps = predict.predict(keys) if keys else {}
+    except Exception as e:
+        print(f'spacew: warning: no predictions ({e})', file=sys.stderr)
+        return {}
     out = {}
+    for key, values in kps.items():
+        thirds = [min(max(round(kp * 3), 0), 28) for kp in values]
+        out[key] = Namespace(kps=tuple(INT_TO_KP[value] for value in thirds), \
+                             aps=tuple(KP_TO_AP[INT_TO_KP[value]] for value in thirds))
+    return out
+
+def days(start: ddate, end: ddate, refresh: bool, timeout: float):
+    '''yields each day and its data, gathered a year at a time so a long range starts printing at once
+
+    days after today that the sources have no kp for, like the ones past the 3 day forecast, are predicted'''
+    today = ddate.today()
+    for _, first, stop in data.year_segments(start, end):
+        if first > today + timedelta(days=3):
+            kp_ap, solar, goes = {}, {}, {}
+        else:
+            kp_ap, solar, goes, notes = data.gather_data(first, stop, refresh, timeout)
+            for note in notes:
+                print(f'spacew: warning: {note}', file=sys.stderr)
+        keys = [first + timedelta(days=day) for day in range((stop - first).days)]
+        predicted = predictions([key for key in keys if key > today and key not in kp_ap])
+        for key in keys:
+            yield key, kp_ap.get(key, predicted.get(key, data.kp_placeholder())) + \
+                       solar.get(key, data.solar_placeholder()) + goes.get(key, data.goes_placeholder())
+
+def cli(args):
     start = args.date
     end = args.end_date
     if end is None:
         end = start
     end += timedelta(days=1)
-    for day in range((end - start).days):
-        out[start + timedelta(days=day)] = Namespace()
-    if start <= ddate.today() + timedelta(days=3):
-        kp_ap = data.get_kp_ap_data(start, end, args.refresh)
-        solar = data.get_solar_data(start, end, args.refresh)
-        goes = data.get_goes_data(start, end, args.refresh)
-        for key in out:
-            out[key] += kp_ap[key] + solar[key] + goes[key]
-    else:
-        pass
     out = Namespace(
         version = VERSION,
         mode = args.mode | (AP if args.ap else 0),
-        data = out
+        data = days(start, end, args.refresh, args.timeout)
     )
     if args.json:
+        out.data = dict(out.data)
         out = pprint.pformat(out, sort_dicts=False)
+        if args.nocolor:
+            out = ANSI_ESCAPE.sub('', out)
+        print(out)
     else:
-        out = hro.main(out)
-    if args.nocolor:
-        out = ANSI_ESCAPE.sub('', out)
-    return out
+        hro.write(out, sys.stdout, args.nocolor)
 
 def mode(arg: str) -> int:
     try:
@@ -53,6 +85,11 @@ def mode(arg: str) -> int:
             raise argparse.ArgumentTypeError(f'not a valid mode: {o_arg}') from None
 
 def date(arg: str) -> ddate:
+    try:
+        return ddate.fromisoformat(arg)
+    except ValueError:
+        pass
+    import dateutil.parser
     try:
         return dateutil.parser.parse(arg).date()
     except ValueError:
@@ -73,9 +110,11 @@ parser.add_argument('-j', '--json', action='store_true', help='output json')
 parser.add_argument('-c', '--nocolor', '--no-color', action='store_true', help='disable color output')
 parser.add_argument('-r', '--refresh', action='store_true', help='force data refresh instead of loading from cache ' + \
                     '(done automatically if it has been more than an hour since data was cached)')
+parser.add_argument('-t', '--timeout', action='store', type=float, default=data.GATHER_TIMEOUT, \
+                    help='seconds to wait for the data sources before using cached or placeholder data')
 parser.add_argument('-a', '-p', '-ap', '--ap', action='store_true', help='whether to output ap')
 
 try:
-    print(cli(parser.parse_args()))
+    cli(parser.parse_args())
 except SpaceWError as e:
     print(f'spacew: error: {e}')
@@ -0,0 +1,308 @@
+
+'''kp predictions from the forecaster, served by a process that keeps the model loaded
+
+usage: python predict.py [--model file] [--socket path]
+
+loading keras and the model takes seconds, longer than the cli takes for anything else, so the
+server loads it once and answers over a unix socket. requests for many dates from several clients
+that come in at about the same time are put together into one model.predict call, and predictions
+are cached by the model's version and a hash of the window they were made from. the cli asks the
+server, and loads the model itself only if no server is running
+
+the protocol is a line of json each way, {"days": ["2025-01-01", ...]} is answered with
+{"version": ..., "kp": {"2025-01-01": [8 kps], ...}} or {"error": ...}. a day is only predicted
+if it's within the model's horizon of the last day in the databases'''
+
+from __future__ import annotations
+
+from typing import Any, Callable
+
+import os
+import sys
+import json
+import socket
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'spacew'))
+
+from lock import locked
+from spacew_db import DB_DIR
+
+MODEL_FILE = os.path.join(DB_DIR, 'model.keras')
+SOCKET_FILE = os.path.join(DB_DIR, 'predict.sock')
+# seconds the server waits for more requests after the first one before predicting them together
+BATCH_WAIT = 0.005
+# windows in one model.predict call at most
+MAX_BATCH = 512
+# predictions kept, one per window
+CACHE_SIZE = 4096
+# seconds the cli waits for the server before predicting itself
+CLIENT_TIMEOUT = 10
+
+
+def meta_file(model_file: str) -> str:
+    '''the json file next to a model with its window size and the statistics it was trained with'''
+    return os.path.splitext(model_file)[0] + '.json'
+
+
+def save_meta(model_file: str, windows: Any) -> None:
+    '''records what a model was trained on from its training Windows, ai.py calls this when it saves one'''
+    meta = {
+        'history': windows.history,
+        'horizon': windows.horizon,
+        'fields': None if windows.fields is None else list(windows.fields),
+        'stats': {name: list(values) if name == 'names' else values.tolist() for name, values in windows.stats.items()},
+    }
+    with open(meta_file(model_file) + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(meta, file)
+    os.replace(meta_file(model_file) + '.tmp', meta_file(model_file))
+
+
+def horizon(model_file: str = MODEL_FILE) -> int | None:
+    '''how many days past the last day in the databases a model predicts, None if there's no model'''
+    try:
+        with open(meta_file(model_file), 'r', encoding='utf-8') as file:
+            return json.load(file)['horizon']
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+class Predictor:
+    '''a loaded model and the cache of its predictions
+
+    `model` can be anything with keras' predict(x), by default the model in `model_file` is loaded
+    with keras the first time it's needed, and again if the file changes'''
+
+    def __init__(self, model_file: str = MODEL_FILE, directory: str | None = None, model: Any = None, \
+                 cache_size: int = CACHE_SIZE) -> None:
+        from dataset import Dataset
+        self.model_file = model_file
+        self.dataset = Dataset(directory)
+        self.model = model
+        self.from_file = model is None
+        self.cache_size = cache_size
+        self.cache: OrderedDict[tuple[str, str], Any] = OrderedDict()
+        # the features of each shard, see windows.inputs
+        self.shards: dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stamp = None
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        '''reads the meta file and loads the model, again whenever either of them changes'''
+        files = [meta_file(self.model_file)] + ([self.model_file] if self.from_file else [])
+        stamp = [(stat.st_mtime_ns, stat.st_size) for stat in map(os.stat, files)]
+        if stamp == self.stamp:
+            return
+        digest = hashlib.sha1()
+        contents = []
+        for name in files:
+            with open(name, 'rb') as file:
+                contents.append(file.read())
+            digest.update(contents[-1])
+        meta = json.loads(contents[0])
+        if self.from_file:
+            os.environ.setdefault('KERAS_BACKEND', 'tensorflow')
+            import keras
+            self.model = keras.saving.load_model(self.model_file)
+        self.history, self.horizon = meta['history'], meta['horizon']
+        self.fields = None if meta['fields'] is None else tuple(meta['fields'])
+        self.stats = meta['stats']
+        self.shards = {}
+        self.version, self.stamp = digest.hexdigest()[:16], stamp
+
+    def issues(self, days: list[date]) -> dict[date, tuple[date, int]]:
+        '''the days that can be predicted, each to the last day of its window and how many days after it it is'''
+        from database import from_field
+        entries = [entry for entry in self.dataset.manifest.values() if entry['rows']]
+        if not entries:
+            return {}
+        first = min(from_field(entry['start'], self.dataset.fntype) for entry in entries)
+        last = max(from_field(entry['end'], self.dataset.fntype) for entry in entries)
+        out = {}
+        for day in days:
+            issue = min(day - timedelta(days=1), last)
+            if issue >= first and 1 <= (day - issue).days <= self.horizon:
+                out[day] = (issue, (day - issue).days)
+        return out
+
+    def predict(self, days: list[date], run: Callable[[Any], Any] | None = None) -> dict[date, list[float]]:
+        '''the 8 kps of each day that can be predicted, `run` gives the model's output for a batch of
+        windows, the model's own predict by default'''
+        import numpy as np
+        import windows
+        with self.lock:
+            self.load()
+            self.dataset.refresh()
+            issues = self.issues(days)
+            version, history, stats, fields, shards = self.version, self.history, self.stats, self.fields, self.shards
+        ends = sorted({issue + timedelta(days=1) for issue, _ in issues.values()})
+        x = windows.inputs(self.dataset, ends, history, stats, fields, shards)
+        keys = [(version, hashlib.sha1(window.tobytes()).hexdigest()) for window in x]
+        outputs = {}
+        with self.lock:
+            for end, key in zip(ends, keys):
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    outputs[end] = self.cache[key]
+                    self.hits += 1
+            self.misses += len(ends) - len(outputs)
+        todo = [i for i, end in enumerate(ends) if end not in outputs]
+        if todo:
+            y = (run or self.run)(x[todo])
+            with self.lock:
+                for i, values in zip(todo, y):
+                    outputs[ends[i]] = self.cache[keys[i]] = np.asarray(values).tolist()
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        out = {}
+        for day, (issue, step) in issues.items():
+            out[day] = outputs[issue + timedelta(days=1)][(step - 1) * 8:step * 8]
+        return out
+
+    def run(self, x: Any) -> Any:
+        return self.model.predict(x, verbose=0)
+
+
+class Batcher:
+    '''puts the windows that come in from several threads together into one model.predict call
+
+    the first batch waits BATCH_WAIT seconds for others to join it, a call happens sooner when
+    MAX_BATCH windows are waiting'''
+
+    def __init__(self, predictor: Predictor, wait: float = BATCH_WAIT, max_batch: int = MAX_BATCH) -> None:
+        self.predictor = predictor
+        self.wait = wait
+        self.max_batch = max_batch
+        self.pending: list[tuple[Any, dict[str, Any]]] = []
+        self.condition = threading.Condition()
+        self.calls = 0
+        self.windows = 0
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def run(self, x: Any) -> Any:
+        '''the model's output for the windows in `x`, waits for the batch they go in'''
+        result = {'done': threading.Event()}
+        with self.condition:
+            self.pending.append((x, result))
+            self.condition.notify()
+        result['done'].wait()
+        if 'error' in result:
+            raise result['error']
+        return result['y']
+
+    def _take(self) -> list[tuple[Any, dict[str, Any]]]:
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            self.condition.wait_for(lambda: sum(len(x) for x, _ in self.pending) >= self.max_batch, self.wait)
+            out, size = [], 0
+            while self.pending and (not out or size + len(self.pending[0][0]) <= self.max_batch):
+                out.append(self.pending.pop(0))
+                size += len(out[-1][0])
+            return out
+
+    def _loop(self) -> None:
+        import numpy as np
+        while True:
+            batch = self._take()
+            try:
+                y = self.predictor.run(np.concatenate([x for x, _ in batch]))
+                self.calls += 1
+                self.windows += len(y)
+                i = 0
+                for x, result in batch:
+                    result['y'] = y[i:i + len(x)]
+                    i += len(x)
+            except Exception as e:
+                for _, result in batch:
+                    result['error'] = e
+            for _, result in batch:
+                result['done'].set()
+
+
+def serve(socket_file: str = SOCKET_FILE, predictor: Predictor | None = None, \
+          ready: threading.Event | None = None) -> None:
+    '''answers predictions on a unix socket until stopped, only one server runs at a time'''
+    import socketserver
+    if predictor is None:
+        predictor = Predictor()
+
+    class Server(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+        # clients that connect at the same time wait in the backlog, the default of 5 refuses some
+        request_queue_size = 128
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    days = [date.fromisoformat(day) for day in json.loads(line)['days']]
+                    kps = predictor.predict(days, batcher.run)
+                    reply = {'version': predictor.version, 'kp': {str(day): values for day, values in kps.items()}}
+                except Exception as e:
+                    reply = {'error': f'{type(e).__name__}: {e}'}
+                self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+    with locked(socket_file + '.lock', blocking=False):
+        batcher = Batcher(predictor)
+        try:
+            os.remove(socket_file)
+        except FileNotFoundError:
+            pass
+        with Server(socket_file, Handler) as server:
+            if ready is not None:
+                ready.set()
+            try:
+                server.serve_forever()
+            finally:
+                os.remove(socket_file)
+
+
+def request(days: list[date], socket_file: str = SOCKET_FILE, timeout: float = CLIENT_TIMEOUT) -> dict[date, list[float]]:
+    '''asks the server for predictions, raises OSError if it isn't running'''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_file)
+        client.sendall(json.dumps({'days': [str(day) for day in days]}).encode('utf-8') + b'\n')
+        with client.makefile('rb') as file:
+            reply = json.loads(file.readline())
+    if 'error' in reply:
+        raise RuntimeError(f'prediction server: {reply["error"]}')
+    return {date.fromisoformat(day): values for day, values in reply['kp'].items()}
+
+
+def predict(days: list[date], socket_file: str = SOCKET_FILE, model_file: str = MODEL_FILE) -> dict[date, list[float]]:
+    '''the predicted 8 kps of the days that can be predicted, from the server if it's running and
+    from the model loaded in this process otherwise, nothing if there's no model'''
+    try:
+        return request(days, socket_file)
+    except OSError:
+        pass
+    if not os.path.exists(meta_file(model_file)):
+        return {}
+    return Predictor(model_file).predict(days)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='serves kp predictions so the cli doesn\'t load the model each time')
+    parser.add_argument('--model', default=MODEL_FILE, help='the model to serve')
+    parser.add_argument('--socket', default=SOCKET_FILE, help='the unix socket to listen on')
+    args = parser.parse_args()
+    try:
+        serve(args.socket, Predictor(args.model))
+    except BlockingIOError:
+        print('spacew: error: a prediction server is already running', file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
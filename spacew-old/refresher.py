@@ -0,0 +1,97 @@
+
+'''keeps the cache warm so the cli never waits on the network
+
+usage: python refresher.py [--once] [--tick seconds]
+
+each source is fetched again a while after it was last fetched, matched to how often it's updated,
+so its cache entry doesn't expire while the refresher runs. the cli answers from the cache, and
+while the refresher holds refresher.lock in the cache directory it leaves the fetching to it.
+--once fetches what's due and exits, the cli starts it that way to refresh in the background'''
+
+import os
+import sys
+import argparse
+from time import sleep
+from typing import Callable
+from datetime import date
+
+import data
+from lock import locked
+
+# seconds after a source was fetched that it's fetched again. gfz's nowcast gets new values every
+# three hours and its file since 1932 a new day once a day, swpc's forecast is issued twice a day,
+# and the current year's warehouse files get a new day once a day. each is under its cache ttl
+INTERVALS = {
+    'gfz': 1800,
+    'gfz nowcast': 900,
+    'swpc forecast': 1800,
+    'swpc DSD': 21600,
+    'swpc DPD': 21600,
+}
+TICK = 60
+
+
+def due() -> dict[str, tuple[list[str], Callable[[], None]]]:
+    '''the sources to fetch now, with their keys and fetch functions
+
+    the current year's warehouse files are fetched on their interval, and any other year's as soon
+    as it has expired, which is what the cli asks the refresher for when it answers from them'''
+    year = date.today().year
+    out = {}
+    for name, interval in INTERVALS.items():
+        keys, func = data.source(name, [year])
+        ages = [data.cache.age(key) for key in keys]
+        stale = any(age is None or age >= interval for age in ages)
+        kind = name.removeprefix('swpc ')
+        if kind in ('DSD', 'DPD'):
+            years = [past for past in data.expired_warehouse_years(kind) if past != year] + ([year] if stale else [])
+            if years:
+                out[name] = data.source(name, years)
+        elif stale:
+            out[name] = (keys, func)
+    return out
+
+
+def refresh() -> dict[str, str]:
+    '''fetches the sources that are due, returns 'done' or the error for each'''
+    out = {}
+    for name, (_, func) in due().items():
+        try:
+            data.update_source(name, func)
+            out[name] = 'done'
+        except Exception as e:
+            out[name] = f'failed ({e})'
+    return out
+
+
+def run(tick: float = TICK) -> None:
+    '''refreshes whatever is due every `tick` seconds until stopped'''
+    os.makedirs(data.cache.directory, exist_ok=True)
+    try:
+        with locked(os.path.join(data.cache.directory, 'refresher.lock'), blocking=False):
+            while True:
+                for name, result in refresh().items():
+                    print(f'{name}: {result}', flush=True)
+                sleep(tick)
+    except BlockingIOError:
+        print('spacew: error: a refresher is already running', file=sys.stderr)
+        sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='keeps the space weather data in the cache up to date')
+    parser.add_argument('--once', action='store_true', help='refresh what is due and exit')
+    parser.add_argument('--tick', type=float, default=TICK, help='seconds between checks for sources that are due')
+    args = parser.parse_args()
+    if args.once:
+        for name, result in refresh().items():
+            print(f'{name}: {result}')
+    else:
+        try:
+            run(args.tick)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import mmap
+from time import time
+
+from lock import locked
+
+
+__all__ = ['CacheStore', 'CacheError', 'CACHE_DIR']
+
+
+CACHE_DIR = os.path.expanduser('~/.spacew/cache')
+# 256MB, a bit over ten copies of the gfz file
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+RE_KEY = re.compile(r'^[\w.-]+(/[\w.-]+)*$')
+
+
+class CacheError(Exception):
+    pass
+
+
+class CacheStore:
+    '''a directory of cached downloads, one file per key, each with its own time to live
+
+    keys look like paths, 'gfz/Kp_ap_since_1932.txt' or 'swpc/warehouse/2003_DSD.txt'. an entry
+    with a ttl of None never expires. the entries' times and ttls are kept in index.json, and when
+    the entries add up to more than `max_bytes` the least recently used ones are evicted. several
+    processes can share a cache directory. `sidecars` are the suffixes of files that callers keep
+    next to an entry's file, like fetch.sync_file's '.sync', they count towards the entry's size and
+    are removed with it'''
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, sidecars: tuple[str, ...] = ()):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sidecars = tuple(sidecars)
+        self.index_file = os.path.join(directory, 'index.json')
+        self.lockfile = self.index_file + '.lock'
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index = {}
+        self._index_stamp = None
+
+    def _locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return locked(self.lockfile)
+
+    def _check_key(self, key: str) -> None:
+        if not RE_KEY.match(key) or any(part in ('.', '..') for part in key.split('/')) or key == 'index.json':
+            raise CacheError(f'invalid cache key: {key!r}')
+
+    def _load_index(self) -> dict[str, dict]:
+        try:
+            stat = os.stat(self.index_file)
+        except FileNotFoundError:
+            self._index, self._index_stamp = {}, None
+            return self._index
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if stamp != self._index_stamp:
+            with open(self.index_file, 'r', encoding='utf-8') as file:
+                self._index = json.load(file)
+            self._index_stamp = stamp
+        return self._index
+
+    def _save_index(self, index: dict[str, dict]) -> None:
+        part = self.index_file + '.part'
+        with open(part, 'w', encoding='utf-8') as file:
+            json.dump(index, file, indent=1)
+        os.replace(part, self.index_file)
+
+    def path(self, key: str) -> str:
+        '''the filename an entry is stored in, for writing an entry in place before commit'''
+        self._check_key(key)
+        filename = os.path.join(self.directory, *key.split('/'))
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        return filename
+
+    def _entry(self, key: str, stale: bool = False) -> dict | None:
+        '''the entry for a key if it's there and hasn't expired, or even if it has when `stale` is true'''
+        self._check_key(key)
+        entry = self._load_index().get(key)
+        if entry is None or (not stale and entry['ttl'] is not None and time() - entry['time'] > entry['ttl']):
+            return None
+        filename = os.path.join(self.directory, *key.split('/'))
+        try:
+            os.utime(filename)
+        except FileNotFoundError:
+            return None
+        return entry
+
+    def fresh(self, key: str, stale: bool = False) -> bool:
+        '''whether there is an entry for a key that hasn't expired, counted as a hit or miss'''
+        if self._entry(key, stale) is None:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def age(self, key: str) -> float | None:
+        '''seconds since an entry was stored, even if it expired, None if there's no entry'''
+        self._check_key(key)
+        entry = self._load_index().get(key)
+        return None if entry is None else time() - entry['time']
+
+    def stamp(self, key: str) -> tuple[float, int] | None:
+        '''when an entry was stored and its size, which changes each time it's stored, None if there's no entry
+
+        an entry's mtime can't tell, it's touched whenever the entry is used'''
+        self._check_key(key)
+        entry = self._load_index().get(key)
+        return None if entry is None else (entry['time'], entry['size'])
+
+    def expired(self, prefix: str = '') -> list[str]:
+        '''the keys of the entries that start with `prefix` and have expired'''
+        now = time()
+        return [key for key, entry in self._load_index().items() \
+                if key.startswith(prefix) and entry['ttl'] is not None and now - entry['time'] > entry['ttl']]
+
+    def get(self, key: str, stale: bool = False) -> bytes | None:
+        '''the contents of an entry, or None if it's missing or expired, expired ones are given if `stale` is true'''
+        if not self.fresh(key, stale):
+            return None
+        try:
+            with open(self.path(key), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def map(self, key: str, stale: bool = False) -> mmap.mmap | None:
+        '''a read only memory map of an entry, or None if it's missing, expired or empty'''
+        if not self.fresh(key, stale):
+            return None
+        try:
+            with open(self.path(key), 'rb') as file:
+                return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key: str, data: bytes | str, ttl: float | None = None) -> None:
+        '''stores an entry, replacing any old one'''
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        filename = self.path(key)
+        with open(filename + '.part', 'wb') as file:
+            file.write(data)
+        os.replace(filename + '.part', filename)
+        self.commit(key, ttl)
+
+    def commit(self, key: str, ttl: float | None = None) -> None:
+        '''records an entry that was written in place at path(key), restarting its ttl, its sidecars
+        should be written first to be counted'''
+        filename = self.path(key)
+        size = os.path.getsize(filename)
+        for suffix in self.sidecars:
+            try:
+                size += os.path.getsize(filename + suffix)
+            except FileNotFoundError:
+                pass
+        with self._locked():
+            index = dict(self._load_index())
+            index[key] = {'time': time(), 'ttl': ttl, 'size': size}
+            self._evict(index, keep=key)
+            self._save_index(index)
+
+    def _evict(self, index: dict[str, dict], keep: str) -> None:
+        total = sum(entry['size'] for entry in index.values())
+        if total <= self.max_bytes:
+            return
+        used = {}
+        for key in index:
+            try:
+                used[key] = os.stat(os.path.join(self.directory, *key.split('/'))).st_mtime
+            except FileNotFoundError:
+                used[key] = 0
+        for key in sorted(used, key=used.get):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= index.pop(key)['size']
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        filename = os.path.join(self.directory, *key.split('/'))
+        for name in (filename,) + tuple(filename + suffix for suffix in self.sidecars):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+    def invalidate(self, key: str) -> None:
+        '''removes an entry'''
+        self._check_key(key)
+        with self._locked():
+            index = dict(self._load_index())
+            if index.pop(key, None) is not None:
+                self._save_index(index)
+            self._remove(key)
+
+    def clear(self) -> None:
+        '''removes every entry'''
+        with self._locked():
+            for key in self._load_index():
+                self._remove(key)
+            self._save_index({})
+
+    def stats(self) -> dict[str, int]:
+        index = self._load_index()
+        now = time()
+        return {
+            'entries': len(index),
+            'expired': sum(1 for entry in index.values() if entry['ttl'] is not None and now - entry['time'] > entry['ttl']),
+            'bytes': sum(entry['size'] for entry in index.values()),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
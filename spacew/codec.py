@@ -0,0 +1,245 @@
+
+from __future__ import annotations
+
+from typing import Any, NamedTuple
+
+from datetime import datetime, date, time
+import numpy as np
+from numpy import ma
+
+from database import RE_ESCAPE, from_field, split_fields, strlist, intlist, timelist
+
+
+__all__ = ['Ragged', 'decode_column', 'encode_column', 'column_array', 'take', 'concatenate', 'structured']
+
+
+class Ragged(NamedTuple):
+    '''a column of variable length lists, row i is values[offsets[i]:offsets[i + 1]]'''
+    offsets: np.ndarray
+    values: np.ndarray
+    mask: np.ndarray
+
+    def row(self, index: int) -> np.ndarray:
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+def parse_ints(text: str) -> np.ndarray:
+    try:
+        return np.fromstring(text, dtype=np.int64, sep=':')
+    except ValueError:
+        # from_field accepts floats for int fields
+        return np.fromstring(text, dtype=np.float64, sep=':').astype(np.int64)
+
+def parse_times(items: list[str], unit: str = 'us') -> np.ndarray:
+    '''parses iso times into timedelta64 since midnight'''
+    items = ['1970-01-01T' + item for item in items]
+    return np.array(items, dtype=f'datetime64[{unit}]') - np.datetime64(0, unit)
+
+def parse_clock(text: str) -> np.ndarray:
+    '''parses times written as hh;mm;ss and joined with ':' into timedelta64 since midnight'''
+    if text == '':
+        return np.zeros(0, dtype='timedelta64[us]')
+    if '.' not in text and '\\' not in text:
+        hms = np.fromstring(text.replace(';', ':'), dtype=np.int64, sep=':').reshape(-1, 3)
+        return (hms @ np.array([3600000000, 60000000, 1000000])).astype('timedelta64[us]')
+    return parse_times(unescape([item.replace(';', ':') for item in text.split(':')]))
+
+def unescape(items: list[str]) -> list[str]:
+    return [RE_ESCAPE.sub(r'\1', item) if '\\' in item else item for item in items]
+
+
+def decode_column(fields: list[str], dtype: type, width: int | None = None) -> ma.MaskedArray | Ragged:
+    '''decodes a whole column of text fields at once
+
+    scalars become 1-D masked arrays, lists become 2-D masked arrays when every row has the same length
+    (or `width` is given) and Ragged otherwise, null fields are masked'''
+    mask = np.array([field == '' for field in fields], dtype=bool)
+    present = [field for field in fields if field != '']
+    if dtype == bool:
+        return ma.MaskedArray(~mask, mask)
+    elif dtype == int:
+        values = np.zeros(len(fields), dtype=np.int64)
+        values[~mask] = parse_ints(':'.join(present))
+    elif dtype == float:
+        values = np.full(len(fields), np.nan)
+        # float() is faster than numpy's own string parsing for full precision reprs
+        values[~mask] = np.fromiter(map(float, present), dtype=np.float64, count=len(present))
+    elif dtype == date:
+        values = np.array([field or 'NaT' for field in fields], dtype='datetime64[D]')
+    elif dtype == datetime:
+        values = np.array([field or 'NaT' for field in fields], dtype='datetime64[us]')
+    elif dtype == time:
+        values = np.zeros(len(fields), dtype='timedelta64[us]')
+        values[~mask] = parse_times(present)
+    elif dtype == str:
+        values = np.array(unescape(fields), dtype=str)
+    elif dtype == complex:
+        values = np.array([0j if field == '' else from_field(field, complex) for field in fields], dtype=complex)
+    elif dtype in (intlist, strlist, timelist):
+        if dtype == intlist:
+            lengths = [field.count(':') + 1 if field else 0 for field in fields]
+            values = parse_ints(':'.join(present))
+        elif dtype == timelist:
+            # the colons inside each time are escaped, so only the unescaped ones separate items
+            lengths = [field.count(':') - field.count('\\:') + 1 if field else 0 for field in fields]
+            values = parse_clock(':'.join(present).replace('\\:', ';'))
+        elif not any('\\' in field for field in present):
+            # nothing is escaped, so every colon separates items
+            lengths = [field.count(':') + 1 if field else 0 for field in fields]
+            values = np.array(':'.join(present).split(':') if present else [], dtype=str)
+        else:
+            # each field is split on its own, an item ending in a backslash would run into the next row's
+            split = [split_fields(field, ':') if field else [] for field in fields]
+            lengths = [len(items) for items in split]
+            values = np.array(unescape([item for items in split for item in items]), dtype=str)
+        offsets = np.zeros(len(fields) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if width is None:
+            widths = {length for length in lengths if length}
+            width = widths.pop() if len(widths) == 1 else None
+        if width is None or any(length not in (0, width) for length in lengths):
+            return Ragged(offsets, values, mask)
+        out = np.zeros((len(fields), width), dtype=values.dtype)
+        out[~mask] = values.reshape(-1, width)
+        return ma.MaskedArray(out, np.repeat(mask, width).reshape(-1, width))
+    else:
+        raise ValueError(f'invalid data type: {dtype!r}')
+    return ma.MaskedArray(values, mask)
+
+
+def format_times(values: np.ndarray) -> list[str]:
+    return [str((datetime.min + value).time()) for value in values.astype('timedelta64[us]').tolist()]
+
+def escape(items: list[str]) -> list[str]:
+    return [item.replace('\\', '\\\\').replace(',', '\\,').replace(':', '\\:') for item in items]
+
+
+def encode_column(data: ma.MaskedArray | np.ndarray | Ragged, dtype: type) -> list[str]:
+    '''encodes a whole column back into text fields, the inverse of decode_column'''
+    if isinstance(data, Ragged):
+        mask = np.asarray(data.mask)
+        if dtype == intlist:
+            items = [repr(item) for item in data.values.tolist()]
+        elif dtype == timelist:
+            items = escape(format_times(data.values))
+        else:
+            items = escape(data.values.tolist())
+        offsets = data.offsets.tolist()
+        return ['' if mask[i] else ':'.join(items[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
+    mask = ma.getmaskarray(data)
+    values = ma.getdata(data)
+    if values.ndim == 2:
+        flat = Ragged(np.arange(0, values.size + 1, values.shape[1]), values.reshape(-1), mask.all(axis=1))
+        return encode_column(flat, dtype)
+    if dtype == bool:
+        items = ['1' if value else '' for value in values.tolist()]
+    elif dtype in (int, float):
+        items = [repr(value) for value in values.tolist()]
+    elif dtype in (date, datetime):
+        items = [str(value) for value in values.tolist()]
+    elif dtype == time:
+        items = format_times(values)
+    elif dtype == str:
+        items = escape(values.tolist())
+    elif dtype == complex:
+        items = [f'{value.real!r}+{value.imag!r}' for value in values.tolist()]
+    else:
+        raise ValueError(f'invalid data type: {dtype!r}')
+    return ['' if null else item for item, null in zip(items, mask.tolist())]
+
+
+def column_array(column: Any, width: int | None = None) -> ma.MaskedArray | Ragged:
+    '''wraps a memory mapped column of a columnar database in numpy arrays without copying'''
+    mask = np.frombuffer(column.mask, dtype=np.uint8) == 0
+    dtype = column.dtype
+    buffers = column.buffers
+    if dtype in ('bool', 'int', 'float'):
+        values = np.frombuffer(buffers['values'], dtype={'bool': np.bool_, 'int': np.int64, 'float': np.float64}[dtype])
+    elif dtype == 'date':
+        # dates are stored as proleptic ordinals, day 1 being 0001-01-01
+        values = np.frombuffer(buffers['values'], dtype=np.int32) - np.int32(date(1970, 1, 1).toordinal())
+        values = values.astype('datetime64[D]')
+    elif dtype in ('time', 'intlist', 'timelist'):
+        values = np.frombuffer(buffers['values'], dtype=np.int64)
+        if dtype != 'intlist':
+            values = values.view('timedelta64[us]')
+    elif dtype == 'strlist':
+        items = np.frombuffer(buffers['items'], dtype=np.int64).tolist()
+        blob = bytes(buffers['values'])
+        values = np.array([blob[a:b].decode('utf-8') for a, b in zip(items, items[1:])], dtype=str)
+    else:
+        values = np.array(list(column), dtype=object)
+        return ma.MaskedArray(values, mask)
+    if dtype not in ('intlist', 'timelist', 'strlist'):
+        return ma.MaskedArray(values, mask)
+    offsets = np.frombuffer(buffers['offsets'], dtype=np.int64)
+    lengths = np.diff(offsets)
+    if width is None:
+        widths = np.unique(lengths[lengths > 0])
+        width = int(widths[0]) if len(widths) == 1 else None
+    if width is None or np.any((lengths != 0) & (lengths != width)) or np.any(lengths[~mask] == 0):
+        return Ragged(offsets, values, mask)
+    if not mask.any():
+        # every row is there, so the values already are the rows one after another
+        return ma.MaskedArray(values[offsets[0]:offsets[-1]].reshape(-1, width), np.zeros((len(lengths), width), dtype=bool))
+    out = np.zeros((len(lengths), width), dtype=values.dtype)
+    out[~mask] = values.reshape(-1, width)
+    return ma.MaskedArray(out, np.repeat(mask, width).reshape(-1, width))
+
+
+def take(column: ma.MaskedArray | Ragged, index: slice | np.ndarray) -> ma.MaskedArray | Ragged:
+    '''the rows of a column at `index`, a slice (with no step) is a view of the column'''
+    if not isinstance(column, Ragged):
+        return column[index]
+    if isinstance(index, slice):
+        start, stop, _ = index.indices(len(column))
+        offsets = column.offsets[start:stop + 1]
+        return Ragged(offsets - offsets[0], column.values[offsets[0]:offsets[-1]], column.mask[start:stop])
+    starts = column.offsets[index]
+    lengths = column.offsets[index + 1] - starts
+    offsets = np.zeros(len(index) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+    return Ragged(offsets, column.values[positions], column.mask[index])
+
+
+def as_ragged(column: ma.MaskedArray | Ragged) -> Ragged:
+    '''a 2-D list column as offsets and values, null rows have no values'''
+    if isinstance(column, Ragged):
+        return column
+    mask = ma.getmaskarray(column).all(axis=1)
+    lengths = np.where(mask, 0, column.shape[1])
+    offsets = np.zeros(len(column) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return Ragged(offsets, ma.getdata(column)[~mask].reshape(-1), mask)
+
+
+def concatenate(columns: list[ma.MaskedArray | Ragged]) -> ma.MaskedArray | Ragged:
+    '''joins the same column from several databases, list columns that don't all have one width become Ragged'''
+    if len(columns) == 1:
+        return columns[0]
+    if not any(isinstance(column, Ragged) for column in columns) and len({column.shape[1:] for column in columns}) == 1:
+        return ma.concatenate(columns)
+    columns = [as_ragged(column) for column in columns]
+    offsets = [columns[0].offsets]
+    for column in columns[1:]:
+        offsets.append(column.offsets[1:] + offsets[-1][-1])
+    return Ragged(np.concatenate(offsets), np.concatenate([column.values for column in columns]), \
+                  np.concatenate([column.mask for column in columns]))
+
+
+def structured(arrays: dict[str, ma.MaskedArray | Ragged]) -> ma.MaskedArray:
+    '''puts columns of the same length into one masked structured array, 2-D columns become subarray fields'''
+    ragged = [name for name, column in arrays.items() if isinstance(column, Ragged)]
+    if ragged:
+        raise ValueError(f'variable length columns can\'t be in a structured array: {", ".join(ragged)}')
+    length = len(next(iter(arrays.values()))) if arrays else 0
+    dtype = [(name, column.dtype, column.shape[1:]) for name, column in arrays.items()]
+    out = ma.MaskedArray(np.zeros(length, dtype=dtype), np.zeros(length, dtype=[(name, bool, shape) for name, _, shape in dtype]))
+    for name, column in arrays.items():
+        out.data[name] = ma.getdata(column)
+        out.mask[name] = ma.getmaskarray(column)
+    return out
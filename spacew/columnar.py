@@ -0,0 +1,261 @@
+
+from __future__ import annotations
+
+from typing import Any
+
+import os
+import json
+import mmap
+import struct
+from array import array
+from datetime import datetime, date, time
+
+
+__all__ = ['Column', 'ColumnFile', 'write_columns', 'read_header', 'is_columnar']
+
+
+MAGIC = b'SDBC'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+ALIGN = 8
+
+# typecodes for the fixed width types, everything else is stored as offsets + values
+FIXED_TYPES = {
+    'bool': 'B',
+    'int': 'q',
+    'float': 'd',
+    'date': 'i',
+    'time': 'q',
+}
+TEXT_TYPES = ('str', 'complex', 'datetime')
+LIST_TYPES = {
+    'intlist': 'q',
+    'timelist': 'q',
+}
+
+
+def time_to_int(value: time) -> int:
+    return ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000 + value.microsecond
+
+def int_to_time(value: int) -> time:
+    seconds, us = divmod(value, 1000000)
+    minutes, s = divmod(seconds, 60)
+    h, m = divmod(minutes, 60)
+    return time(h, m, s, us)
+
+
+def encode_scalar(dtype: str, value: Any) -> Any:
+    if dtype == 'date':
+        return value.toordinal()
+    elif dtype == 'time':
+        return time_to_int(value)
+    return value
+
+def decode_scalar(dtype: str, value: Any) -> Any:
+    if dtype == 'bool':
+        return bool(value)
+    elif dtype == 'date':
+        return date.fromordinal(value)
+    elif dtype == 'time':
+        return int_to_time(value)
+    return value
+
+def encode_text(dtype: str, value: Any) -> str:
+    if dtype == 'complex':
+        return f'{value.real!r}+{value.imag!r}'
+    elif dtype == 'datetime':
+        return value.isoformat()
+    return value
+
+def decode_text(dtype: str, value: str) -> Any:
+    if dtype == 'complex':
+        real, imag = value.split('+')
+        return complex(float(real), float(imag))
+    elif dtype == 'datetime':
+        return datetime.fromisoformat(value)
+    return value
+
+
+def is_columnar(filename: str) -> bool:
+    '''checks whether a file is in the binary columnar format'''
+    try:
+        with open(filename, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except FileNotFoundError:
+        return False
+
+
+def read_header(file: Any) -> tuple[dict[str, Any], int]:
+    '''reads the json header of a columnar file open for binary reading, gives it and where the data starts'''
+    magic, version, size = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f'not a columnar database: {file.name!r}')
+    if version != VERSION:
+        raise ValueError(f'unsupported columnar database version: {version}')
+    return json.loads(file.read(size)), HEADER.size + size
+
+
+class Column:
+    '''a typed, read only view of one column, backed directly by the buffers of a ColumnFile'''
+
+    def __init__(self, dtype: str, length: int, buffers: dict[str, memoryview]) -> None:
+        self.dtype = dtype
+        self.length = length
+        self.buffers = buffers
+        self.mask = buffers['mask']
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def values(self) -> memoryview:
+        '''the raw values, for fixed width types this is one item per row'''
+        return self.buffers['values']
+
+    @property
+    def offsets(self) -> memoryview | None:
+        return self.buffers.get('offsets')
+
+    def __getitem__(self, index: int) -> Any:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(f'column index out of range: {index}')
+        if not self.mask[index]:
+            return None
+        dtype = self.dtype
+        buffers = self.buffers
+        if dtype in FIXED_TYPES:
+            return decode_scalar(dtype, buffers['values'][index])
+        offsets = buffers['offsets']
+        start, end = offsets[index], offsets[index + 1]
+        if dtype in TEXT_TYPES:
+            return decode_text(dtype, bytes(buffers['values'][start:end]).decode('utf-8'))
+        elif dtype == 'intlist':
+            return buffers['values'][start:end].tolist()
+        elif dtype == 'timelist':
+            return [int_to_time(item) for item in buffers['values'][start:end]]
+        elif dtype == 'strlist':
+            items, blob = buffers['items'], buffers['values']
+            return [bytes(blob[items[i]:items[i + 1]]).decode('utf-8') for i in range(start, end)]
+        raise ValueError(f'invalid data type: {dtype!r}')
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
+
+def encode_column(dtype: str, values: list[Any]) -> dict[str, bytes | array]:
+    '''encodes a list of python values into the buffers for one column
+
+    an empty list is stored as None, the same as the text format and the journal store it'''
+    mask = bytes(not (value is None or isinstance(value, list) and not value) for value in values)
+    if dtype in FIXED_TYPES:
+        return {
+            'mask': mask,
+            'values': array(FIXED_TYPES[dtype], [0 if v is None else encode_scalar(dtype, v) for v in values]),
+        }
+    offsets = array('q', [0])
+    if dtype in TEXT_TYPES:
+        blob = bytearray()
+        for value in values:
+            if value is not None:
+                blob += encode_text(dtype, value).encode('utf-8')
+            offsets.append(len(blob))
+        return {'mask': mask, 'offsets': offsets, 'values': bytes(blob)}
+    elif dtype in LIST_TYPES:
+        out = array(LIST_TYPES[dtype])
+        for value in values:
+            if value is not None:
+                out.extend(value if dtype == 'intlist' else (time_to_int(v) for v in value))
+            offsets.append(len(out))
+        return {'mask': mask, 'offsets': offsets, 'values': out}
+    elif dtype == 'strlist':
+        items = array('q', [0])
+        blob = bytearray()
+        for value in values:
+            for item in value or ():
+                blob += item.encode('utf-8')
+                items.append(len(blob))
+            offsets.append(len(items) - 1)
+        return {'mask': mask, 'offsets': offsets, 'items': items, 'values': bytes(blob)}
+    raise ValueError(f'invalid data type: {dtype!r}')
+
+
+def buffer_format(dtype: str, buffer: str) -> str:
+    if buffer == 'mask':
+        return 'B'
+    elif buffer in ('offsets', 'items'):
+        return 'q'
+    elif dtype in FIXED_TYPES:
+        return FIXED_TYPES[dtype]
+    elif dtype in LIST_TYPES:
+        return LIST_TYPES[dtype]
+    return 'B'
+
+
+def write_columns(filename: str, header: dict[str, Any], columns: dict[str, tuple[str, list[Any]]]) -> None:
+    '''writes columns, as a dict of name to (dtype, values), to a columnar file'''
+    encoded = {name: encode_column(dtype, values) for name, (dtype, values) in columns.items()}
+    layout = {}
+    offset = 0
+    for name, buffers in encoded.items():
+        layout[name] = {}
+        for key, buffer in buffers.items():
+            nbytes = len(buffer) * (buffer.itemsize if isinstance(buffer, array) else 1)
+            layout[name][key] = [offset, nbytes]
+            offset += -(-nbytes // ALIGN) * ALIGN
+    header = dict(header, columns=layout, types={name: dtype for name, (dtype, _) in columns.items()})
+    header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    header += b' ' * (-(HEADER.size + len(header)) % ALIGN)
+    base = HEADER.size + len(header)
+    with open(filename, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(header)))
+        file.write(header)
+        for name, buffers in encoded.items():
+            for key, buffer in buffers.items():
+                start, nbytes = layout[name][key]
+                file.seek(base + start)
+                file.write(buffer.tobytes() if isinstance(buffer, array) else buffer)
+        file.truncate(base + offset)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+class ColumnFile:
+    '''a memory mapped columnar file, columns are views into the map and are never copied'''
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        with open(filename, 'rb') as file:
+            self.header, self.base = read_header(file)
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.length = self.header['rows']
+        self.types = self.header['types']
+        self._view = memoryview(self.map)
+        self._columns = {}
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, name: str) -> Column:
+        if name not in self._columns:
+            dtype = self.types[name]
+            buffers = {}
+            for key, (start, nbytes) in self.header['columns'][name].items():
+                start += self.base
+                buffers[key] = self._view[start:start + nbytes].cast(buffer_format(dtype, key))
+            self._columns[name] = Column(dtype, self.length, buffers)
+        return self._columns[name]
+
+    def close(self) -> None:
+        for column in self._columns.values():
+            for buffer in column.buffers.values():
+                buffer.release()
+        self._columns.clear()
+        self._view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # something still holds a slice of a column, the map is closed when it is garbage collected
+            pass
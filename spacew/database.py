@@ -1,15 +1,21 @@
 
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Callable, Iterator
 
 import re
 import json
 import os
+from collections import OrderedDict
+from functools import cache
+from bisect import bisect_left, bisect_right
+from itertools import batched
 from datetime import datetime, date, time
+from columnar import ColumnFile, write_columns, read_header, is_columnar
+from lock import locked
 
 
-__all__ = ['Row', 'Database', 'strlist', 'intlist', 'timelist']
+__all__ = ['Row', 'Database', 'DatabaseError', 'convert', 'strlist', 'intlist', 'timelist']
 
 
 class DatabaseError(Exception):
@@ -18,6 +24,9 @@ class DatabaseError(Exception):
 
 RE_COMMA = re.compile(r'(?<!\\),')
 RE_COLON = re.compile(r'(?<!\\):')
+RE_ESCAPE = re.compile(r'\\(.)')
+# a field up to the next separator, a backslash and the character after it are always part of the field
+RE_FIELDS = {sep: re.compile(rf'(?:\\.?|[^{sep}\\])*') for sep in ',:'}
 
 
 def field_enc_str(text: str) -> str:
@@ -26,6 +35,22 @@ def field_enc_str(text: str) -> str:
     text = text.replace(':', '\\:')
     return text
 
+def split_fields(text: str, sep: str = ',') -> list[str]:
+    '''splits text on the separators that aren't escaped
+
+    a lookbehind can't tell an escaped backslash from one that escapes the separator after it, so
+    the fields are matched from the start instead'''
+    if '\\' not in text:
+        return text.split(sep)
+    pattern = RE_FIELDS[sep]
+    out, pos = [], 0
+    while True:
+        end = pattern.match(text, pos).end()
+        out.append(text[pos:end])
+        if end >= len(text):
+            return out
+        pos = end + 1
+
 def field_dec_str(text: str) -> str:
     text = RE_COLON.sub(':', text)
     text = RE_COMMA.sub(',', text)
@@ -53,12 +78,17 @@ DATA_TYPES: dict[str, type] = {
     'timelist': timelist,
 }
 
-with open('meta_types.json', 'r', encoding='utf-8') as meta_types:
-    META_TYPES = json.load(meta_types)
+@cache
+def meta_types() -> dict[str, str]:
+    '''the types of the meta fields, read from meta_types.json the first time one is needed'''
+    with open(os.path.join(os.path.dirname(__file__), 'meta_types.json'), 'r', encoding='utf-8') as file:
+        return json.load(file)
 
 def to_field(data: Any) -> str:
     if data is None:
         return ''
+    if isinstance(data, list) and len(data) == 0:
+        return ''
     if isinstance(data, bool):
         return '1' if data else ''
     elif isinstance(data, int | float):
@@ -72,16 +102,16 @@ def to_field(data: Any) -> str:
     elif isinstance(data, list):
         if isinstance(data[0], str):
             try:
-                return ','.join([item.replace('\\', '\\\\').replace(',', '\\,') for item in data])
+                return ':'.join([field_enc_str(item) for item in data])
             except AttributeError:
                 raise ValueError('not all elements in strlist are strings') from None
         elif isinstance(data[0], int):
             try:
-                return ','.join([repr(item) for item in data])
+                return ':'.join([repr(item) for item in data])
             except AttributeError:
                 raise ValueError('not all elements in intlist are ints') from None
         elif isinstance(data[0], time):
-            return ','.join([str(item) for item in data])
+            return ':'.join([field_enc_str(str(item)) for item in data])
         else:
             raise ValueError(f'invalid type for list element: {type(data[0])!r}')
     else:
@@ -100,47 +130,57 @@ def from_field(data: str, dtype: type) -> Any:
         real, imag = data.split('+')
         return complex(float(real), float(imag))
     elif dtype == str:
-        return data.replace('\\,', ',').replace('\\\\', '\\')
+        return RE_ESCAPE.sub(r'\1', data)
     elif dtype in (date, time, datetime):
         return dtype.fromisoformat(data)
     elif dtype == strlist:
-        return [item.replace('\\,', ',').replace('\\\\', '\\') for item in RE_COMMA.split(data)]
+        return [RE_ESCAPE.sub(r'\1', item) for item in split_fields(data, ':')]
     elif dtype == intlist:
-        return [int(item) for item in RE_COMMA.split(data)]
+        return [int(item) for item in data.split(':')]
+    elif dtype == timelist:
+        return [time.fromisoformat(RE_ESCAPE.sub(r'\1', item)) for item in split_fields(data, ':')]
     else:
         raise ValueError(f'invalid data type: {dtype!r}')
 
 
 class Row:
+    '''a row of a database, fields that aren't given are decoded from the database on first access
+
+    databases use a subclass made by row_class, which has a slot for each field of the schema'''
+
+    __slots__ = ('_db', '_index', '_epoch', 'name')
+    _field_names: tuple[str, ...] = ()
 
-    def __init__(self, db: Database, name: str, fields: dict[str, Any]) -> None:
+    def __init__(self, db: Database, name: str, fields: dict[str, Any], index: int | None = None) -> None:
         self._db = db
+        self._index = index
+        self._epoch = None if index is None else db.epoch
         self.name = name
-        self._fields = fields
+        for field, value in fields.items():
+            setattr(self, field, value)
 
     def __getattr__(self, attr: str) -> Any:
-        if attr in self._fields:
-            return self._fields[attr]
-        else:
-            raise AttributeError(f'attribute not found: \'{attr}\'')
-
-    def __setattr__(self, attr: str, value: Any) -> None:
-        if attr.startswith('_') or attr == 'name':
-            self.__dict__[attr] = value
-        elif attr in self._fields:
-            self._fields[attr] = value
-        else:
-            self.__dict__[attr] = value
+        # only called for slots that haven't been set yet
+        if not attr.startswith('_') and attr in self._field_names and self._index is not None:
+            if self._epoch != self._db.epoch:
+                # the database was loaded again since, the index may be another row's now
+                self._index, self._epoch = self._db._index(self.name), self._db.epoch
+            value = self._db._field(self._index, attr)
+            setattr(self, attr, value)
+            return value
+        raise AttributeError(f'attribute not found: \'{attr}\'')
 
     def __getitem__(self, item: str) -> Any:
-        if item in self._fields:
-            return self._fields[item]
-        else:
-            raise KeyError(f'field not found: \'{item}\'')
+        if item in self._field_names:
+            try:
+                return getattr(self, item)
+            except AttributeError:
+                pass
+        raise KeyError(f'field not found: \'{item}\'')
 
     def __setitem__(self, item: str, value: Any) -> None:
-        if item in self._fields:
-            self._fields[item] = value
+        if item in self._field_names:
+            setattr(self, item, value)
         else:
             raise KeyError(f'field not found: \'{item}\'')
 
@@ -148,71 +188,633 @@ class Row:
         self._db[self.name] = self
 
 
+ROW_CLASSES: dict[tuple[str, ...], type[Row]] = {}
+
+def row_class(fields: tuple[str, ...]) -> type[Row]:
+    '''makes (once per schema) a Row subclass with a slot for each field'''
+    fields = tuple(fields)
+    if fields not in ROW_CLASSES:
+        ROW_CLASSES[fields] = type('Row', (Row,), {'__slots__': fields, '_field_names': fields})
+    return ROW_CLASSES[fields]
+
+
+class RowCache:
+    '''a bounded lru cache of decoded field values, keyed by row index'''
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.rows: OrderedDict[int, dict[str, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def row(self, index: int) -> dict[str, Any]:
+        try:
+            fields = self.rows[index]
+            self.rows.move_to_end(index)
+        except KeyError:
+            fields = self.rows[index] = {}
+            if len(self.rows) > self.maxsize:
+                self.rows.popitem(last=False)
+        return fields
+
+    def invalidate(self, index: int | None = None) -> None:
+        if index is None:
+            self.rows.clear()
+        else:
+            self.rows.pop(index, None)
+
+
+FORMATS = ('sdb', 'sdbc')
+
+# journals shorter than this are never compacted automatically
+JOURNAL_MIN = 1024
+
+# the header key of the generation of a database file, each compaction writes the next one. the
+# journal starts with the generation of the file it belongs to
+GENERATION = 'generation'
+GENERATION_LINE = f'#{GENERATION}='
+
+# called by save and compact with the lock held, before the rows are written. a hook returns a
+# function to call once they're written, or None. rollup.py adds itself here when it's imported
+SAVE_HOOKS: list[Callable[[Database], Callable[[], None] | None]] = []
+
+
+def meta_from_fields(meta: dict[str, str]) -> dict[str, Any]:
+    return {k: from_field(v, DATA_TYPES[meta_types().get(k, 'str')]) for k, v in meta.items()}
+
+
+def read_generation(filename: str) -> int | None:
+    '''the generation of the database file at a path, None if there's no file
+
+    unlike the inode, which the filesystem can give back after a few replaces, a generation is never
+    used twice, so a snapshot is current only if the file still has the generation it was loaded at'''
+    try:
+        if is_columnar(filename):
+            with open(filename, 'rb') as file:
+                return read_header(file)[0].get(GENERATION, 0)
+        with open(filename, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line[:1] != '#':
+                    break
+                if line.startswith(GENERATION_LINE):
+                    return int(line[len(GENERATION_LINE):])
+        return 0
+    except FileNotFoundError:
+        return None
+
+
 class Database:
 
     def __init__(self, filename: str, db_schema: dict[str, type] | None = None, \
-                 fntype: type | None = None, **metadata: Any):
+                 fntype: type | None = None, fmt: str | None = None, **metadata: Any):
         self.filename = filename
+        self.journal = filename + '.journal'
+        self.lockfile = filename + '.lock'
+        # counts the times the database was loaded again, rows made before look their index up again
+        self.epoch = 0
         if db_schema is None:
-            try:
-                with open(self.filename, 'r', encoding='utf-8') as file:
-                    data = file.readlines()
-            except FileNotFoundError:
-                raise ValueError('schema required for creating new database') from None
-            meta = [line.split('=') for line in data if line[0] != '#']
-            meta = {line[0]: '='.join(line[1]) for line in meta}
-            self.meta = {k: from_field(v, META_TYPES[k]) for k, v in meta.items()}
-            try:
-                schema = self.meta['schema']
-                schema = [DATA_TYPES[dtype] for dtype in schema]
-            except KeyError:
-                raise DatabaseError(f'database {filename!r} has invalid or no schema') from None
-            self.fntype, self.schema = schema[0], schema[1:]
-            data = [tuple(RE_COMMA.split(line)) for line in data]
-            self.fields = data[0][1:]
-            self.data = data
-            self.names = [row[0] for row in data]
+            self._open()
         else:
             if os.path.exists(self.filename):
                 raise DatabaseError(f'database already exists: \'{self.filename}\'')
+            if fmt is None:
+                fmt = 'sdbc' if self.filename.endswith('.sdbc') else 'sdb'
+            if fmt not in FORMATS:
+                raise ValueError(f'invalid database format: {fmt!r}')
+            self.fmt = fmt
             self.fields = tuple(db_schema.keys())
             self.schema = tuple(db_schema.values())
             if fntype is None:
                 raise TypeError('fntype required for creating new database')
+            if GENERATION in metadata:
+                raise ValueError(f'{GENERATION!r} is kept by the database, it can\'t be metadata')
             self.fntype = fntype
-            metadata['schema'] = ','.join([dtype.__name__ for dtype in self.schema])
+            metadata['schema'] = [dtype.__name__ for dtype in (fntype,) + self.schema]
             self.meta = metadata
-            self.data = []
+            self.saved_meta = {}
             self.names = []
+            if self.fmt == 'sdbc':
+                self.file = None
+                self.changed = {}
+            else:
+                self.data = []
+            self.generation = None
+            self._build_index([])
+
+    def _open(self) -> None:
+        '''loads the database and replays its journal as one consistent snapshot
+
+        a writer compacting replaces the file with one of the next generation before it removes the
+        journal, so if the file still has the generation that was loaded after the journal is read,
+        the two belong together. otherwise the load is retried, readers never take the lock'''
+        while True:
+            self._load()
+            self._replay()
+            if read_generation(self.filename) == self.generation:
+                return
+            if self.fmt == 'sdbc':
+                self.file.close()
+
+    def _load(self) -> None:
+        if is_columnar(self.filename):
+            self.fmt = 'sdbc'
+            self.file = ColumnFile(self.filename)
+            self.generation = self.file.header.get(GENERATION, 0)
+            self.meta = meta_from_fields(self.file.header['meta'])
+        else:
+            self.fmt = 'sdb'
+            try:
+                with open(self.filename, 'r', encoding='utf-8') as file:
+                    data = file.read().split('\n')
+            except FileNotFoundError:
+                raise ValueError('schema required for creating new database') from None
+            meta = [line[1:].split('=', 1) for line in data if line[:1] == '#']
+            meta = {line[0]: line[1] for line in meta}
+            self.generation = int(meta.pop(GENERATION, 0))
+            self.meta = meta_from_fields(meta)
+        self._load_schema()
+        self.saved_meta = dict(self.meta)
+        if self.fmt == 'sdbc':
+            self.fields = tuple(self.file.header['fields'])
+            self.changed = {}
+            keys = list(self.file['name'])
+            self.names = [to_field(name) for name in keys]
+        else:
+            data = [tuple(split_fields(line)) for line in data if line and line[0] != '#']
+            self.fields = data[0][1:]
+            self.data = data[1:]
+            self.names = [row[0] for row in self.data]
+            keys = [from_field(name, self.fntype) for name in self.names]
+        self._build_index(keys)
 
-    def __getitem__(self, item: str | int) -> Row:
-        if isinstance(item, str):
-            item = self.names.index(item)
+    def _load_schema(self) -> None:
         try:
-            row = self.data[item]
-            fields = {self.fields[i]: from_field(field, self.schema[i]) for i, field in enumerate(row[1:])}
-            return Row(self, from_field(row[0], self.fntype), fields)
+            schema = self.meta['schema']
+            schema = [DATA_TYPES[dtype] for dtype in schema]
         except KeyError:
-            raise ValueError(f'item {item!r} not in database') from None
+            raise DatabaseError(f'database {self.filename!r} has invalid or no schema') from None
+        self.fntype, self.schema = schema[0], tuple(schema[1:])
+
+    @classmethod
+    def scan(cls, filename: str, fields: tuple[str, ...] | None = None, \
+             where: Callable[[Row], bool] | None = None) -> Iterator[Row]:
+        '''yields the rows of a database one at a time without loading the whole file
+
+        only `fields` (default all) are decoded, and `where` is given the decoded row, rows that it
+        returns false for are skipped. the rows are read only, journaled changes are included'''
+        db = cls.__new__(cls)
+        db.filename = filename
+        db.journal = filename + '.journal'
+        if is_columnar(filename):
+            rows = db._scan_columnar(fields)
+        else:
+            rows = db._scan_text(fields)
+        for name, values in rows:
+            row = db.row_class(db, name, values)
+            if where is None or where(row):
+                yield row
+
+    @classmethod
+    def scan_chunks(cls, filename: str, size: int = 1024, fields: tuple[str, ...] | None = None, \
+                    where: Callable[[Row], bool] | None = None) -> Iterator[tuple[Row, ...]]:
+        '''like scan, but yields the rows in blocks of up to `size` rows'''
+        return batched(cls.scan(filename, fields, where), size)
+
+    def _scan_header(self, fields: tuple[str, ...] | None) -> tuple[tuple[str, ...], dict[str, tuple[str, ...]]]:
+        self._load_schema()
+        self.field_index = {field: i for i, field in enumerate(self.fields)}
+        self.row_class = row_class(self.fields)
+        if fields is None:
+            fields = self.fields
+        # the journal is small, so its rows are held to replace the stale ones as they are reached
+        journal = {}
+        for line in self._read_journal()[0]:
+            if line and line[0] != '#':
+                row = tuple(split_fields(line))
+                journal[row[0]] = row
+        return fields, journal
+
+    def _scan_text(self, fields: tuple[str, ...] | None) -> Iterator[tuple[Any, dict[str, Any]]]:
+        # same check as _open, the journal has to be read before the file is replaced
+        while True:
+            file = open(self.filename, 'r', encoding='utf-8')
+            meta = {}
+            for line in file:
+                line = line.rstrip('\n')
+                if line[:1] != '#':
+                    break
+                k, v = line[1:].split('=', 1)
+                meta[k] = v
+            self.generation = int(meta.pop(GENERATION, 0))
+            self.meta = meta_from_fields(meta)
+            self.fields = tuple(split_fields(line)[1:])
+            scan_fields, journal = self._scan_header(fields)
+            if read_generation(self.filename) == self.generation:
+                break
+            file.close()
+        fields = scan_fields
+        with file:
+            decode = [(field, self.field_index[field] + 1, self.schema[self.field_index[field]]) for field in fields]
+            def rows():
+                for line in file:
+                    line = line.rstrip('\n')
+                    if line:
+                        row = tuple(split_fields(line))
+                        yield journal.pop(row[0], row)
+                yield from journal.values()
+            for row in rows():
+                yield from_field(row[0], self.fntype), {field: from_field(row[i], dtype) for field, i, dtype in decode}
+
+    def _scan_columnar(self, fields: tuple[str, ...] | None) -> Iterator[tuple[Any, dict[str, Any]]]:
+        while True:
+            file = ColumnFile(self.filename)
+            self.generation = file.header.get(GENERATION, 0)
+            self.meta = meta_from_fields(file.header['meta'])
+            self.fields = tuple(file.header['fields'])
+            scan_fields, journal = self._scan_header(fields)
+            if read_generation(self.filename) == self.generation:
+                break
+            file.close()
+        fields = scan_fields
+        try:
+            names = file['name']
+            columns = [(field, file[field]) for field in fields]
+            decode = [(field, self.field_index[field] + 1, self.schema[self.field_index[field]]) for field in fields]
+            for index in range(len(file)):
+                name = names[index]
+                row = journal.pop(to_field(name), None) if journal else None
+                if row is None:
+                    yield name, {field: column[index] for field, column in columns}
+                else:
+                    yield name, {field: from_field(row[i], dtype) for field, i, dtype in decode}
+            for row in journal.values():
+                yield from_field(row[0], self.fntype), {field: from_field(row[i], dtype) for field, i, dtype in decode}
+        finally:
+            file.close()
+
+    def _build_index(self, keys: list[Any]) -> None:
+        self.field_index = {field: i for i, field in enumerate(self.fields)}
+        self.row_class = row_class(self.fields)
+        self.cache = RowCache()
+        self.dirty = set()
+        self.journal_rows = 0
+        self.journal_offset = 0
+        # hash index from encoded name to row, and the decoded names in sorted order with their rows
+        self.index = {name: i for i, name in enumerate(self.names)}
+        if len(self.index) != len(self.names):
+            raise DatabaseError(f'database {self.filename!r} has duplicate names')
+        self.order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in self.order]
+
+    def __enter__(self) -> Database:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        '''releases the memory map of a columnar database, a text one keeps nothing open'''
+        if self.fmt == 'sdbc' and self.file is not None:
+            self.file.close()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, item: Any) -> bool:
+        return to_field(item) in self.index
+
+    def _index(self, item: Any) -> int:
+        if isinstance(item, int):
+            if item < 0:
+                item += len(self.names)
+            if not 0 <= item < len(self.names):
+                raise IndexError(f'row index out of range: {item}')
+            return item
+        try:
+            return self.index[to_field(item)]
+        except KeyError:
+            raise KeyError(f'item {item!r} not in database') from None
+
+    def range(self, start: Any = None, end: Any = None) -> Iterator[Row]:
+        '''yields the rows with start <= name < end in name order, either bound can be None'''
+        lo = 0 if start is None else bisect_left(self.keys, start)
+        hi = len(self.keys) if end is None else bisect_left(self.keys, end)
+        for pos in range(lo, hi):
+            yield self[self.order[pos]]
+
+    slice = range
+
+    def _name(self, index: int) -> Any:
+        if self.fmt == 'sdb':
+            return from_field(self.names[index], self.fntype)
+        elif index in self.changed:
+            return self.changed[index][0]
+        return self.file['name'][index]
+
+    def _decode(self, index: int, field: str) -> Any:
+        i = self.field_index[field]
+        if self.fmt == 'sdb':
+            return from_field(self.data[index][i + 1], self.schema[i])
+        elif index in self.changed:
+            return self.changed[index][i + 1]
+        return self.file[field][index]
+
+    def _field(self, index: int, field: str) -> Any:
+        fields = self.cache.row(index)
+        if field in fields:
+            self.cache.hits += 1
+            return fields[field]
+        self.cache.misses += 1
+        value = fields[field] = self._decode(index, field)
+        return value
+
+    def __getitem__(self, item: Any) -> Row | list[Row]:
+        if isinstance(item, slice):
+            return list(self.range(item.start, item.stop))
+        index = self._index(item)
+        return self.row_class(self, self._name(index), {}, index)
+
+    def get(self, item: Any, fields: tuple[str, ...] | None = None) -> Row:
+        '''gets a row, decoding only the given fields up front'''
+        index = self._index(item)
+        if fields is None:
+            fields = self.fields
+        return self.row_class(self, self._name(index), {field: self._field(index, field) for field in fields}, index)
 
     def __setitem__(self, item: Any, value: Row) -> None:
-        if not isinstance(item, int):
-            item = to_field(item)
-            item = self.names.index(item)
-        self.data[item] = (to_field(value.name),) + tuple(to_field(field) for field in value._fields.values())
+        item = self._index(item)
+        values = tuple(value[field] for field in self.fields)
+        if self.fmt == 'sdb':
+            self.data[item] = (to_field(value.name),) + tuple(to_field(field) for field in values)
+        else:
+            # an empty list is written as an empty field, which reads back as None
+            self.changed[item] = (value.name,) + tuple(None if isinstance(v, list) and not v else v for v in values)
+        self.cache.invalidate(item)
+        self.dirty.add(item)
 
     def new_row(self, name: Any):
         dname = to_field(name)
-        self.data.append((dname,) + (None,) * len(self.fields))
+        if dname in self.index:
+            raise DatabaseError(f'row already exists: {name!r}')
+        index = len(self.names)
+        self.index[dname] = index
+        if not self.keys or self.keys[-1] <= name:
+            self.keys.append(name)
+            self.order.append(index)
+        else:
+            pos = bisect_right(self.keys, name)
+            self.keys.insert(pos, name)
+            self.order.insert(pos, index)
+        if self.fmt == 'sdb':
+            self.data.append((dname,) + ('',) * len(self.fields))
+        else:
+            self.changed[index] = (name,) + (None,) * len(self.fields)
         self.names.append(dname)
-        return Row(self, name, {field: None for field in self.fields})
+        self.dirty.add(index)
+        return self.row_class(self, name, {field: None for field in self.fields}, index)
 
     add_row = new_row
 
+    def column(self, field: str) -> list[Any]:
+        '''gets all values of a field, for columnar databases this is a view into the file'''
+        if self.fmt == 'sdbc' and self.file is not None and not self.changed:
+            return self.file[field]
+        if self.fmt == 'sdb':
+            i = self.field_index[field]
+            return [from_field(row[i + 1], self.schema[i]) for row in self.data]
+        return [self._decode(index, field) for index in range(len(self.names))]
+
+    def array(self, field: str, width: int | None = None) -> Any:
+        '''decodes a whole field into numpy arrays at once, see codec.decode_column'''
+        import codec
+        if self.fmt == 'sdbc' and self.file is not None and not self.changed:
+            return codec.column_array(self.file[field], width)
+        i = self.field_index[field]
+        if self.fmt == 'sdb':
+            fields = [row[i + 1] for row in self.data]
+        else:
+            fields = [to_field(self._decode(index, field)) for index in range(len(self.names))]
+        return codec.decode_column(fields, self.schema[i], width)
+
+    def to_arrays(self, fields: tuple[str, ...] | None = None, start: Any = None, end: Any = None, \
+                  widths: dict[str, int] | None = None, structured: bool = False) -> dict[str, Any] | Any:
+        '''the rows with start <= name < end as numpy arrays, in name order
+
+        gives a dict of 'name' and each field to its column, see codec.decode_column. nulls are masked,
+        dates are datetime64, list fields are 2-D when each row has the same length (or the width in
+        `widths`) and codec.Ragged offsets and values otherwise. a columnar database with rows already
+        in name order gives views into the file. `structured` puts the columns in one masked
+        structured array instead'''
+        import numpy as np
+        import codec
+        if fields is None:
+            fields = self.fields
+        widths = widths or {}
+        lo = 0 if start is None else bisect_left(self.keys, start)
+        hi = len(self.keys) if end is None else bisect_left(self.keys, end)
+        order = self.order[lo:hi]
+        if self.fmt == 'sdbc' and self.file is not None and not self.changed:
+            index = slice(lo, hi) if order == list(range(lo, hi)) else np.array(order, dtype=np.int64)
+            out = {'name': codec.take(codec.column_array(self.file['name']), index)}
+            for field in fields:
+                out[field] = codec.take(self.array(field, widths.get(field)), index)
+        else:
+            # only the rows in the range are decoded
+            out = {'name': codec.decode_column([self.names[index] for index in order], self.fntype)}
+            for field in fields:
+                i = self.field_index[field]
+                if self.fmt == 'sdb':
+                    texts = [self.data[index][i + 1] for index in order]
+                else:
+                    texts = [to_field(self._decode(index, field)) for index in order]
+                out[field] = codec.decode_column(texts, self.schema[i], widths.get(field))
+        return codec.structured(out) if structured else out
+
+    def _encode_row(self, index: int) -> str:
+        if self.fmt == 'sdb':
+            return ','.join(self.data[index])
+        return ','.join([to_field(self._name(index))] + [to_field(self._decode(index, field)) for field in self.fields])
+
+    def _read_journal(self, start: int = 0) -> tuple[list[str], int]:
+        # batches in the journal end with a blank line, anything after the last one is a torn write
+        # or a batch that is still being written, gives the lines and where the last batch ends
+        try:
+            with open(self.journal, 'rb') as file:
+                file.seek(start)
+                data = file.read()
+        except FileNotFoundError:
+            return [], 0
+        end = data.rfind(b'\n\n') + 2 if data.rfind(b'\n\n') >= 0 else 0
+        lines = data[:end].decode('utf-8').split('\n')
+        if start == 0:
+            # a journal of another generation was left by a writer that died while compacting, its
+            # rows are already in the file
+            generation = 0
+            if lines[0].startswith(GENERATION_LINE):
+                generation = int(lines.pop(0)[len(GENERATION_LINE):])
+            if generation != self.generation:
+                return [], 0
+        return lines, start + end
+
+    def _apply(self, line: str) -> int | None:
+        if line[0] == '#':
+            k, v = line[1:].split('=', 1)
+            self.meta[k] = self.saved_meta[k] = from_field(v, DATA_TYPES[meta_types().get(k, 'str')])
+            return None
+        row = tuple(split_fields(line))
+        if row[0] in self.index:
+            index = self.index[row[0]]
+        else:
+            index = len(self.names)
+            self.new_row(from_field(row[0], self.fntype))
+        if self.fmt == 'sdb':
+            self.data[index] = row
+        else:
+            self.changed[index] = (self._name(index),) + \
+                tuple(from_field(field, dtype) for field, dtype in zip(row[1:], self.schema))
+        self.cache.invalidate(index)
+        return index
+
+    def _replay(self) -> None:
+        lines, self.journal_offset = self._read_journal(self.journal_offset)
+        for line in lines:
+            if line and self._apply(line) is not None:
+                self.journal_rows += 1
+        self.dirty.clear()
+
+    def _sync(self) -> None:
+        '''brings in what other writers saved since this was loaded, keeping this one's changes on top
+
+        only called with the lock held'''
+        meta = {k: v for k, v in self.meta.items() if self.saved_meta.get(k) != v}
+        rows = [self._encode_row(index) for index in sorted(self.dirty)]
+        if read_generation(self.filename) == self.generation:
+            self._replay()
+        else:
+            if self.fmt == 'sdbc':
+                self.file.close()
+            self._open()
+            self.epoch += 1
+        self.meta.update(meta)
+        for line in rows:
+            self.dirty.add(self._apply(line))
+        # a writer that crashed mid batch leaves a torn tail, which has to go before anything is appended
+        try:
+            if os.path.getsize(self.journal) > self.journal_offset:
+                with open(self.journal, 'r+b') as file:
+                    file.truncate(self.journal_offset)
+        except FileNotFoundError:
+            pass
+
     def save(self):
-        data = '\n'.join([','.join(row) for row in self.data])
-        data = 'name,' + ','.join(self.fields) + '\n' + data
-        for k, v in self.meta.items():
-            data = f'#{k}={v}\n' + data
-        with open(self.filename, 'w', encoding='utf-8') as file:
-            file.write(data)
+        '''appends the changed rows to the journal, a new database or a long journal is compacted instead
+
+        saves from several processes are serialized by a lock, and each one first takes in the
+        changes saved by the others. see SAVE_HOOKS for what else happens on a save'''
+        with locked(self.lockfile):
+            if self.generation is not None:
+                self._sync()
+            self._run_hooks(self._save)
+
+    def _run_hooks(self, write: Callable[[], None]) -> None:
+        after = [hook(self) for hook in SAVE_HOOKS]
+        write()
+        for done in after:
+            if done is not None:
+                done()
+
+    def _save(self) -> None:
+        if self.generation is None or self.journal_rows + len(self.dirty) > max(len(self.names), JOURNAL_MIN):
+            self._compact()
+            return
+        lines = [f'#{k}={to_field(v)}' for k, v in self.meta.items() if self.saved_meta.get(k) != v]
+        lines += [self._encode_row(index) for index in sorted(self.dirty)]
+        if not lines:
+            return
+        if self.journal_offset == 0:
+            lines.insert(0, f'{GENERATION_LINE}{self.generation}')
+        with open(self.journal, 'ab') as file:
+            file.write(('\n'.join(lines) + '\n\n').encode('utf-8'))
+            file.flush()
+            os.fsync(file.fileno())
+            self.journal_offset = file.tell()
+        self.journal_rows += len(self.dirty)
+        self.dirty.clear()
+        self.saved_meta = dict(self.meta)
+
+    def compact(self) -> None:
+        '''rewrites the whole database with the journal folded in, through a temporary file and an atomic rename'''
+        with locked(self.lockfile):
+            if self.generation is not None:
+                self._sync()
+            self._run_hooks(self._compact)
+
+    def aggregate(self, kind: str, fields: tuple[str, ...] | None = None, start: Any = None, \
+                  end: Any = None) -> dict[str, dict[str, dict[str, Any]]]:
+        '''the count, sum, min, max and mean of each field per 'month', 'year' or bartels 'rotation'
+        for the periods that overlap [start, end), from the database's rollups as it was last saved
+
+        the rollups are built the first time, and kept up to date by saves after that. see rollup.py'''
+        import rollup
+        return rollup.query([rollup.load(self.filename)], kind, fields, start, end)
+
+    def _compact(self) -> None:
+        tmp = self.filename + '.tmp'
+        generation = 1 if self.generation is None else self.generation + 1
+        if self.fmt == 'sdbc':
+            self._write_columnar(tmp, generation)
+            if self.file is not None:
+                self.file.close()
+        else:
+            self._write_text(tmp, generation)
+        os.replace(tmp, self.filename)
+        if self.fmt == 'sdbc':
+            self.file = ColumnFile(self.filename)
+            self.changed = {}
+        self.generation = generation
+        try:
+            os.remove(self.journal)
+        except FileNotFoundError:
+            pass
+        self.dirty.clear()
+        self.journal_rows = 0
+        self.journal_offset = 0
+        self.saved_meta = dict(self.meta)
+
+    def _write_text(self, filename: str, generation: int) -> None:
+        lines = [f'{GENERATION_LINE}{generation}'] + [f'#{k}={to_field(v)}' for k, v in self.meta.items()]
+        lines.append('name,' + ','.join(self.fields))
+        lines += [','.join(row) for row in self.data]
+        with open(filename, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines))
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _write_columnar(self, filename: str, generation: int) -> None:
+        rows = range(len(self.names))
+        columns = {'name': (self.fntype.__name__, [self._name(index) for index in rows])}
+        for field, dtype in zip(self.fields, self.schema):
+            columns[field] = (dtype.__name__, [self._decode(index, field) for index in rows])
+        header = {
+            'meta': {k: to_field(v) for k, v in self.meta.items()},
+            'fields': list(self.fields),
+            'rows': len(rows),
+            GENERATION: generation,
+        }
+        write_columns(filename, header, columns)
+
+
+def convert(src: str, dst: str, fmt: str | None = None) -> Database:
+    '''converts a database between the text (.sdb) and binary columnar (.sdbc) formats'''
+    old = Database(src)
+    meta = {k: v for k, v in old.meta.items() if k != 'schema'}
+    new = Database(dst, dict(zip(old.fields, old.schema)), old.fntype, fmt, **meta)
+    for index in range(len(old)):
+        row = old[index]
+        new.new_row(row.name)
+        new[index] = row
+    new.save()
+    return new
@@ -0,0 +1,229 @@
+
+from __future__ import annotations
+
+from typing import Any, Callable, Iterator
+
+import os
+import re
+import json
+import pickle
+from datetime import date
+
+from database import Database, Row, DATA_TYPES, row_class, to_field, from_field
+
+
+__all__ = ['Dataset']
+
+
+RE_SHARD = re.compile(r'^(\d+)\.sdbc?$')
+
+
+def stamp(filename: str) -> list[int]:
+    '''a cheap fingerprint of a shard and its journal, used to tell if the manifest is out of date'''
+    out = []
+    for name in (filename, filename + '.journal'):
+        try:
+            stat = os.stat(name)
+            out += [stat.st_mtime_ns, stat.st_size]
+        except FileNotFoundError:
+            out += [0, 0]
+    return out
+
+
+def read_shard(filename: str, start: Any, end: Any, fields: tuple[str, ...], \
+               where: Callable[[Row], bool] | None) -> list[tuple[Any, dict[str, Any]]]:
+    '''reads the rows of one shard in a date range, this runs in the worker processes'''
+    db = Database(filename)
+    out = []
+    for row in db.range(start, end):
+        if where is None or where(row):
+            out.append((row.name, {field: row[field] for field in fields}))
+    return out
+
+
+class Shard:
+    '''one of a dataset's databases, that the rows read from it are bound to
+
+    the Database is only opened in this process when a row needs it, to read a field that wasn't
+    read with it or to be saved. the rows have their name as their index, since the worker that
+    read them had its own Database'''
+
+    # names don't go stale, see Row.__getattr__
+    epoch = 0
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.db: Database | None = None
+
+    def open(self) -> Database:
+        if self.db is None:
+            self.db = Database(self.filename)
+        return self.db
+
+    def _field(self, name: Any, field: str) -> Any:
+        db = self.open()
+        return db._field(db._index(name), field)
+
+    def __setitem__(self, name: Any, row: Row) -> None:
+        self.open()[name] = row
+
+
+def picklable(value: Any) -> bool:
+    try:
+        pickle.dumps(value)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+class Dataset:
+    '''the per year databases in a directory, queried as one date ordered database
+
+    a manifest of each shard's date range and row count is kept in the directory, so queries only
+    open the shards they need'''
+
+    def __init__(self, directory: str | None = None) -> None:
+        if directory is None:
+            from spacew_db import DB_DIR
+            directory = DB_DIR
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, 'manifest.json')
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as file:
+                self.manifest = json.load(file)
+        except (FileNotFoundError, ValueError):
+            self.manifest = {}
+        self.opened: dict[str, Shard] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        '''brings the manifest up to date with the shards on disk'''
+        changed = False
+        found = {name for name in os.listdir(self.directory) if RE_SHARD.match(name)}
+        for name in list(self.manifest):
+            if name not in found:
+                del self.manifest[name]
+                changed = True
+        for name in found:
+            filename = os.path.join(self.directory, name)
+            if name in self.manifest and self.manifest[name]['stamp'] == stamp(filename):
+                continue
+            db = Database(filename)
+            self.manifest[name] = {
+                'stamp': stamp(filename),
+                'start': to_field(db.keys[0]) if db.keys else None,
+                'end': to_field(db.keys[-1]) if db.keys else None,
+                'rows': len(db),
+                'schema': db.meta['schema'],
+                'fields': list(db.fields),
+            }
+            changed = True
+        if changed:
+            with open(self.manifest_file + '.tmp', 'w', encoding='utf-8') as file:
+                json.dump(self.manifest, file, indent=1, sort_keys=True)
+            os.replace(self.manifest_file + '.tmp', self.manifest_file)
+        self.fields: tuple[str, ...] = ()
+        self.fntype = date
+        for entry in self.manifest.values():
+            self.fields = tuple(entry['fields'])
+            self.fntype = DATA_TYPES[entry['schema'][0]]
+            break
+        self.field_index = {field: i for i, field in enumerate(self.fields)}
+        self.row_class = row_class(self.fields)
+
+    def __len__(self) -> int:
+        return sum(entry['rows'] for entry in self.manifest.values())
+
+    def shards(self, start: Any = None, end: Any = None) -> list[str]:
+        '''the shards that can have rows with start <= name < end, in name order'''
+        out = []
+        for name, entry in self.manifest.items():
+            if entry['rows'] == 0:
+                continue
+            first, last = from_field(entry['start'], self.fntype), from_field(entry['end'], self.fntype)
+            if (start is None or last >= start) and (end is None or first < end):
+                out.append((first, os.path.join(self.directory, name)))
+        return [filename for _, filename in sorted(out)]
+
+    def rows(self, start: Any = None, end: Any = None, fields: tuple[str, ...] | None = None, \
+             where: Callable[[Row], bool] | None = None, workers: int | None = None) -> Iterator[Row]:
+        '''yields the rows with start <= name < end from all shards, in name order
+
+        the shards are read in parallel by a pool of `workers` processes. a `where` that can't be
+        sent to them, like a lambda, has the shards read in this process instead. the rows are bound
+        to their shard, a row written with save() is kept until the dataset is saved. shards are
+        assumed not to overlap, which holds for the per year databases'''
+        if fields is None:
+            fields = self.fields
+        shards = self.shards(start, end)
+        args = [(filename, start, end, fields, where) for filename in shards]
+        pool = None
+        if workers != 1 and len(shards) > 1 and (where is None or picklable(where)):
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(workers)
+            results = pool.map(read_shard, *zip(*args))
+        else:
+            results = (read_shard(*arg) for arg in args)
+        try:
+            for filename, result in zip(shards, results):
+                shard = self.shard(filename)
+                for name, values in result:
+                    yield self.row_class(shard, name, values, name)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    def shard(self, filename: str) -> Shard:
+        '''the shard rows from filename are bound to, the same one for every query'''
+        if filename not in self.opened:
+            self.opened[filename] = Shard(filename)
+        return self.opened[filename]
+
+    def save(self) -> None:
+        '''saves the shards that rows were written to'''
+        for shard in self.opened.values():
+            if shard.db is not None and shard.db.dirty:
+                shard.db.save()
+        self.refresh()
+
+    def columns(self, start: Any = None, end: Any = None, fields: tuple[str, ...] | None = None, \
+                where: Callable[[Row], bool] | None = None, workers: int | None = None) -> dict[str, list[Any]]:
+        '''like rows, but gives a dict of name and each field to a list of values'''
+        if fields is None:
+            fields = self.fields
+        out = {'name': []} | {field: [] for field in fields}
+        for row in self.rows(start, end, fields, where, workers):
+            out['name'].append(row.name)
+            for field in fields:
+                out[field].append(row[field])
+        return out
+
+    def to_arrays(self, start: Any = None, end: Any = None, fields: tuple[str, ...] | None = None, \
+                  widths: dict[str, int] | None = None, structured: bool = False) -> dict[str, Any] | Any:
+        '''like Database.to_arrays over all shards, the shards' columns are joined in name order
+
+        a list field that is 2-D in some shards and ragged or another width in others is ragged'''
+        import codec
+        if fields is None:
+            fields = self.fields
+        parts = [Database(filename).to_arrays(fields, start, end, widths) for filename in self.shards(start, end)]
+        if not parts:
+            # no rows, but the columns still have their types
+            shards = self.shards()
+            if not shards:
+                raise ValueError(f'no databases in {self.directory!r}')
+            parts = [{name: codec.take(column, slice(0, 0)) for name, column in \
+                      Database(shards[0]).to_arrays(fields, widths=widths).items()}]
+        out = {name: codec.concatenate([part[name] for part in parts]) for name in parts[0]}
+        return codec.structured(out) if structured else out
+
+    def aggregate(self, kind: str, fields: tuple[str, ...] | None = None, start: Any = None, \
+                  end: Any = None) -> dict[str, dict[str, dict[str, Any]]]:
+        '''like Database.aggregate over all shards, a rotation across the end of a year is put
+        together from both years' shards'''
+        import rollup
+        from datetime import timedelta
+        # a period that overlaps the range can start up to a month before it or end a month after it
+        shards = self.shards(None if start is None else start - timedelta(days=31), \
+                             None if end is None else end + timedelta(days=31))
+        return rollup.query([rollup.load(filename) for filename in shards], kind, fields, start, end)
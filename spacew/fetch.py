@@ -0,0 +1,280 @@
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+import io
+import os
+import json
+import ftplib
+import queue
+import random
+import threading
+from time import sleep
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+if TYPE_CHECKING:
+    import requests
+
+
+__all__ = ['FTPPool', 'FetchError', 'SYNC_SUFFIX', 'fetch_file', 'fetch_files', 'get_ftp_file', 'swpc_pool', 'sync_file']
+
+
+SWPC_FTP_HOST = 'ftp.swpc.noaa.gov'
+
+# how much of the end of a local copy is fetched again to check it still matches the server's
+SYNC_OVERLAP = 65536
+# the file next to a local copy with what sync_file knows about it
+SYNC_SUFFIX = '.sync'
+
+# errors worth another try, a missing file (5xx reply) won't appear by asking again
+RETRY_ERRORS = (ftplib.error_temp, ftplib.error_reply, ftplib.error_proto, OSError, EOFError)
+
+
+class FetchError(Exception):
+    pass
+
+
+class FTPPool:
+    '''a bounded pool of logged in ftp connections to one server, safe to share between threads
+
+    at most `size` connections are open at once, a thread asking for one while they're all in use
+    waits for one to be given back. a connection that fails is closed instead of going back in the
+    pool, so the next one to be lent out is a fresh one'''
+
+    def __init__(self, host: str = SWPC_FTP_HOST, port: int = 21, size: int = 4, user: str = '', passwd: str = '', \
+                 timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.user = user
+        self.passwd = passwd
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.closed = False
+
+    def __enter__(self) -> FTPPool:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _connect(self) -> ftplib.FTP:
+        ftp = ftplib.FTP(timeout=self.timeout)
+        try:
+            ftp.connect(self.host, self.port)
+            ftp.login(self.user, self.passwd)
+        except BaseException:
+            ftp.close()
+            raise
+        return ftp
+
+    @contextmanager
+    def connection(self) -> Iterator[ftplib.FTP]:
+        '''lends out a connection for the with block'''
+        if self.closed:
+            raise FetchError('pool is closed')
+        self.slots.acquire()
+        try:
+            try:
+                ftp = self.idle.get_nowait()
+            except queue.Empty:
+                ftp = self._connect()
+            try:
+                yield ftp
+            except ftplib.error_perm:
+                # the server refused a command, the connection is still fine
+                self.idle.put(ftp)
+                raise
+            except BaseException:
+                ftp.close()
+                raise
+            if self.closed:
+                ftp.close()
+            else:
+                self.idle.put(ftp)
+        finally:
+            self.slots.release()
+
+    def close(self) -> None:
+        '''closes the idle connections, ones that are lent out are closed when they come back'''
+        self.closed = True
+        while True:
+            try:
+                ftp = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                ftp.close()
+
+
+def _retrieve(pool: FTPPool, path: str, file, retries: int, backoff: float) -> None:
+    # a try after one that broke off asks for the rest of the file from where it got to
+    attempt = offset = 0
+    while True:
+        file.seek(offset)
+        file.truncate()
+        try:
+            with pool.connection() as ftp:
+                ftp.retrbinary(f'RETR {path}', file.write, rest=offset or None)
+            return
+        except ftplib.error_perm as e:
+            if not offset:
+                raise FetchError(f'{pool.host}: {path}: {e}') from e
+            # the server can't resume, the next try starts over
+            offset = 0
+        except RETRY_ERRORS as e:
+            if attempt == retries:
+                raise FetchError(f'{pool.host}: {path}: {e!r}') from e
+            sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+            offset = file.tell()
+
+
+def fetch_file(pool: FTPPool, path: str, filename: str, retries: int = 3, backoff: float = 1) -> str:
+    '''downloads a file straight to disk, it only appears at `filename` once it's complete'''
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    part = filename + '.part'
+    try:
+        with open(part, 'wb') as file:
+            _retrieve(pool, path, file, retries, backoff)
+        os.replace(part, filename)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    return filename
+
+
+def fetch_files(pool: FTPPool, files: dict[str, str] | Iterable[tuple[str, str]], workers: int | None = None, \
+                retries: int = 3, backoff: float = 1) -> dict[str, str | FetchError]:
+    '''downloads many files at once, `files` maps remote paths to local filenames
+
+    returns the filename for each path, or the error it failed with, one failure doesn't stop the rest'''
+    files = dict(files)
+    if workers is None:
+        workers = pool.size
+    out = {}
+    with ThreadPoolExecutor(max(1, min(workers, len(files)))) as executor:
+        futures = {path: executor.submit(fetch_file, pool, path, filename, retries, backoff) \
+                   for path, filename in files.items()}
+        for path, future in futures.items():
+            try:
+                out[path] = future.result()
+            except FetchError as e:
+                out[path] = e
+    return out
+
+
+def get_ftp_file(pool: FTPPool, path: str, encoding: str = 'utf-8', retries: int = 3, backoff: float = 1) -> str:
+    '''downloads a file into memory and decodes it'''
+    with io.BytesIO() as file:
+        _retrieve(pool, path, file, retries, backoff)
+        return file.getvalue().decode(encoding)
+
+
+_swpc_pool = None
+_swpc_pool_lock = threading.Lock()
+
+def swpc_pool() -> FTPPool:
+    '''the shared pool of connections to swpc's ftp server'''
+    global _swpc_pool
+    with _swpc_pool_lock:
+        if _swpc_pool is None or _swpc_pool.closed:
+            _swpc_pool = FTPPool(SWPC_FTP_HOST)
+        return _swpc_pool
+
+
+def _sync_state(filename: str) -> dict | None:
+    try:
+        with open(filename + SYNC_SUFFIX, 'r', encoding='utf-8') as file:
+            state = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    try:
+        if os.path.getsize(filename) != state['size']:
+            return None
+    except FileNotFoundError:
+        return None
+    return state
+
+
+def _save_sync_state(filename: str, url: str, response: requests.Response) -> None:
+    state = {
+        'url': url,
+        'size': os.path.getsize(filename),
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    with open(filename + SYNC_SUFFIX + '.part', 'w', encoding='utf-8') as file:
+        json.dump(state, file)
+    os.replace(filename + SYNC_SUFFIX + '.part', filename + SYNC_SUFFIX)
+
+
+def _write_full(filename: str, response: requests.Response) -> None:
+    part = filename + '.part'
+    try:
+        with open(part, 'wb') as file:
+            for chunk in response.iter_content(65536):
+                file.write(chunk)
+        os.replace(part, filename)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+
+
+def sync_file(url: str, filename: str, session: requests.Session | None = None, overlap: int = SYNC_OVERLAP, \
+              timeout: float = 30) -> bool:
+    '''brings a local copy of a file that only grows at the end up to date, returns whether it changed
+
+    the etag, last modified time and size of the copy are kept in `<filename>.sync`. a sync asks for
+    the file only if it was modified, and then only from `overlap` bytes before the end of the copy.
+    if those bytes still match, just the new tail is appended, otherwise, or if the server doesn't do
+    ranges, the whole file is fetched again. the copy is never left half written'''
+    if session is None:
+        import requests
+        session = requests
+    state = _sync_state(filename)
+    if state is None or state['url'] != url:
+        with session.get(url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            _write_full(filename, response)
+            _save_sync_state(filename, url, response)
+        return True
+    start = max(0, state['size'] - overlap)
+    headers = {'Range': f'bytes={start}-'}
+    if state['etag']:
+        headers['If-None-Match'] = state['etag']
+    if state['last_modified']:
+        headers['If-Modified-Since'] = state['last_modified']
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return False
+        if response.status_code == 206 and response.headers.get('Content-Range', '').startswith(f'bytes {start}-'):
+            tail = response.content
+            with open(filename, 'r+b') as file:
+                file.seek(start)
+                if tail[:state['size'] - start] == file.read():
+                    if len(tail) == state['size'] - start:
+                        changed = False
+                    else:
+                        file.write(tail[state['size'] - start:])
+                        file.flush()
+                        os.fsync(file.fileno())
+                        changed = True
+                    _save_sync_state(filename, url, response)
+                    return changed
+        elif response.status_code not in (206, 416):
+            response.raise_for_status()
+            if response.status_code == 200:
+                _write_full(filename, response)
+                _save_sync_state(filename, url, response)
+                return True
+    # the end of the copy doesn't match, or the file got shorter, so something before it may have changed too
+    os.remove(filename + SYNC_SUFFIX)
+    return sync_file(url, filename, session, overlap, timeout)
@@ -0,0 +1,251 @@
+
+'''bulk ingestion of the gfz and swpc archives into the per year databases
+
+usage: python spacew/ingest.py [first year] [last year] [--workers n] [--refresh]
+
+the pipeline has four stages, fetch the gfz kp/ap file and each year's DSD and DPD files into the
+cache, parse a year of each, join them by date, and write the rows into that year's database. the
+years run in parallel in a process pool. a year that finished is recorded in ingest.json with a
+fingerprint of its inputs, so an interrupted run picks up where it stopped and a run on unchanged
+inputs doesn't touch any database'''
+
+from __future__ import annotations
+
+from typing import Any
+
+import os
+import json
+import hashlib
+import argparse
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import requests
+
+from cache import CacheStore, CACHE_DIR
+from database import Database, DatabaseError
+from fetch import FetchError, SYNC_SUFFIX, fetch_files, swpc_pool, sync_file
+from spacew_db import DB_DIR, SCHEMA
+from textdata import TextFile, GFZ_KP, SWPC_DSD, SWPC_DPD
+
+
+__all__ = ['ingest', 'ingest_year', 'fetch_sources', 'parse_year', 'write_year']
+
+
+GFZ_URL = 'https://www-app3.gfz-potsdam.de/kp_index/Kp_ap_since_1932.txt'
+GFZ_KEY = 'gfz/Kp_ap_since_1932.txt'
+GFZ_FIRST_YEAR = 1932
+SWPC_FIRST_YEAR = 1996
+# seconds before the sources are fetched again, past years of the warehouse never change
+KP_TTL = 3600
+WAREHOUSE_TTL = 86400
+# change this when the mapping from the sources to the fields changes, every year is redone
+INGEST_VERSION = 1
+# what can go wrong with a year in a worker, a bad source or database, or the worker dying. anything
+# else is a bug and is raised
+YEAR_ERRORS = (OSError, ValueError, DatabaseError, BrokenProcessPool)
+
+CHECKPOINT = 'ingest.json'
+
+
+def warehouse_key(year: int, kind: str) -> str:
+    return f'swpc/warehouse/{year}_{kind}.txt'
+
+
+def fetch_sources(years: list[int], cache: CacheStore, refresh: bool = False) -> dict[int, str]:
+    '''stage 1, brings the gfz file and the years' warehouse files into the cache
+
+    returns the years whose files couldn't be fetched, with why'''
+    failed = {}
+    if refresh or not cache.fresh(GFZ_KEY):
+        try:
+            sync_file(GFZ_URL, cache.path(GFZ_KEY))
+            cache.commit(GFZ_KEY, KP_TTL)
+        except requests.RequestException as e:
+            if cache.age(GFZ_KEY) is None:
+                return {year: f'gfz: {e}' for year in years}
+    files = {}
+    for year in years:
+        if year < SWPC_FIRST_YEAR:
+            continue
+        for kind in ('DSD', 'DPD'):
+            key = warehouse_key(year, kind)
+            if refresh or not cache.fresh(key):
+                files[f'pub/warehouse/{year}/{year}_{kind}.txt'] = (year, key)
+    if files:
+        results = fetch_files(swpc_pool(), {path: cache.path(key) for path, (_, key) in files.items()})
+        for path, result in results.items():
+            year, key = files[path]
+            if isinstance(result, FetchError):
+                failed[year] = f'{failed[year]}; {result}' if year in failed else str(result)
+            else:
+                cache.commit(key, None if year < date.today().year else WAREHOUSE_TTL)
+    return failed
+
+
+def _open_sources(year: int, cache_dir: str) -> dict[str, TextFile]:
+    out = {}
+    for name, key, fmt in (('kp', GFZ_KEY, GFZ_KP), ('dsd', warehouse_key(year, 'DSD'), SWPC_DSD), \
+                           ('dpd', warehouse_key(year, 'DPD'), SWPC_DPD)):
+        filename = os.path.join(cache_dir, *key.split('/'))
+        if os.path.exists(filename):
+            out[name] = TextFile.open(filename, fmt)
+    return out
+
+
+def fingerprint(year: int, cache_dir: str) -> str:
+    '''a hash of everything the year is made from, only the year's part of the gfz file counts'''
+    sources = _open_sources(year, cache_dir)
+    digest = hashlib.sha1(f'{INGEST_VERSION}:{year}'.encode())
+    try:
+        for name in ('kp', 'dsd', 'dpd'):
+            digest.update(f'|{name}|'.encode())
+            if name == 'kp' and name in sources:
+                kp = sources[name]
+                digest.update(kp.data[kp.offset(date(year, 1, 1)):kp.offset(date(year + 1, 1, 1))])
+            elif name in sources:
+                digest.update(sources[name].data)
+    finally:
+        for source in sources.values():
+            source.close()
+    return digest.hexdigest()
+
+
+def _fluence(value: float | None) -> list[int] | None:
+    return None if value is None or value < 0 else [int(value)]
+
+
+def parse_year(year: int, cache_dir: str = CACHE_DIR) -> dict[date, dict[str, Any]]:
+    '''stages 2 and 3, parses the year from each source and joins them by date'''
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    days = {}
+    sources = _open_sources(year, cache_dir)
+    try:
+        if 'kp' in sources:
+            kps = {}
+            for record in sources['kp'].records(start, end):
+                kps.setdefault(record.date, []).append(record)
+            for day, records in kps.items():
+                # the intervals that haven't happened yet are -1
+                if len(records) == 8 and all(record.kp is not None and record.kp >= 0 for record in records):
+                    days.setdefault(day, {})
+                    days[day]['kp'] = [round(record.kp * 3) for record in records]
+                    days[day]['ap'] = [record.ap for record in records]
+        if 'dsd' in sources:
+            for record in sources['dsd'].records(start, end):
+                days.setdefault(record.date, {}).update({
+                    'spots': record.spots,
+                    'f107': record.f107,
+                    'new_regions': record.new_regions,
+                    'bg_flux': record.bg_flux,
+                    'c_flares': record.c_flares,
+                    'm_flares': record.m_flares,
+                    'x_flares': record.x_flares,
+                })
+        if 'dpd' in sources:
+            for record in sources['dpd'].records(start, end):
+                # the warehouse has daily fluences, kept as a list of one
+                days.setdefault(record.date, {}).update({
+                    'flux_p_1mev': _fluence(record.p1mev),
+                    'flux_p_10mev': _fluence(record.p10mev),
+                    'flux_p_100mev': _fluence(record.p100mev),
+                    'flux_e_08mev': _fluence(record.e08mev),
+                    'flux_e_2mev': _fluence(record.e2mev),
+                    'noaa_kp': list(record.k_planetary) if None not in record.k_planetary and min(record.k_planetary) >= 0 \
+                               else None,
+                })
+    finally:
+        for source in sources.values():
+            source.close()
+    return dict(sorted(days.items()))
+
+
+def db_filename(year: int, db_dir: str = DB_DIR) -> str:
+    '''the year's database, a columnar one if it was converted'''
+    filename = os.path.join(db_dir, f'{year}.sdbc')
+    return filename if os.path.exists(filename) else os.path.join(db_dir, f'{year}.sdb')
+
+
+def write_year(year: int, days: dict[date, dict[str, Any]], db_dir: str = DB_DIR) -> int:
+    '''stage 4, writes the joined rows into the year's database in one batch, returns how many'''
+    filename = db_filename(year, db_dir)
+    db = Database(filename) if os.path.exists(filename) else Database(filename, SCHEMA, date)
+    for day, fields in days.items():
+        row = db.get(day) if day in db else db.new_row(day)
+        for field, value in fields.items():
+            row[field] = value
+        row.save()
+    db.save()
+    return len(days)
+
+
+def ingest_year(year: int, digest: str, cache_dir: str, db_dir: str) -> tuple[int, str, int]:
+    '''runs stages 2 to 4 for a year, this runs in the worker processes'''
+    return year, digest, write_year(year, parse_year(year, cache_dir), db_dir)
+
+
+def _load_checkpoint(filename: str) -> dict[str, str]:
+    try:
+        with open(filename, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_checkpoint(filename: str, done: dict[str, str]) -> None:
+    with open(filename + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(done, file, indent=1, sort_keys=True)
+    os.replace(filename + '.tmp', filename)
+
+
+def ingest(years: list[int] | None = None, db_dir: str = DB_DIR, cache: CacheStore | None = None, \
+           workers: int | None = None, refresh: bool = False) -> dict[int, str]:
+    '''fills the per year databases from the archives, returns 'done', 'unchanged' or 'failed (why)' for each year'''
+    if years is None:
+        years = list(range(GFZ_FIRST_YEAR, date.today().year + 1))
+    if cache is None:
+        cache = CacheStore(sidecars=(SYNC_SUFFIX,))
+    os.makedirs(db_dir, exist_ok=True)
+    checkpoint = os.path.join(db_dir, CHECKPOINT)
+    done = _load_checkpoint(checkpoint)
+    out = {year: f'failed ({problem})' for year, problem in fetch_sources(years, cache, refresh).items()}
+    todo = {}
+    for year in years:
+        if year in out:
+            continue
+        digest = fingerprint(year, cache.directory)
+        if done.get(str(year)) == digest and os.path.exists(db_filename(year, db_dir)):
+            out[year] = 'unchanged'
+        else:
+            todo[year] = digest
+    if not todo:
+        return out
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {pool.submit(ingest_year, year, digest, cache.directory, db_dir): year for year, digest in todo.items()}
+        for future in as_completed(futures):
+            try:
+                year, digest, _ = future.result()
+            except YEAR_ERRORS as e:
+                out[futures[future]] = f'failed ({type(e).__name__}: {e})'
+                continue
+            done[str(year)] = digest
+            _save_checkpoint(checkpoint, done)
+            out[year] = 'done'
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='fills the per year databases from the gfz and swpc archives')
+    parser.add_argument('first', type=int, nargs='?', default=GFZ_FIRST_YEAR, help='first year')
+    parser.add_argument('last', type=int, nargs='?', default=date.today().year, help='last year')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--refresh', action='store_true', help='fetch the sources again even if they are cached')
+    args = parser.parse_args()
+    results = ingest(list(range(args.first, args.last + 1)), workers=args.workers, refresh=args.refresh)
+    for year, result in sorted(results.items()):
+        print(year, result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+
+from __future__ import annotations
+
+from typing import Iterator
+
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+__all__ = ['locked']
+
+
+@contextmanager
+def locked(filename: str, shared: bool = False, blocking: bool = True) -> Iterator[None]:
+    '''holds an advisory lock on a lock file while in the with block
+
+    raises BlockingIOError if `blocking` is false and the lock is held elsewhere. windows doesn't
+    have shared locks, so there every lock is exclusive'''
+    fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+            fcntl.flock(fd, flags)
+        else:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+            except OSError:
+                raise BlockingIOError(f'lock is held: {filename!r}') from None
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
@@ -0,0 +1,269 @@
+
+'''materialized aggregates of the daily databases, kept in a file next to each database
+
+for each month and each bartels rotation a database has rows in, the rollup file has the number of
+rows and the count, sum, min and max of every numeric field, over each value of a list field like
+kp. a period's aggregates are worked out from its rows once. after that, once this module is
+imported, Database.save works out again only the periods of the rows it wrote, through a save hook;
+a save by a process that hasn't imported it leaves the file's stamp out of date, and load builds it
+again. years are put together from their months, and a rotation that spans two years from its
+parts in each year's database, so a query takes time in the number of periods and not of days. Database.aggregate and Dataset.aggregate answer queries from them'''
+
+from __future__ import annotations
+
+from typing import Any, Callable
+
+import os
+import json
+from datetime import date, timedelta
+
+from lock import locked
+from database import Database, SAVE_HOOKS, intlist
+from dataset import stamp
+
+
+__all__ = ['KINDS', 'bartels', 'period', 'bounds', 'load', 'query']
+
+
+SUFFIX = '.rollup'
+# change this when what's in a rollup file changes, the files are built again
+ROLLUP_VERSION = 1
+# the first day of bartels rotation 1, each rotation is 27 days
+BARTELS_EPOCH = date(1832, 2, 8)
+BARTELS_DAYS = 27
+
+KINDS = ('month', 'year', 'rotation')
+# the kinds kept in the files, years are made from months
+STORED = ('month', 'rotation')
+
+
+def rollup_file(filename: str) -> str:
+    return filename + SUFFIX
+
+
+def bartels(day: date) -> int:
+    '''the number of the bartels rotation a day is in'''
+    return (day - BARTELS_EPOCH).days // BARTELS_DAYS + 1
+
+
+def period(kind: str, day: date) -> str:
+    '''the key of the period of a kind that a day is in, like 2024-01 for a month, 2024 for a year
+    and 2596 for a rotation'''
+    if kind == 'month':
+        return f'{day.year:04}-{day.month:02}'
+    elif kind == 'year':
+        return f'{day.year:04}'
+    elif kind == 'rotation':
+        return str(bartels(day))
+    raise ValueError(f'invalid period: {kind!r}')
+
+
+def bounds(kind: str, key: str) -> tuple[date, date]:
+    '''the first day of a period and the day after its last'''
+    if kind == 'month':
+        year, month = map(int, key.split('-'))
+        return date(year, month, 1), date(year + month // 12, month % 12 + 1, 1)
+    elif kind == 'year':
+        return date(int(key), 1, 1), date(int(key) + 1, 1, 1)
+    elif kind == 'rotation':
+        start = BARTELS_EPOCH + timedelta(days=(int(key) - 1) * BARTELS_DAYS)
+        return start, start + timedelta(days=BARTELS_DAYS)
+    raise ValueError(f'invalid period: {kind!r}')
+
+
+def fields_of(db: Database) -> tuple[str, ...]:
+    '''the fields that are aggregated, numbers and lists of numbers'''
+    return tuple(field for field, dtype in zip(db.fields, db.schema) if dtype in (int, float, intlist))
+
+
+def aggregate(db: Database, start: date | None = None, end: date | None = None) -> dict[str, dict[str, dict[str, Any]]]:
+    '''the aggregates of each stored kind of period from the rows with start <= name < end
+
+    a period that is only partly in the range only has the rows in the range'''
+    import numpy as np
+    from numpy import ma
+    import codec
+    if db.fntype is not date:
+        raise ValueError(f'database {db.filename!r} isn\'t by date, it can\'t have rollups')
+    fields = fields_of(db)
+    arrays = db.to_arrays(fields, start, end)
+    days = arrays['name'].data.astype('datetime64[D]')
+    ids = {
+        'month': days.astype('datetime64[M]').astype(np.int64),
+        'rotation': (days.astype(np.int64) - (BARTELS_EPOCH - date(1970, 1, 1)).days) // BARTELS_DAYS + 1,
+    }
+    out = {}
+    for kind in STORED:
+        keys, inverse = np.unique(ids[kind], return_inverse=True)
+        if kind == 'month':
+            names = [str(key) for key in keys.astype('datetime64[M]')]
+        else:
+            names = [str(key) for key in keys.tolist()]
+        groups = out[kind] = {name: {'rows': rows} for name, rows in zip(names, np.bincount(inverse, minlength=len(keys)).tolist())}
+        for field in fields:
+            column = arrays[field]
+            if isinstance(column, codec.Ragged):
+                lengths = np.diff(column.offsets)
+                values = column.values[column.offsets[0]:column.offsets[-1]]
+                owner = np.repeat(inverse, lengths)
+            else:
+                present = ~ma.getmaskarray(column)
+                values = ma.getdata(column)[present]
+                owner = (np.broadcast_to(inverse[:, None], column.shape) if column.ndim == 2 else inverse)[present]
+            if values.dtype.kind == 'f':
+                owner, values = owner[~np.isnan(values)], values[~np.isnan(values)]
+            count = np.bincount(owner, minlength=len(keys))
+            total = np.zeros(len(keys), dtype=values.dtype)
+            np.add.at(total, owner, values)
+            low = np.zeros(len(keys), dtype=values.dtype)
+            high = np.zeros(len(keys), dtype=values.dtype)
+            if len(values):
+                low[:] = values.max()
+                high[:] = values.min()
+                np.minimum.at(low, owner, values)
+                np.maximum.at(high, owner, values)
+            for name, n, s, lo, hi in zip(names, count.tolist(), total.tolist(), low.tolist(), high.tolist()):
+                groups[name][field] = [n, s, lo, hi] if n else [0, 0, None, None]
+    return out
+
+
+# the last state read or written of each rollup file, with the file's mtime, size and inode
+_states: dict[str, tuple[tuple[int, int, int], dict[str, Any]]] = {}
+
+def _file_stamp(filename: str) -> tuple[int, int, int]:
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _write(filename: str, state: dict[str, Any]) -> None:
+    # dumps uses the c encoder, dump to a file doesn't
+    with open(filename + '.tmp', 'w', encoding='utf-8') as file:
+        file.write(json.dumps(state, separators=(',', ':')))
+    os.replace(filename + '.tmp', filename)
+    _states[filename] = (_file_stamp(filename), state)
+
+
+def _read(filename: str) -> dict[str, Any] | None:
+    try:
+        key = _file_stamp(filename)
+        if filename in _states and _states[filename][0] == key:
+            return _states[filename][1]
+        with open(filename, 'r', encoding='utf-8') as file:
+            state = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    if state.get('version') != ROLLUP_VERSION:
+        return None
+    _states[filename] = (key, state)
+    return state
+
+
+def build(db: Database) -> dict[str, Any]:
+    '''works out a database's rollups from all its rows and writes them, the database has to be saved'''
+    state = {'version': ROLLUP_VERSION, 'fields': list(fields_of(db))} | aggregate(db)
+    state['stamp'] = stamp(db.filename)
+    _write(rollup_file(db.filename), state)
+    return state
+
+
+def pending(db: Database) -> tuple[list[int], list[date]] | None:
+    '''what update needs to know from before a save, None if the database has no rollups
+
+    called before a save with the lock held'''
+    if not os.path.exists(rollup_file(db.filename)):
+        return None
+    return stamp(db.filename), [db._name(index) for index in db.dirty]
+
+
+def update(db: Database, before: list[int], days: list[date]) -> None:
+    '''works out again the periods of the days a save wrote, called after it with the lock held
+
+    if the rollups weren't up to date before the save (a save by something that doesn't keep them),
+    they're built again from all the rows'''
+    filename = rollup_file(db.filename)
+    state = _read(filename)
+    after = stamp(db.filename)
+    if state is not None and state['stamp'] == after:
+        return
+    if state is None or state['stamp'] != before or state['fields'] != list(fields_of(db)):
+        build(db)
+        return
+    if days:
+        spans = [bounds(kind, period(kind, day)) for kind in STORED for day in days]
+        fresh = aggregate(db, min(start for start, _ in spans), max(end for _, end in spans))
+        for kind in STORED:
+            for key in {period(kind, day) for day in days}:
+                state[kind][key] = fresh[kind][key]
+    state['stamp'] = after
+    _write(filename, state)
+
+
+def save_hook(db: Database) -> Callable[[], None] | None:
+    '''keeps a database's rollups up to date through its saves, see database.SAVE_HOOKS'''
+    before = pending(db)
+    if before is None:
+        return None
+    return lambda: update(db, *before)
+
+SAVE_HOOKS.append(save_hook)
+
+
+def load(filename: str) -> dict[str, Any]:
+    '''the rollups of a database, built first if it doesn't have them or changed without them'''
+    state = _read(rollup_file(filename))
+    if state is not None and state['stamp'] == stamp(filename):
+        return state
+    with locked(filename + '.lock'):
+        # another process may have built them while this one waited for the lock
+        state = _read(rollup_file(filename))
+        if state is not None and state['stamp'] == stamp(filename):
+            return state
+        return build(Database(filename))
+
+
+def _merge(a: list[Any], b: list[Any]) -> list[Any]:
+    if not a[0]:
+        return list(b)
+    if not b[0]:
+        return list(a)
+    return [a[0] + b[0], a[1] + b[1], min(a[2], b[2]), max(a[3], b[3])]
+
+
+def query(states: list[dict[str, Any]], kind: str, fields: tuple[str, ...] | None = None, \
+          start: date | None = None, end: date | None = None) -> dict[str, dict[str, dict[str, Any]]]:
+    '''the aggregates of each field for each period that overlaps [start, end), from the rollups of
+    one or more databases
+
+    gives a dict of each field to a dict of each period's key (see period) to its 'rows', 'count',
+    'sum', 'min', 'max' and 'mean', in period order. periods are always whole, a period split
+    between databases is put together from all of them that are in `states`'''
+    if kind not in KINDS:
+        raise ValueError(f'invalid period: {kind!r}')
+    stored = 'month' if kind == 'year' else kind
+    available = states[0]['fields'] if states else []
+    if fields is None:
+        fields = tuple(available)
+    for field in fields:
+        if field not in available:
+            raise ValueError(f'field {field!r} isn\'t aggregated')
+    rows, totals = {}, {field: {} for field in fields}
+    for state in states:
+        for key, group in state[stored].items():
+            if kind == 'year':
+                key = key[:4]
+            first, last = bounds(kind, key)
+            if (start is not None and last <= start) or (end is not None and first >= end):
+                continue
+            rows[key] = rows.get(key, 0) + group['rows']
+            for field in fields:
+                old = totals[field].get(key)
+                totals[field][key] = group[field] if old is None else _merge(old, group[field])
+    order = sorted(rows, key=lambda key: bounds(kind, key)[0])
+    out = {}
+    for field in fields:
+        out[field] = {}
+        for key in order:
+            count, total, low, high = totals[field][key]
+            out[field][key] = {'rows': rows[key], 'count': count, 'sum': total, 'min': low, 'max': high, \
+                               'mean': total / count if count else None}
+    return out
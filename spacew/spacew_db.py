@@ -1,64 +1,73 @@
 
 import os
-import ftplib
 from datetime import date
 from database import Database, strlist, intlist, timelist
+from fetch import FetchError, fetch_files, get_ftp_file, swpc_pool
+
+
+DB_DIR = os.path.expanduser('~/.spacew')
+WAREHOUSE_DIR = os.path.join(DB_DIR, 'warehouse')
+
+
+SCHEMA = {
+    'spots': int,
+    'f107': int,
+    'new_regions': int,
+    'bg_flux': str,
+    'max_flux': str,
+    'c_flares': int,
+    'm_flares': int,
+    'x_flares': int,
+    'regions': intlist,
+    'region_spots': intlist,
+    'region_sizes': intlist,
+    'region_mags': strlist,
+    'region_zmcls': strlist,
+    'region_locs': strlist,
+    'kp': intlist,
+    'ap': intlist,
+    'noaa_kp': intlist,
+    'flare_regions': intlist,
+    'flares': intlist,
+    'flare_starts': timelist,
+    'flare_maxes': timelist,
+    'flare_ends': timelist,
+    'flux_p_1mev': intlist,
+    'flux_p_10mev': intlist,
+    'flux_p_50mev': intlist,
+    'flux_p_100mev': intlist,
+    'flux_e_08mev': intlist,
+    'flux_e_2mev': intlist,
+    'wind_speed': intlist,
+    'wind_density': intlist,
+    'imf_bt': intlist,
+    'imf_bz': intlist,
+}
 
 
 def create_db(name):
-    db = Database(f'~/.spacew/{name}.sdb', {
-        'spots': int,
-        'f107': int,
-        'new_regions': int,
-        'bg_flux': str,
-        'max_flux': str,
-        'c_flares': int,
-        'm_flares': int,
-        'x_flares': int,
-        'regions': intlist,
-        'region_spots': intlist,
-        'region_sizes': intlist,
-        'region_mags': strlist,
-        'region_zmcls': strlist,
-        'region_locs': strlist,
-        'kp': intlist,
-        'ap': intlist,
-        'noaa_kp': intlist,
-        'flare_regions': intlist,
-        'flares': intlist,
-        'flare_starts': timelist,
-        'flare_maxes': timelist,
-        'flare_ends': timelist,
-        'flux_p_1mev': intlist,
-        'flux_p_10mev': intlist,
-        'flux_p_50mev': intlist,
-        'flux_p_100mev': intlist,
-        'flux_e_08mev': intlist,
-        'flux_e_2mev': intlist,
-        'wind_speed': intlist,
-        'wind_density': intlist,
-        'imf_bt': intlist,
-        'imf_bz': intlist,
-    }, date)
+    db = Database(os.path.join(DB_DIR, f'{name}.sdb'), SCHEMA, date)
     db.save()
 
 def load_db(name):
-    return Database(f'~/.spacew/{name}.sdb')
+    return Database(os.path.join(DB_DIR, f'{name}.sdb'))
 
 def init_dbs():
-    if not os.path.exists('~/.spacew'):
-        os.mkdir('~/.spacew')
+    if not os.path.exists(DB_DIR):
+        os.mkdir(DB_DIR)
 
 
 def get_swpc_ftp_file(file: str, encoding='utf-8') -> str:
     '''retrieves a file using ftp from swpc'''
-    fdir, file = os.path.split(file)
-    ftp = ftplib.FTP('ftp.swpc.noaa.gov', encoding=encoding)
-    ftp.login()
-    ftp.cwd(fdir)
-    out = []
-    ftp.retrbinary(f'RETR {file}', out.append)
-    return ''.join([x.decode(encoding) for x in out])
+    return get_ftp_file(swpc_pool(), file, encoding)
+
+def get_swpc_warehouse_files(years: list[int], kinds: tuple[str, ...] = ('DSD', 'DPD'), \
+                             directory: str = WAREHOUSE_DIR) -> dict[tuple[int, str], str | FetchError]:
+    '''downloads the warehouse files for many years at once, returns the filename for each (year, kind)'''
+    files = {(year, kind): (f'pub/warehouse/{year}/{year}_{kind}.txt', os.path.join(directory, f'{year}_{kind}.txt')) \
+             for year in years for kind in kinds}
+    results = fetch_files(swpc_pool(), dict(files.values()))
+    return {key: results[path] for key, (path, _) in files.items()}
 
 def load_txt_data(data: str, start: date, end: date, first: date | None, mul: int = 1) -> list[list[str]]:
     '''loads data in the .txt format used by api's'''
@@ -76,6 +85,3 @@ def load_txt_data(data: str, start: date, end: date, first: date | None, mul: in
         out = out[:-mul]
     return out
 
-def add_db_swpc_dsd(year: int) -> None:
-    db = load_db(year)
-
@@ -0,0 +1,238 @@
+
+from __future__ import annotations
+
+from typing import Callable, Iterator, NamedTuple
+
+import mmap
+from operator import call
+from datetime import date
+
+
+__all__ = ['TextFormat', 'TextFile', 'KpRecord', 'DSDRecord', 'DPDRecord', 'GFZ_KP', 'SWPC_DSD', 'SWPC_DPD']
+
+
+def _int(token: str) -> int | None:
+    try:
+        return int(token)
+    except ValueError:
+        return None
+
+def _float(token: str) -> float | None:
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+def _str(token: str) -> str | None:
+    return None if token == '*' else token
+
+# the converters to try first, a record that doesn't parse with them is parsed again with the lenient ones
+FAST = {_int: int, _float: float}
+
+
+class KpRecord(NamedTuple):
+    '''a three hour interval of gfz's Kp_ap_since_1932.txt or Kp_ap_nowcast.txt'''
+    date: date
+    hour: float
+    hour_mid: float
+    days: float
+    days_mid: float
+    kp: float
+    ap: int
+    definitive: int
+
+
+class DSDRecord(NamedTuple):
+    '''a day of swpc's daily solar data, YYYY_DSD.txt'''
+    date: date
+    f107: int
+    spots: int
+    area: int
+    new_regions: int
+    mag_field: int | None
+    bg_flux: str | None
+    c_flares: int
+    m_flares: int
+    x_flares: int
+    s_flares: int
+    flares_1: int
+    flares_2: int
+    flares_3: int
+
+
+class DPDRecord(NamedTuple):
+    '''a day of swpc's daily particle data, YYYY_DPD.txt'''
+    date: date
+    p1mev: float
+    p10mev: float
+    p100mev: float
+    e08mev: float
+    e2mev: float
+    a_fredericksburg: int
+    k_fredericksburg: tuple[int, ...]
+    a_college: int
+    k_college: tuple[int, ...]
+    a_planetary: int
+    k_planetary: tuple[int, ...]
+
+
+class TextFormat(NamedTuple):
+    '''a text format with one line per record, each starting with the record's date as YYYY MM DD
+
+    `fields` has a converter and token count for each field of `record` after the date, a count
+    over 1 makes a tuple'''
+    record: type
+    fields: tuple[tuple[Callable[[str], object], int], ...]
+    per_day: int = 1
+
+
+GFZ_KP = TextFormat(KpRecord, ((float, 1), (float, 1), (float, 1), (float, 1), (_float, 1), (_int, 1), (_int, 1)), 8)
+SWPC_DSD = TextFormat(DSDRecord, ((_int, 1),) * 4 + ((_int, 1), (_str, 1)) + ((_int, 1),) * 7)
+SWPC_DPD = TextFormat(DPDRecord, ((_float, 1),) * 5 + ((_int, 1), (_int, 8)) * 3)
+
+
+# bytes decoded at a time while reading lines
+CHUNK = 65536
+
+
+class TextFile:
+    '''the records of a text file in a TextFormat, read lazily from memory or a memory map
+
+    the lines are in date order, so the first line of a day is found with a binary search over byte
+    offsets, and only the lines that are asked for are ever decoded'''
+
+    def __init__(self, data: bytes | mmap.mmap | str, fmt: TextFormat):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.data = data
+        self.fmt = fmt
+        self.start = self._data_start()
+
+    @classmethod
+    def open(cls, filename: str, fmt: TextFormat) -> TextFile:
+        '''memory maps a file, an empty one is read as empty bytes'''
+        with open(filename, 'rb') as file:
+            try:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                data = b''
+        return cls(data, fmt)
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self) -> TextFile:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _data_start(self) -> int:
+        '''skips the header, lines starting with # or :'''
+        pos = 0
+        while pos < len(self.data) and self.data[pos:pos + 1] in (b'#', b':', b'\n'):
+            pos = self._next_line(pos)
+        return pos
+
+    def _next_line(self, pos: int) -> int:
+        end = self.data.find(b'\n', pos)
+        return len(self.data) if end == -1 else end + 1
+
+    def _day_at(self, pos: int) -> date:
+        '''the date of the line starting at pos, lines without one sort last'''
+        head = self.data[pos:pos + 10]
+        try:
+            return date(int(head[0:4]), int(head[5:7]), int(head[8:10]))
+        except ValueError:
+            return date.max
+
+    def offset(self, day: date) -> int:
+        '''the byte offset of the first line on or after `day`'''
+        lo, hi = self.start, len(self.data)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            line = self.data.rfind(b'\n', lo, mid) + 1 or lo
+            if self._day_at(line) < day:
+                lo = self._next_line(mid)
+            else:
+                hi = line
+        return lo
+
+    def lines(self, start: date | None = None, end: date | None = None) -> Iterator[tuple[date, list[str]]]:
+        '''yields the date and tokens of each line in [start, end)'''
+        data = self.data
+        pos = self.start if start is None else self.offset(start)
+        size = len(data)
+        key = day = None
+        while pos < size:
+            stop = min(pos + CHUNK, size)
+            if stop < size:
+                stop = data.rfind(b'\n', pos, stop) + 1 or self._next_line(stop)
+            for line in data[pos:stop].decode('ascii', 'replace').splitlines():
+                tokens = line.split()
+                if tokens[:3] != key:
+                    if len(tokens) < 3 or line[0] in '#:':
+                        continue
+                    try:
+                        day = date(int(tokens[0]), int(tokens[1]), int(tokens[2]))
+                    except ValueError:
+                        continue
+                    key = tokens[:3]
+                if end is not None and day >= end:
+                    return
+                yield day, tokens
+            pos = stop
+
+    def records(self, start: date | None = None, end: date | None = None) -> Iterator[NamedTuple]:
+        '''yields the records in [start, end) with typed fields, fields missing at the end of a line are None
+
+        a field of several values, like a day's k indices, is a tuple of all of them even then'''
+        make = self.fmt.record._make
+        fields = self.fmt.fields
+        width = 3 + sum(count for _, count in fields)
+        lenient = [convert for convert, _ in fields]
+        fast = [FAST.get(convert, convert) for convert in lenient]
+        if all(count == 1 for _, count in fields):
+            for day, tokens in self.lines(start, end):
+                if len(tokens) >= width:
+                    try:
+                        yield make((day, *map(call, fast, tokens[3:width])))
+                        continue
+                    except ValueError:
+                        pass
+                yield make((day, *map(call, lenient, tokens[3:width]), *[None] * (width - len(tokens))))
+            return
+        plan = []
+        i = 3
+        for (_, count), convert, fast_convert in zip(fields, lenient, fast):
+            plan.append((i, count, convert, fast_convert))
+            i += count
+        for day, tokens in self.lines(start, end):
+            if len(tokens) >= width:
+                try:
+                    yield make([day] + [convert(tokens[i]) if count == 1 else tuple(map(convert, tokens[i:i + count])) \
+                                        for i, count, _, convert in plan])
+                    continue
+                except ValueError:
+                    pass
+            yield make([day] + [(convert(tokens[i]) if i < len(tokens) else None) if count == 1 else \
+                                tuple(convert(tokens[j]) if j < len(tokens) else None for j in range(i, i + count)) \
+                                for i, count, convert, _ in plan])
+
+    def first(self) -> date | None:
+        '''the date of the first record'''
+        for day, _ in self.lines():
+            return day
+        return None
+
+    def last(self) -> date | None:
+        '''the date of the last record'''
+        pos = len(self.data)
+        while pos > self.start:
+            line = self.data.rfind(b'\n', self.start, pos - 1) + 1 or self.start
+            day = self._day_at(line)
+            if day != date.max:
+                return day
+            pos = line
+        return None
@@ -0,0 +1,410 @@
+
+'''training data for the forecaster, sliding windows of the daily data streamed from a Dataset
+
+each sample is `history` days of every field, as a (history, features) array, and the kp of the
+`horizon` days after them, as horizon * 8 values. the shards are read one at a time in date order,
+so the whole dataset is never in memory, and the windows are shuffled through a buffer of a fixed
+size, batched, and made ready on a background thread while the model trains on the last batch'''
+
+from __future__ import annotations
+
+from typing import Any, Iterable, Iterator
+
+import os
+import json
+from datetime import date, timedelta
+from queue import Queue, Full
+from threading import Thread, Event
+
+import numpy as np
+from numpy import ma
+
+import codec
+from database import Database, intlist, strlist, timelist
+from dataset import Dataset, stamp
+# the training code is run from spacew-old, which has the flare classes
+from const import FLARE_BASE
+
+
+__all__ = ['Windows', 'features', 'column_stats', 'normalized', 'inputs', 'prefetch']
+
+
+STATS = 'stats.json'
+# change this when features() changes, the statistics in stats.json are worked out again
+FEATURES_VERSION = 1
+
+# list fields with a value per three hours or per hour, each value is a feature
+WIDTHS = {
+    'kp': 8,
+    'ap': 8,
+    'noaa_kp': 8,
+    'flux_p_1mev': 8,
+    'flux_p_10mev': 8,
+    'flux_p_50mev': 8,
+    'flux_p_100mev': 8,
+    'flux_e_08mev': 8,
+    'flux_e_2mev': 8,
+    'wind_speed': 24,
+    'wind_density': 24,
+    'imf_bt': 24,
+    'imf_bz': 24,
+}
+# fields spanning orders of magnitude, their features are log10(1 + value)
+LOG_FIELDS = {'flux_p_1mev', 'flux_p_10mev', 'flux_p_50mev', 'flux_p_100mev', 'flux_e_08mev', 'flux_e_2mev'}
+# variable length lists whose values are added up as well as counted, the other ones are only counted
+SUMMED = {'region_spots', 'region_sizes'}
+
+
+def flare_flux(flare: str) -> float:
+    '''a flare class like 'M2.5' to its x-ray flux in W/m^2, nan if it isn't one'''
+    try:
+        return FLARE_BASE[flare[:1]] * float(flare[1:])
+    except (KeyError, ValueError):
+        return np.nan
+
+
+def fixed(column: ma.MaskedArray | codec.Ragged, width: int) -> np.ndarray:
+    '''the first `width` values of each row of a list column as floats, missing ones are nan'''
+    out = np.full((len(column), width), np.nan)
+    if not isinstance(column, codec.Ragged):
+        n = min(width, column.shape[1])
+        out[:, :n] = ma.filled(column[:, :n].astype(float), np.nan)
+        return out
+    lengths = np.diff(column.offsets)
+    rows = np.repeat(np.arange(len(column)), lengths)
+    cols = np.arange(len(rows)) - np.repeat(column.offsets[:-1] - column.offsets[0], lengths)
+    keep = cols < width
+    values = column.values[column.offsets[0]:column.offsets[-1]]
+    out[rows[keep], cols[keep]] = values[keep]
+    return out
+
+
+def features(arrays: dict[str, Any], types: dict[str, type]) -> tuple[np.ndarray, list[str]]:
+    '''the fields of Database.to_arrays as a (rows, features) float array and the features' names
+
+    numbers are taken as they are, flare classes as log10 of their flux, the lists in WIDTHS as
+    that many values, and other lists as their length (and the sum of their values for the ones in
+    SUMMED). nulls are nan'''
+    out, names = [], []
+    for field, dtype in types.items():
+        column = arrays[field]
+        if dtype in (int, float):
+            out.append(ma.filled(column.astype(float), np.nan)[:, None])
+            names.append(field)
+        elif dtype == str:
+            values, inverse = np.unique(ma.getdata(column), return_inverse=True)
+            flux = np.array([flare_flux(value) for value in values.tolist()])[inverse]
+            flux[ma.getmaskarray(column)] = np.nan
+            with np.errstate(divide='ignore', invalid='ignore'):
+                out.append(np.log10(flux)[:, None])
+            names.append(field)
+        elif field in WIDTHS:
+            values = fixed(column, WIDTHS[field])
+            out.append(np.log10(1 + np.maximum(values, 0)) if field in LOG_FIELDS else values)
+            names += [f'{field}[{i}]' for i in range(WIDTHS[field])]
+        elif dtype in (intlist, strlist, timelist):
+            column = codec.as_ragged(column)
+            lengths = np.diff(column.offsets).astype(float)
+            lengths[column.mask] = np.nan
+            out.append(lengths[:, None])
+            names.append(f'{field}.count')
+            if field in SUMMED:
+                sums = np.add.reduceat(np.append(column.values[column.offsets[0]:column.offsets[-1]], 0), \
+                                       column.offsets[:-1] - column.offsets[0]).astype(float)
+                # reduceat gives the value at the offset for an empty row instead of 0
+                sums[lengths == 0] = 0
+                sums[column.mask] = np.nan
+                out.append(sums[:, None])
+                names.append(f'{field}.sum')
+        else:
+            raise ValueError(f'field {field!r} of type {dtype.__name__} can\'t be a feature')
+    return np.hstack(out) if out else np.zeros((0, 0)), names
+
+
+def shard_types(db: Database, fields: tuple[str, ...] | None = None) -> dict[str, type]:
+    return {field: dtype for field, dtype in zip(db.fields, db.schema) if fields is None or field in fields}
+
+
+def _combine(a: dict[str, np.ndarray], b: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    '''the count, mean and sum of squared deviations of two parts together (chan et al.)'''
+    count = a['count'] + b['count']
+    delta = b['mean'] - a['mean']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(count > 0, a['mean'] + delta * b['count'] / count, 0)
+        m2 = np.where(count > 0, a['m2'] + b['m2'] + delta ** 2 * a['count'] * b['count'] / count, 0)
+    return {'count': count, 'mean': mean, 'm2': m2}
+
+
+def column_stats(dataset: Dataset, start: Any = None, end: Any = None, \
+                 fields: tuple[str, ...] | None = None) -> dict[str, Any]:
+    '''the mean and standard deviation of each feature over the shards with rows in [start, end)
+
+    the statistics are worked out per shard and kept in stats.json in the dataset's directory, a
+    shard's are only worked out again when it changes. gives a dict of 'names', 'mean' and 'std',
+    a feature with no spread has a std of 1'''
+    filename = os.path.join(dataset.directory, STATS)
+    try:
+        with open(filename, 'r', encoding='utf-8') as file:
+            saved = json.load(file)
+    except (FileNotFoundError, ValueError):
+        saved = {}
+    changed = False
+    total, names = None, None
+    for shard in dataset.shards(start, end):
+        name = os.path.basename(shard)
+        db = Database(shard)
+        types = shard_types(db, fields)
+        key = {'stamp': stamp(shard), 'version': FEATURES_VERSION, 'fields': list(types)}
+        entry = saved.get(name)
+        if entry is None or any(entry[k] != v for k, v in key.items()):
+            x, shard_names = features(db.to_arrays(tuple(types), widths=WIDTHS), types)
+            count = np.sum(~np.isnan(x), axis=0)
+            with np.errstate(invalid='ignore'):
+                mean = np.where(count > 0, np.nansum(x, axis=0) / np.maximum(count, 1), 0)
+            m2 = np.nansum((x - mean) ** 2, axis=0)
+            entry = saved[name] = key | {'names': shard_names, 'count': count.tolist(), 'mean': mean.tolist(), 'm2': m2.tolist()}
+            changed = True
+        part = {k: np.array(entry[k], dtype=float) for k in ('count', 'mean', 'm2')}
+        if names is not None and entry['names'] != names:
+            raise ValueError(f'shard {name!r} has different fields from the others')
+        names = entry['names']
+        total = part if total is None else _combine(total, part)
+    if changed:
+        with open(filename + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(saved, file)
+        os.replace(filename + '.tmp', filename)
+    if total is None:
+        raise ValueError(f'no rows in {dataset.directory!r} to work out statistics from')
+    with np.errstate(invalid='ignore'):
+        std = np.sqrt(total['m2'] / total['count'])
+    std[~(std > 0)] = 1
+    return {'names': names, 'mean': total['mean'], 'std': std}
+
+
+def normalized(arrays: dict[str, Any], types: dict[str, type], stats: dict[str, Any]) -> np.ndarray:
+    '''the features of the rows in `arrays` as float32, normalized with `stats` and with nulls as 0'''
+    values, names = features(arrays, types)
+    if names != list(stats['names']):
+        raise ValueError('the fields don\'t have the same features as the statistics')
+    return np.nan_to_num((values - np.asarray(stats['mean'])) / np.asarray(stats['std']), nan=0).astype(np.float32)
+
+
+def inputs(dataset: Dataset, ends: list[date], history: int, stats: dict[str, Any], \
+           fields: tuple[str, ...] | None = None, cache: dict[str, Any] | None = None) -> np.ndarray:
+    '''the windows of the `history` days before each day in `ends`, as Windows gives them to the model
+
+    gives a (len(ends), history, features) float32 array, days without a row are 0 like nulls. the
+    days of all the windows are read at once. with a `cache` dict, whole shards are read and their
+    features are kept in it until the shard changes, for a process that keeps answering requests'''
+    out = np.zeros((len(ends), history, len(stats['names'])), dtype=np.float32)
+    if not ends:
+        return out
+    first, last = min(ends) - timedelta(days=history), max(ends)
+    parts = []
+    for filename in dataset.shards(first, last):
+        key = stamp(filename)
+        if cache is not None and filename in cache and cache[filename][0] == key:
+            parts.append(cache[filename][1:])
+            continue
+        db = Database(filename)
+        types = shard_types(db, fields)
+        if cache is None:
+            arrays = db.to_arrays(tuple(types), first, last, WIDTHS)
+        else:
+            arrays = db.to_arrays(tuple(types), widths=WIDTHS)
+        days = arrays['name'].data.astype(np.int64)
+        x = normalized(arrays, types, stats) if len(days) else np.zeros((0, out.shape[2]), dtype=np.float32)
+        if cache is not None:
+            cache[filename] = (key, days, x)
+        parts.append((days, x))
+    for i, end in enumerate(np.array(ends, dtype='datetime64[D]').astype(np.int64).tolist()):
+        for days, x in parts:
+            lo, hi = np.searchsorted(days, (end - history, end))
+            out[i, days[lo:hi] - (end - history)] = x[lo:hi]
+    return out
+
+
+_DONE = object()
+
+def prefetch(iterable: Iterable[Any], size: int = 2) -> Iterator[Any]:
+    '''iterates over `iterable` on a background thread, keeping up to `size` items ready
+
+    an exception in the thread is raised here, and closing the generator stops the thread'''
+    queue = Queue(size)
+    stop = Event()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def worker() -> None:
+        try:
+            for item in iterable:
+                if not put((None, item)):
+                    return
+        except BaseException as e:
+            put((e, None))
+            return
+        put((_DONE, None))
+
+    thread = Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            error, item = queue.get()
+            if error is _DONE:
+                return
+            if error is not None:
+                raise error
+            yield item
+    finally:
+        stop.set()
+
+
+class Windows:
+    '''the windows of a dataset in [start, end) as an iterable of (x, y) batches, one epoch per iteration
+
+    x is float32 (batch, history, features) normalized with the statistics from column_stats
+    (pass another Windows' `stats` to use the training data's for validation), with nulls as 0. y
+    is float32 (batch, horizon * 8), the kp of each three hours of the days after the window. only
+    windows of consecutive days whose target days all have their 8 kps are used. `shuffle` is the
+    size of the shuffle buffer, 0 keeps date order. use generator() or tf_dataset() for model.fit'''
+
+    def __init__(self, dataset: Dataset | str, start: Any = None, end: Any = None, history: int = 27, \
+                 horizon: int = 3, fields: tuple[str, ...] | None = None, batch_size: int = 64, \
+                 shuffle: int = 1024, prefetch: int = 2, seed: int | None = None, \
+                 stats: dict[str, Any] | None = None) -> None:
+        self.dataset = dataset if isinstance(dataset, Dataset) else Dataset(dataset)
+        self.start, self.end = start, end
+        self.history, self.horizon = history, horizon
+        self.fields = fields
+        self.batch_size, self.shuffle, self.prefetch = batch_size, shuffle, prefetch
+        self.rng = np.random.default_rng(seed)
+        self.stats = column_stats(self.dataset, start, end, fields) if stats is None else stats
+        self.names = self.stats['names']
+        self._samples = None
+
+    def _read(self, filename: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''a shard's days as day numbers, normalized features and kp targets'''
+        db = Database(filename)
+        types = shard_types(db, self.fields)
+        arrays = db.to_arrays(tuple(dict.fromkeys((*types, 'kp'))), self.start, self.end, WIDTHS)
+        days = arrays['name'].data.astype(np.int64)
+        x = normalized(arrays, types, self.stats) if len(days) else np.zeros((0, len(self.names)), dtype=np.float32)
+        y = (fixed(arrays['kp'], 8) / 3).astype(np.float32)
+        return days, x, y
+
+    def _starts(self, days: np.ndarray, y: np.ndarray) -> np.ndarray:
+        '''the first row of each usable window'''
+        span = self.history + self.horizon
+        if len(days) < span:
+            return np.zeros(0, dtype=np.int64)
+        starts = np.arange(len(days) - span + 1)
+        consecutive = days[starts + span - 1] - days[starts] == span - 1
+        present = ~np.isnan(y).any(axis=1)
+        targets = np.lib.stride_tricks.sliding_window_view(present, self.horizon).all(axis=1)
+        return starts[consecutive & targets[self.history:]]
+
+    def blocks(self) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        '''the windows a shard at a time in date order, windows across the end of a year included'''
+        span = self.history + self.horizon
+        tail = None
+        offsets = np.arange(self.history)
+        for filename in self.dataset.shards(self.start, self.end):
+            days, x, y = self._read(filename)
+            if tail is not None:
+                days, x, y = (np.concatenate(pair) for pair in zip(tail, (days, x, y)))
+            starts = self._starts(days, y)
+            if len(starts):
+                yield x[starts[:, None] + offsets], \
+                      y[starts[:, None] + np.arange(self.history, span)].reshape(len(starts), -1)
+            tail = days[-(span - 1):], x[-(span - 1):], y[-(span - 1):]
+
+    def _shuffled(self, blocks: Iterable[tuple[np.ndarray, np.ndarray]]) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        '''each window goes into a buffer of `shuffle` windows, and a random one from the buffer comes out'''
+        size = self.shuffle
+        bx = by = None
+        filled = 0
+        for x, y in blocks:
+            if bx is None:
+                bx = np.empty((size, *x.shape[1:]), dtype=x.dtype)
+                by = np.empty((size, *y.shape[1:]), dtype=y.dtype)
+            n = min(size - filled, len(x))
+            bx[filled:filled + n], by[filled:filled + n] = x[:n], y[:n]
+            filled += n
+            step = min(size, self.batch_size)
+            for i in range(n, len(x), step):
+                # a slot only once per step, so each window that comes out was in the buffer
+                slots = self.rng.choice(size, min(step, len(x) - i), replace=False)
+                yield bx[slots], by[slots]
+                bx[slots], by[slots] = x[i:i + len(slots)], y[i:i + len(slots)]
+        if filled:
+            order = self.rng.permutation(filled)
+            yield bx[order], by[order]
+
+    def _batched(self, blocks: Iterable[tuple[np.ndarray, np.ndarray]]) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        xs, ys, n = [], [], 0
+        for x, y in blocks:
+            xs.append(x)
+            ys.append(y)
+            n += len(x)
+            if n < self.batch_size:
+                continue
+            x, y = np.concatenate(xs), np.concatenate(ys)
+            full = n - n % self.batch_size
+            for i in range(0, full, self.batch_size):
+                yield x[i:i + self.batch_size], y[i:i + self.batch_size]
+            xs, ys, n = [x[full:]], [y[full:]], n - full
+        if n:
+            yield np.concatenate(xs), np.concatenate(ys)
+
+    def batches(self) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        '''one epoch of batches, worked out on the calling thread'''
+        blocks = self.blocks()
+        if self.shuffle > 1:
+            blocks = self._shuffled(blocks)
+        return self._batched(blocks)
+
+    def __iter__(self) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        return prefetch(self.batches(), self.prefetch) if self.prefetch > 0 else self.batches()
+
+    @property
+    def samples(self) -> int:
+        '''the number of windows in an epoch'''
+        if self._samples is None:
+            self._samples = 0
+            tail = None
+            span = self.history + self.horizon
+            for filename in self.dataset.shards(self.start, self.end):
+                arrays = Database(filename).to_arrays(('kp',), self.start, self.end, WIDTHS)
+                days, y = arrays['name'].data.astype(np.int64), fixed(arrays['kp'], 8)
+                if tail is not None:
+                    days, y = np.concatenate((tail[0], days)), np.concatenate((tail[1], y))
+                self._samples += len(self._starts(days, y))
+                tail = days[-(span - 1):], y[-(span - 1):]
+        return self._samples
+
+    def __len__(self) -> int:
+        '''the number of batches in an epoch'''
+        return -(-self.samples // self.batch_size)
+
+    def generator(self, epochs: int | None = None) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        '''the batches of `epochs` epochs one after another, forever if None, for
+        model.fit(windows.generator(), steps_per_epoch=len(windows))'''
+        epoch = 0
+        while epochs is None or epoch < epochs:
+            yield from self
+            epoch += 1
+
+    def tf_dataset(self) -> Any:
+        '''one epoch as a tf.data.Dataset, each iteration of it is a new epoch'''
+        import tensorflow as tf
+        return tf.data.Dataset.from_generator(lambda: iter(self), output_signature=(
+            tf.TensorSpec((None, self.history, len(self.names)), tf.float32),
+            tf.TensorSpec((None, self.horizon * 8), tf.float32),
+        ))
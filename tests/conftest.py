@@ -0,0 +1,9 @@
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# the modules import each other by name, the same way the cli and the benchmarks run them
+for directory in ('spacew', 'spacew-old', 'benchmarks'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
@@ -0,0 +1,114 @@
+
+from datetime import date, time
+
+import pytest
+
+np = pytest.importorskip('numpy')
+from numpy import ma
+
+import codec
+from database import Database, convert, strlist, intlist, timelist
+from dataset import Dataset
+from synthetic import make_database
+
+
+SCHEMA = {'a': str, 'b': int, 'c': float, 'kp': intlist, 'regions': intlist, 'mags': strlist, 'times': timelist}
+DAYS = [date(2020, 1, day) for day in (3, 1, 2, 5, 4)]
+
+
+def values(i):
+    return {'a': f'x{i}', 'b': i, 'c': i / 2, 'kp': [i] * 8, 'regions': list(range(i)), 'mags': ['A'] * (i % 2 + 1), \
+            'times': [time(i, 30)]}
+
+
+@pytest.fixture(params=['sdb', 'sdbc'])
+def db(tmp_path, request):
+    filename = str(tmp_path / f'test.{request.param}')
+    db = Database(filename, SCHEMA, date, request.param)
+    for i, day in enumerate(DAYS):
+        row = db.new_row(day)
+        for field, value in values(i).items():
+            row[field] = value
+        row.save()
+    # a row with every field null
+    db.new_row(date(2020, 1, 6)).save()
+    db.save()
+    return Database(filename)
+
+
+def as_lists(column):
+    '''the values of a column as the rows give them'''
+    if isinstance(column, codec.Ragged):
+        return [None if column.mask[i] else column.row(i).tolist() for i in range(len(column))]
+    if column.ndim == 2:
+        return [None if row.all() else values for values, row in zip(column.tolist(), ma.getmaskarray(column))]
+    return column.tolist()
+
+
+def test_to_arrays(db):
+    arrays = db.to_arrays()
+    rows = list(db.range())
+    assert arrays['name'].tolist() == [row.name for row in rows]
+    for field in SCHEMA:
+        if field == 'times':
+            continue
+        assert as_lists(arrays[field]) == [row[field] for row in rows]
+    # a list field is 2-D when its rows have one length, nulls are masked
+    assert arrays['kp'].shape == (6, 8) and arrays['kp'].mask[-1].all() and not arrays['kp'].mask[:-1].any()
+    # an empty list is null too
+    assert isinstance(arrays['regions'], codec.Ragged)
+    assert arrays['regions'].mask.tolist() == [False, False, True, False, False, True]
+    assert arrays['b'].mask.tolist() == [False] * 5 + [True]
+    assert arrays['times'][0, 0] == np.timedelta64(3600 + 30 * 60, 's')
+
+
+def test_to_arrays_range(db):
+    arrays = db.to_arrays(('b', 'kp'), date(2020, 1, 2), date(2020, 1, 5), widths={'kp': 4})
+    assert list(arrays) == ['name', 'b', 'kp']
+    assert arrays['name'].tolist() == [date(2020, 1, 2), date(2020, 1, 3), date(2020, 1, 4)]
+    assert arrays['b'].tolist() == [2, 0, 4]
+    # a width that isn't the rows' length leaves them ragged
+    assert isinstance(arrays['kp'], codec.Ragged) and as_lists(arrays['kp']) == [[2] * 8, [0] * 8, [4] * 8]
+
+
+def test_views(tmp_path):
+    # a columnar database in name order gives views into the file, not copies
+    make_database(str(tmp_path / 'test.sdb'), date(2020, 1, 1), date(2020, 3, 1))
+    convert(str(tmp_path / 'test.sdb'), str(tmp_path / 'test.sdbc'))
+    db = Database(str(tmp_path / 'test.sdbc'))
+    arrays = db.to_arrays(('spots', 'kp'), date(2020, 1, 10), date(2020, 2, 10))
+    assert len(arrays['spots']) == 31
+    for column in (arrays['spots'], arrays['kp']):
+        assert not column.data.flags.owndata and not column.data.flags.writeable
+    expected = Database(str(tmp_path / 'test.sdb')).to_arrays(('spots', 'kp'), date(2020, 1, 10), date(2020, 2, 10))
+    assert arrays['spots'].tolist() == expected['spots'].tolist() and arrays['kp'].tolist() == expected['kp'].tolist()
+    # with unsaved changes the rows are decoded instead
+    row = db[date(2020, 1, 10)]
+    row.spots = -1
+    row.save()
+    assert db.to_arrays(('spots',), date(2020, 1, 10), date(2020, 1, 11))['spots'].tolist() == [-1]
+
+
+def test_structured(db):
+    out = db.to_arrays(('b', 'c', 'kp'), structured=True)
+    assert out.dtype.names == ('name', 'b', 'c', 'kp') and out['kp'].shape == (6, 8)
+    assert out['b'].tolist() == db.to_arrays(('b',))['b'].tolist()
+    assert out.mask['b'].tolist() == [False] * 5 + [True]
+    with pytest.raises(ValueError):
+        db.to_arrays(('regions',), structured=True)
+
+
+def test_dataset_to_arrays(tmp_path):
+    for year in (2001, 2002):
+        make_database(str(tmp_path / f'{year}.sdb'), date(year, 12, 1), date(year + 1, 1, 1), seed=year)
+    dataset = Dataset(str(tmp_path))
+    arrays = dataset.to_arrays(date(2001, 12, 30), date(2002, 12, 3), ('spots', 'kp', 'regions'))
+    assert arrays['name'].tolist() == [date(2001, 12, 30), date(2001, 12, 31), date(2002, 12, 1), date(2002, 12, 2)]
+    assert arrays['kp'].shape == (4, 8) and isinstance(arrays['regions'], codec.Ragged)
+    assert as_lists(arrays['regions']) == [row.regions for row in dataset.rows(date(2001, 12, 30), date(2002, 12, 3), workers=1)]
+    # an empty range still has the columns, with their types
+    empty = dataset.to_arrays(date(2005, 1, 1), date(2005, 2, 1), ('spots', 'kp'))
+    assert len(empty['spots']) == 0 and empty['spots'].dtype == np.int64 and empty['kp'].shape == (0, 8)
+    (tmp_path / 'nothing').mkdir()
+    with pytest.raises(ValueError):
+        Dataset(str(tmp_path / 'nothing')).to_arrays()
@@ -0,0 +1,100 @@
+
+import os
+import multiprocessing
+
+import pytest
+
+import cache
+from cache import CacheStore, CacheError
+
+
+def test_sidecars(tmp_path):
+    store = CacheStore(str(tmp_path), sidecars=('.sync',))
+    filename = store.path('gfz/kp.txt')
+    with open(filename, 'wb') as file:
+        file.write(b'x' * 100)
+    with open(filename + '.sync', 'wb') as file:
+        file.write(b'y' * 20)
+    store.commit('gfz/kp.txt')
+    # a sidecar counts towards its entry's size and goes with it
+    assert store.stats()['bytes'] == 120
+    store.invalidate('gfz/kp.txt')
+    assert not os.path.exists(filename) and not os.path.exists(filename + '.sync')
+    # files the cache wasn't told about are left alone
+    store.put('gfz/kp.txt', b'x')
+    with open(filename + '.other', 'wb') as file:
+        file.write(b'z')
+    store.clear()
+    assert os.path.exists(filename + '.other')
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, 'time', clock)
+    store = CacheStore(str(tmp_path))
+    store.put('swpc/a.txt', b'a', ttl=60)
+    store.put('swpc/b.txt', b'b')
+    assert store.get('swpc/a.txt') == b'a' and store.stamp('swpc/a.txt') == (1000.0, 1)
+    clock.now += 61
+    # an expired entry is a miss, but it's still there to be served stale
+    assert store.get('swpc/a.txt') is None and store.get('swpc/a.txt', stale=True) == b'a'
+    assert store.age('swpc/a.txt') == 61 and store.get('swpc/b.txt') == b'b'
+    assert store.expired() == ['swpc/a.txt'] and store.expired('gfz/') == []
+    assert store.stats() | {'max_bytes': 0} == {'entries': 2, 'expired': 1, 'bytes': 2, 'max_bytes': 0, \
+                                                'hits': 3, 'misses': 1, 'evictions': 0}
+    store.put('swpc/a.txt', b'aa', ttl=60)
+    assert store.get('swpc/a.txt') == b'aa' and store.expired() == []
+
+
+def test_eviction_order(tmp_path):
+    store = CacheStore(str(tmp_path), max_bytes=30)
+    for i, key in enumerate(('a', 'b', 'c')):
+        store.put(key, b'x' * 10)
+        os.utime(store.path(key), (i, i))
+    # reading an entry makes it the most recently used, so b goes first and then c
+    assert store.get('a') is not None
+    store.put('d', b'x' * 10)
+    assert [key for key in 'abcd' if store.fresh(key)] == ['a', 'c', 'd']
+    for key in 'acd':
+        os.utime(store.path(key), None)
+    os.utime(store.path('c'), (0, 0))
+    # an entry bigger than the rest is kept, everything else goes
+    store.put('e', b'x' * 25)
+    assert [key for key in 'acde' if os.path.exists(store.path(key))] == ['e']
+    assert store.stats()['evictions'] == 4 and store.stats()['bytes'] == 25
+
+
+def test_keys(tmp_path):
+    store = CacheStore(str(tmp_path))
+    for key in ('../x', 'a/../b', '/abs', 'a//b', 'index.json', 'a b'):
+        with pytest.raises(CacheError):
+            store.get(key)
+    assert store.get('gfz/missing.txt') is None
+
+
+def writer(directory, number, count):
+    store = CacheStore(directory)
+    for i in range(count):
+        store.put(f'w{number}/{i}', str(i))
+
+
+def test_processes(tmp_path):
+    '''writers in several processes don't lose each other's entries from the index'''
+    count = 20
+    procs = [multiprocessing.Process(target=writer, args=(str(tmp_path), number, count)) for number in range(4)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+        assert proc.exitcode == 0
+    store = CacheStore(str(tmp_path))
+    assert store.stats()['entries'] == 4 * count
+    assert all(store.get(f'w{number}/{i}') == str(i).encode() for number in range(4) for i in range(count))
@@ -0,0 +1,72 @@
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import const
+import classify
+from const import KP_TO_INT, KP_TO_AP, KP_TO_G, INT_TO_KP
+
+
+KPS = list(KP_TO_INT)
+APS = list(range(-5, 600))
+FLARES = [f'{letter}{number}' for letter in 'ABCMX' for number in \
+          ('0.1', '1', '1.0', '01', '0.99', '1.01', '4.9', '4.99', '5', '5.0', '9.9', '9.99', '10', '10.0', '10.1', \
+           '19.9', '19.99', '20', '20.0', '25.5', '99', '99.99')]
+PFUS = [-1, 0, 0.5, 9.9, 10, 10.1, 99, 100, 999, 1000, 9999, 10000, 99999, 100000, 1e6]
+
+
+def test_kp_tables():
+    thirds = classify.kp_to_thirds(KPS)
+    assert thirds.tolist() == [KP_TO_INT[kp] for kp in KPS]
+    assert classify.thirds_to_kp(thirds).tolist() == KPS
+    assert classify.thirds_to_ap(thirds).tolist() == [KP_TO_AP[kp] for kp in KPS]
+    assert classify.g_scale(thirds).tolist() == [KP_TO_G[kp] for kp in KPS]
+    assert classify.kp_values_to_thirds([float(value) for value in const.KP_VALUE]).tolist() == \
+           [KP_TO_INT[kp] for kp in const.KP_VALUE.values()]
+
+
+def test_ap_to_thirds():
+    vector = classify.ap_to_thirds(APS).tolist()
+    assert vector == [const.ap_to_thirds(ap) for ap in APS]
+    assert classify.ap_to_thirds(np.array(APS).reshape(5, -1)).ravel().tolist() == vector
+    # each kp's own ap maps back to it
+    for kp, ap in KP_TO_AP.items():
+        assert const.ap_to_kp(ap) == ('0' if ap < 2 else kp)
+    assert const.ap_to_thirds(501) == -1
+    assert const.ap_to_kp(501) is None
+
+
+def test_scalars():
+    # a scalar gives a 0-d array, not an error
+    assert classify.ap_to_thirds(5).shape == ()
+    assert int(classify.ap_to_thirds(5)) == KP_TO_INT['1+']
+    assert int(classify.r_scale(classify.flare_flux('M5'))) == 2
+    assert int(classify.s_scale(100)) == 2
+
+
+def test_flare_to_r():
+    vector = classify.r_scale(classify.flare_flux(FLARES)).tolist()
+    assert vector == [const.flare_to_r(flare) for flare in FLARES]
+    levels = dict(zip(FLARES, vector))
+    assert levels['M0.99'] == 0 and levels['M1'] == levels['M1.0'] == levels['M01'] == 1
+    assert levels['M4.99'] == 1 and levels['M5'] == levels['M5.0'] == 2
+    assert levels['X1'] == 3 and levels['X9.99'] == 3 and levels['X10'] == 4 and levels['X20'] == levels['X20.0'] == 5
+    # a class that isn't written the usual way is levelled by its flux, C10.1 is M1.01
+    assert levels['C10.1'] == levels['M1.01'] == 1
+    assert levels['C99.99'] == 2
+    assert levels['B99'] == 0
+
+
+def test_pfu_to_s():
+    assert classify.s_scale(PFUS).tolist() == [const.pfu_to_s(pfu) for pfu in PFUS]
+    assert [const.pfu_to_s(pfu) for pfu in PFUS] == [0, 0, 0, 0, 1, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+
+
+def test_daily():
+    kps = np.array([[0, 28, 14, np.nan], [3, 3, 4, 4]])
+    aps = np.array([[0, 500, 39, np.nan], [4, 4, 5, 5]])
+    out = classify.daily(kps, aps)
+    assert out['kp'].tolist() == [14, 4] and out['kp_min'].tolist() == [0, 3] and out['kp_max'].tolist() == [28, 4]
+    assert out['g'].tolist() == [KP_TO_G[INT_TO_KP[14]], 0] and out['g_max'].tolist() == [5, 0]
+    assert out['ap'].tolist() == [180, 4] and out['ap_min'].tolist() == [0, 4] and out['ap_max'].tolist() == [500, 5]
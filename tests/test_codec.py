@@ -0,0 +1,71 @@
+
+import random
+from datetime import datetime, date, time, timedelta
+
+import pytest
+
+import codec
+from database import from_field, to_field, strlist, intlist, timelist
+
+
+ITEMS = ['dir\\', 'a,b', 'c:d', '\\\\', '\\,', ',\\', 'x\\:', ':', ',', '\\', 'C:\\', 'plain', 'ü']
+
+
+def value(rng, dtype):
+    if dtype == bool:
+        return rng.random() < 0.5
+    elif dtype == int:
+        return rng.randint(-10 ** 12, 10 ** 12)
+    elif dtype == float:
+        return rng.uniform(-1e6, 1e6)
+    elif dtype == complex:
+        return complex(rng.uniform(-1e3, 1e3), rng.uniform(0, 1e3))
+    elif dtype == str:
+        return ''.join(rng.choice(ITEMS) for _ in range(rng.randint(1, 3)))
+    elif dtype == date:
+        return date(1900, 1, 1) + timedelta(days=rng.randint(0, 60000))
+    elif dtype == datetime:
+        return datetime(1900, 1, 1) + timedelta(seconds=rng.randint(0, 4 * 10 ** 9), microseconds=rng.choice((0, rng.randint(0, 999999))))
+    elif dtype == time:
+        return (datetime.min + timedelta(seconds=rng.randint(0, 86399), microseconds=rng.choice((0, rng.randint(0, 999999))))).time()
+    elif dtype == strlist:
+        return [rng.choice(ITEMS) for _ in range(rng.randint(1, 4))]
+    elif dtype == intlist:
+        return [rng.randint(-1000, 1000) for _ in range(rng.choice((3, 3, rng.randint(1, 4))))]
+    elif dtype == timelist:
+        return [value(rng, time) for _ in range(rng.choice((2, 2, rng.randint(1, 4))))]
+
+
+def python(item):
+    if isinstance(item, timedelta):
+        return (datetime.min + item).time()
+    elif isinstance(item, list):
+        return [python(element) for element in item]
+    return item
+
+
+def to_python(column):
+    '''the values of a decoded column as from_field gives them'''
+    if isinstance(column, codec.Ragged):
+        return [None if column.mask[i] else python(column.row(i).tolist()) for i in range(len(column))]
+    out = []
+    for row in column.tolist():
+        if isinstance(row, list) and all(item is None for item in row):
+            row = None
+        out.append(python(row))
+    return out
+
+
+@pytest.mark.parametrize('dtype', [bool, int, float, complex, str, date, datetime, time, strlist, intlist, timelist])
+@pytest.mark.parametrize('seed', range(20))
+def test_decode_column_matches_from_field(dtype, seed):
+    rng = random.Random(seed)
+    fields = [to_field(None if rng.random() < 0.2 else value(rng, dtype)) for _ in range(rng.randint(0, 30))]
+    column = codec.decode_column(fields, dtype)
+    assert to_python(column) == [from_field(field, dtype) for field in fields]
+    assert codec.encode_column(column, dtype) == fields
+
+
+def test_strlist_items_ending_in_backslash():
+    fields = [to_field(['C:\\']), to_field(['b'])]
+    assert to_python(codec.decode_column(fields, strlist)) == [['C:\\'], ['b']]
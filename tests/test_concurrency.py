@@ -0,0 +1,149 @@
+
+import multiprocessing
+from datetime import date, timedelta
+
+import pytest
+
+from database import Database, read_generation
+
+
+FIRST = date(2000, 1, 1)
+
+
+def make(filename, values):
+    db = Database(filename, {'x': int}, date)
+    for day, value in enumerate(values):
+        row = db.new_row(FIRST + timedelta(days=day))
+        row.x = value
+        row.save()
+    db.save()
+
+
+def values(filename):
+    return [row.x for row in Database(filename).range()]
+
+
+def set_value(db, day, value):
+    row = db[FIRST + timedelta(days=day)] if FIRST + timedelta(days=day) in db else db.new_row(FIRST + timedelta(days=day))
+    row.x = value
+    row.save()
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_compact_twice(tmp_path, fmt):
+    '''a writer that opened the database before two compactions by another still sees their rows,
+    even when the filesystem gives the first file's inode back to the last one'''
+    filename = str(tmp_path / f'test.{fmt}')
+    make(filename, [1, 2])
+    a = Database(filename)
+    b = Database(filename)
+    generation = read_generation(filename)
+    set_value(b, 0, 100)
+    b.save()
+    b.compact()
+    set_value(b, 1, 200)
+    b.save()
+    b.compact()
+    assert read_generation(filename) == generation + 2
+    set_value(a, 2, 300)
+    a.save()
+    a.compact()
+    assert values(filename) == [100, 200, 300]
+    assert [row.x for row in Database.scan(filename)] == [100, 200, 300]
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_journal_after_compaction(tmp_path, fmt):
+    '''a writer whose journal offset is from before a compaction doesn't append to the new journal
+    at that offset or replay it from there'''
+    filename = str(tmp_path / f'test.{fmt}')
+    make(filename, [1, 2, 3])
+    a = Database(filename)
+    set_value(a, 0, 10)
+    a.save()
+    b = Database(filename)
+    b.compact()
+    set_value(b, 1, 20)
+    b.save()
+    set_value(a, 2, 30)
+    a.save()
+    assert values(filename) == [10, 20, 30]
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_stale_journal(tmp_path, fmt):
+    '''the journal of a writer that died between replacing the file and removing the journal is
+    skipped, and dropped by the next save'''
+    filename = str(tmp_path / f'test.{fmt}')
+    make(filename, [1, 2])
+    db = Database(filename)
+    set_value(db, 0, 10)
+    db.save()
+    with open(db.journal, 'rb') as file:
+        stale = file.read()
+    db.compact()
+    set_value(db, 1, 20)
+    db.compact()
+    with open(db.journal, 'wb') as file:
+        file.write(stale)
+    assert values(filename) == [10, 20]
+    db = Database(filename)
+    set_value(db, 1, 30)
+    db.save()
+    assert values(filename) == [10, 30]
+    with open(db.journal, 'rb') as file:
+        assert stale not in file.read()
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_row_after_reload(tmp_path, fmt):
+    '''a row handed out before the database was loaded again, at a generation where its index is
+    another row's, still reads and writes its own row'''
+    filename = str(tmp_path / f'test.{fmt}')
+    db = Database(filename, {'x': int, 'y': int}, date)
+    db.new_row(FIRST).save()
+    db.save()
+    a = Database(filename)
+    b = Database(filename)
+    row = a.new_row(FIRST + timedelta(days=3))
+    row.x, row.y = 3, 30
+    row.save()
+    a.save()
+    # b makes day 5 before it takes in day 3, so its file has them the other way around
+    row = b.new_row(FIRST + timedelta(days=5))
+    row.x, row.y = 5, 50
+    row.save()
+    b.save()
+    b.compact()
+    row = a[FIRST + timedelta(days=3)]
+    a[FIRST].save()
+    a.save()
+    row.x = 33
+    row.save()
+    a.save()
+    assert [(row.x, row.y) for row in Database(filename).range()] == [(None, None), (33, 30), (5, 50)]
+
+
+def writer(filename, number, count):
+    db = Database(filename)
+    for i in range(count):
+        set_value(db, number * count + i, number)
+        if i % 3 == 2:
+            db.compact()
+        else:
+            db.save()
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_concurrent_writers(tmp_path, fmt):
+    '''writers in several processes that save and compact at once don't lose each other's rows'''
+    filename = str(tmp_path / f'test.{fmt}')
+    make(filename, [])
+    writers, count = 4, 30
+    procs = [multiprocessing.Process(target=writer, args=(filename, number, count)) for number in range(writers)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+        assert proc.exitcode == 0
+    assert values(filename) == [number for number in range(writers) for _ in range(count)]
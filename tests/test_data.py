@@ -0,0 +1,98 @@
+
+import os
+from datetime import date, timedelta
+
+import pytest
+
+import data
+import textdata
+from cache import CacheStore
+from synthetic import dsd_text, dpd_text
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = CacheStore(str(tmp_path / 'cache'))
+    monkeypatch.setattr(data, 'cache', store)
+    data._warehouse_records.clear()
+    yield store
+    data._warehouse_records.clear()
+
+
+def parse(text, kind):
+    with textdata.TextFile(text.encode('utf-8'), textdata.SWPC_DSD if kind == 'DSD' else textdata.SWPC_DPD) as file:
+        return {record.date: record for record in file.records()}
+
+
+@pytest.mark.parametrize('kind, make', [('DSD', dsd_text), ('DPD', dpd_text)])
+def test_warehouse_shard(store, monkeypatch, kind, make):
+    text = make(2003)
+    store.put(data.warehouse_key(2003, kind), text)
+    records = data.warehouse_records(2003, kind)
+    assert records == parse(text, kind)
+    shard = store.path(data.warehouse_key(2003, kind)) + '.sdbc'
+    assert os.path.exists(shard)
+    # a later run reads the shard and doesn't parse the text again
+    data._warehouse_records.clear()
+    def fail(*args, **kwargs):
+        raise AssertionError('parsed again')
+    monkeypatch.setattr(data.TextFile, 'open', fail)
+    assert data.warehouse_records(2003, kind) == records
+    monkeypatch.undo()
+    monkeypatch.setattr(data, 'cache', store)
+    # the file is parsed again when a new version of it is stored
+    text = make(2003, seed=1)
+    store.put(data.warehouse_key(2003, kind), text)
+    assert data.warehouse_records(2003, kind) == parse(text, kind)
+    data._warehouse_records.clear()
+    assert data.warehouse_records(2003, kind) == parse(text, kind)
+
+
+def test_warehouse_shard_missing_values(store, monkeypatch):
+    lines = dpd_text(2003).split('\n')
+    days = [i for i, line in enumerate(lines) if line[:4] == '2003']
+    # a k index that isn't a number, and a line cut short in the planetary k indices
+    lines[days[10]] = lines[days[10]].rsplit(' ', 1)[0] + ' *'
+    lines[days[20]] = lines[days[20]].rsplit(' ', 3)[0]
+    text = '\n'.join(lines)
+    store.put(data.warehouse_key(2003, 'DPD'), text)
+    records = data.warehouse_records(2003, 'DPD')
+    assert records == parse(text, 'DPD')
+    day = date(2003, 1, 11)
+    assert records[day].k_planetary[-1] is None and None not in records[day].k_planetary[:-1]
+    assert records[day + timedelta(days=10)].k_planetary[-3:] == (None, None, None)
+    data._warehouse_records.clear()
+    def fail(*args, **kwargs):
+        raise AssertionError('parsed again')
+    monkeypatch.setattr(data.TextFile, 'open', fail)
+    assert data.warehouse_records(2003, 'DPD') == records
+
+
+def test_warehouse_shard_text_format(store):
+    # a shard in the text format is read, or replaced, like a columnar one
+    from database import Database
+    text = dsd_text(2003)
+    store.put(data.warehouse_key(2003, 'DSD'), text)
+    shard = store.path(data.warehouse_key(2003, 'DSD')) + '.sdbc'
+    db = Database(shard, data.warehouse_shard_schema('DSD'), date, 'sdb', parsed_from='old')
+    db.new_row(date(2003, 1, 1)).save()
+    db.save()
+    assert data.warehouse_records(2003, 'DSD') == parse(text, 'DSD')
+    assert Database(shard).fmt == 'sdbc'
+
+
+def test_warehouse_shard_entry(store):
+    # the shard is a cache entry of its own, counted in the cache's size and evicted like the others
+    key = data.warehouse_key(2003, 'DSD')
+    store.put(key, dsd_text(2003))
+    records = data.warehouse_records(2003, 'DSD')
+    shard = store.path(key) + '.sdbc'
+    assert store.stamp(key + '.sdbc')[1] == os.path.getsize(shard)
+    assert store.stats()['bytes'] == os.path.getsize(store.path(key)) + os.path.getsize(shard)
+    store.invalidate(key + '.sdbc')
+    assert not os.path.exists(shard)
+    data._warehouse_records.clear()
+    assert data.warehouse_records(2003, 'DSD') == records
+    assert os.path.exists(shard)
+    store.invalidate(key)
+    assert data.warehouse_records(2003, 'DSD') == {}
@@ -0,0 +1,237 @@
+
+import tracemalloc
+from datetime import date, time
+
+import pytest
+
+from database import Database, RowCache, convert, row_class, from_field, to_field, split_fields, strlist, intlist, timelist
+from synthetic import make_database
+
+
+TRICKY = ['dir\\', 'a,b', 'c:d', '\\\\', '\\,', ',\\', 'x\\:', ':', ',', '\\', 'plain', '']
+
+SCHEMA = {'a': str, 'b': int, 'c': strlist, 'd': intlist, 'e': timelist}
+
+
+@pytest.mark.parametrize('text', TRICKY)
+def test_str_round_trip(text):
+    assert from_field(to_field(text), str) == (text or None)
+
+
+@pytest.mark.parametrize('items', [[text, 'next'] for text in TRICKY] + [['C:\\'], ['\\', '\\'], TRICKY])
+def test_strlist_round_trip(items):
+    assert from_field(to_field(items), strlist) == items
+
+
+def test_split_fields():
+    assert split_fields('dir\\\\,5') == ['dir\\\\', '5']
+    assert split_fields('a\\,b,c') == ['a\\,b', 'c']
+    assert split_fields('a,,b,') == ['a', '', 'b', '']
+    assert split_fields('C\\:\\\\:b', ':') == ['C\\:\\\\', 'b']
+
+
+def make(filename, rows):
+    db = Database(filename, SCHEMA, date)
+    for name, values in rows.items():
+        row = db.new_row(name)
+        for field, value in values.items():
+            row[field] = value
+        row.save()
+    db.save()
+    return db
+
+
+def rows_of(db):
+    return {row.name: {field: row[field] for field in SCHEMA} for row in db.range()}
+
+
+def rows_for(texts):
+    return {date(2020, 1, 1 + i): {'a': text or None, 'b': i, 'c': [text, 'x'], 'd': [i, -i], 'e': [time(i, 30)]} \
+            for i, text in enumerate(texts)}
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_database_round_trip(tmp_path, fmt):
+    filename = str(tmp_path / f'test.{fmt}')
+    rows = rows_for(TRICKY)
+    make(filename, rows)
+    db = Database(filename)
+    assert rows_of(db) == rows
+    assert [row.name for row in Database.scan(filename)] == list(rows)
+    assert {row.name: {field: row[field] for field in SCHEMA} for row in Database.scan(filename)} == rows
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_journal_round_trip(tmp_path, fmt):
+    '''values that end in a backslash are written to the journal too, and read back by a new reader'''
+    filename = str(tmp_path / f'test.{fmt}')
+    make(filename, {date(2019, 12, 31): {'b': 0}})
+    db = Database(filename)
+    rows = rows_for(TRICKY)
+    for name, values in rows.items():
+        row = db.new_row(name)
+        for field, value in values.items():
+            row[field] = value
+        row.save()
+    db.save()
+    assert db.journal_rows == len(rows)
+    rows[date(2019, 12, 31)] = {'a': None, 'b': 0, 'c': None, 'd': None, 'e': None}
+    assert rows_of(Database(filename)) == dict(sorted(rows.items()))
+    assert {row.name: {field: row[field] for field in SCHEMA} for row in Database.scan(filename)} == rows
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_empty_lists_are_none(tmp_path, fmt):
+    '''an empty list reads back as None whether it was compacted, journaled or not saved yet'''
+    filename = str(tmp_path / f'test.{fmt}')
+    empty = {'c': [], 'd': [], 'e': []}
+    make(filename, {date(2020, 1, 1): empty})
+    db = Database(filename)
+    row = db.new_row(date(2020, 1, 2))
+    for field, value in empty.items():
+        row[field] = value
+    row.save()
+    assert [db[date(2020, 1, 2)][field] for field in empty] == [None] * 3
+    db.save()
+    assert db.journal_rows == 1
+    for compact in (False, True):
+        db = Database(filename)
+        if compact:
+            db.compact()
+        for name in (date(2020, 1, 1), date(2020, 1, 2)):
+            assert [db[name][field] for field in empty] == [None] * 3
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_close(tmp_path, fmt):
+    filename = str(tmp_path / f'test.{fmt}')
+    rows = rows_for(['a', 'b'])
+    make(filename, rows)
+    with Database(filename) as db:
+        assert rows_of(db) == rows
+    db.close()
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_index_and_range(tmp_path, fmt):
+    '''rows are found by name or position, and ranges come out in name order whatever order the rows were made in'''
+    filename = str(tmp_path / f'test.{fmt}')
+    days = [date(2020, 1, day) for day in (5, 1, 9, 3, 7)]
+    make(filename, {day: {'b': day.day} for day in days})
+    for db in (Database(filename), make(str(tmp_path / f'new.{fmt}'), {day: {'b': day.day} for day in days})):
+        assert db[date(2020, 1, 9)].b == 9 and db['2020-01-09'].b == 9
+        assert db[0].b == 5 and db[-1].b == 7
+        assert date(2020, 1, 3) in db and date(2020, 1, 4) not in db
+        with pytest.raises(KeyError):
+            db[date(2020, 1, 4)]
+        with pytest.raises(IndexError):
+            db[len(days)]
+        assert [row.b for row in db.range()] == [1, 3, 5, 7, 9]
+        assert [row.b for row in db.range(date(2020, 1, 3), date(2020, 1, 9))] == [3, 5, 7]
+        assert [row.b for row in db.range(date(2020, 1, 4))] == [5, 7, 9]
+        assert [row.b for row in db.range(end=date(2020, 1, 2))] == [1]
+        assert [row.b for row in db[date(2020, 1, 6):]] == [7, 9]
+        assert list(db.range(date(2020, 2, 1))) == []
+        # a row made later goes into its place in the order
+        db.new_row(date(2020, 1, 4)).save()
+        assert [row.name.day for row in db.range(date(2020, 1, 3), date(2020, 1, 6))] == [3, 4, 5]
+
+
+def test_row_cache_lru():
+    cache = RowCache(maxsize=2)
+    cache.row(0)['b'] = 0
+    cache.row(1)['b'] = 1
+    assert cache.row(0) == {'b': 0}
+    # 1 is the least recently used now
+    cache.row(2)
+    assert len(cache) == 2 and list(cache.rows) == [0, 2]
+    assert cache.row(1) == {}
+    assert list(cache.rows) == [2, 1]
+    cache.invalidate(2)
+    assert list(cache.rows) == [1]
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_lazy_rows(tmp_path, fmt):
+    '''fields are decoded on first access and only the ones asked for, the cache of them stays bounded'''
+    filename = str(tmp_path / f'test.{fmt}')
+    make(filename, rows_for([str(i) for i in range(5)]))
+    db = Database(filename)
+    db.cache.maxsize = 3
+    assert [db[i].b for i in range(5)] == list(range(5))
+    assert (db.cache.hits, db.cache.misses, len(db.cache)) == (0, 5, 3)
+    assert db[4].b == 4 and db[0].b == 0
+    assert (db.cache.hits, db.cache.misses, len(db.cache)) == (1, 6, 3)
+    db.cache.invalidate()
+    row = db.get(1, ('a', 'b'))
+    assert db.cache.row(1).keys() == {'a', 'b'}
+    assert row.d == [1, -1] and db.cache.row(1).keys() == {'a', 'b', 'd'}
+    # a write drops the row's cached fields
+    row.b = 10
+    row.save()
+    assert 1 not in db.cache.rows and db[1].b == 10
+
+
+@pytest.mark.parametrize('fmt', ['sdb', 'sdbc'])
+def test_scan(tmp_path, fmt):
+    '''scan decodes only the fields asked for, filters the rows and takes in the journal'''
+    filename = str(tmp_path / f'test.{fmt}')
+    make(filename, rows_for([str(i) for i in range(10)]))
+    db = Database(filename)
+    row = db[3]
+    row.b = 30
+    row.save()
+    db.save()
+    rows = list(Database.scan(filename, ('b',), lambda row: row.b % 2 == 0))
+    assert [row.b for row in rows] == [0, 2, 30, 4, 6, 8]
+    with pytest.raises(AttributeError):
+        rows[0].a
+    chunks = list(Database.scan_chunks(filename, 4, ('b',)))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert [row.b for chunk in chunks for row in chunk] == [0, 1, 2, 30, 4, 5, 6, 7, 8, 9]
+
+
+def peak(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_scan_memory(tmp_path):
+    '''scanning holds a row at a time, not the database'''
+    make_database(str(tmp_path / 'test.sdb'), date(1995, 1, 1), date(2000, 1, 1))
+    convert(str(tmp_path / 'test.sdb'), str(tmp_path / 'test.sdbc'))
+    for fmt in ('sdb', 'sdbc'):
+        filename = str(tmp_path / f'test.{fmt}')
+        loaded = peak(lambda: [row.kp for row in Database(filename).range()])
+        scanned = peak(lambda: sum(1 for row in Database.scan(filename, ('kp',))))
+        assert scanned < loaded / 10, f'{fmt}: scan peaked at {scanned} bytes, loading at {loaded}'
+
+
+def test_row_class(tmp_path):
+    '''rows of a schema share one class with a slot per field and no __dict__'''
+    cls = row_class(tuple(SCHEMA))
+    assert cls is row_class(tuple(SCHEMA)) and cls.__slots__ == tuple(SCHEMA)
+    db = make(str(tmp_path / 'test.sdb'), rows_for(['x']))
+    row = db[0]
+    assert type(row) is cls and not hasattr(row, '__dict__')
+    with pytest.raises(AttributeError):
+        row.other = 1
+    with pytest.raises(AttributeError):
+        row.other
+    with pytest.raises(KeyError):
+        row['other']
+    with pytest.raises(KeyError):
+        row['other'] = 1
+    row['b'] = 5
+    assert row.b == 5 and row['a'] == 'x'
+    # a row made without a database only has the fields it was given
+    loose = cls(None, date(2020, 1, 1), {'b': 1})
+    assert loose.b == 1
+    with pytest.raises(KeyError):
+        loose['a']
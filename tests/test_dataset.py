@@ -0,0 +1,90 @@
+
+import os
+import json
+from datetime import date
+
+import pytest
+
+from database import Database
+from dataset import Dataset
+from synthetic import make_database
+
+
+@pytest.fixture
+def directory(tmp_path):
+    for year in (2001, 2002, 2003):
+        make_database(str(tmp_path / f'{year}.sdb'), date(year, 1, 1), date(year + 1, 1, 1), seed=year)
+    return tmp_path
+
+
+def storms(row):
+    return max(row.kp) >= 21
+
+
+def test_rows(directory):
+    dataset = Dataset(str(directory))
+    start, end = date(2001, 12, 1), date(2003, 2, 1)
+    expected = [row.name for year in (2001, 2002, 2003) for row in \
+                Database(str(directory / f'{year}.sdb')).range(start, end)]
+    assert [row.name for row in dataset.rows(start, end, ('kp',))] == expected
+    assert [row.name for row in dataset.rows(start, end, ('kp',), workers=1)] == expected
+
+
+@pytest.mark.parametrize('where', [storms, lambda row: max(row.kp) >= 21])
+def test_rows_where(directory, where):
+    # a lambda can't be sent to the workers, the shards are read in this process instead
+    dataset = Dataset(str(directory))
+    rows = [(row.name, row.kp) for row in dataset.rows(fields=('kp',), where=where)]
+    assert rows and all(max(kp) >= 21 for _, kp in rows)
+    assert rows == [(row.name, row.kp) for row in dataset.rows(fields=('kp',), where=storms, workers=1)]
+
+
+def test_rows_save(directory):
+    # a row is bound to its shard, the fields it wasn't read with are read from there
+    dataset = Dataset(str(directory))
+    before = Database(str(directory / '2002.sdb')).get(date(2002, 3, 1))
+    row = next(dataset.rows(date(2002, 3, 1), date(2002, 3, 2), ('kp',)))
+    assert row.spots == before.spots
+    row.spots += 1
+    row.save()
+    dataset.save()
+    after = Database(str(directory / '2002.sdb')).get(date(2002, 3, 1))
+    assert after.spots == before.spots + 1
+    assert all(after[field] == before[field] for field in dataset.fields if field != 'spots')
+    assert next(dataset.rows(date(2002, 3, 1), date(2002, 3, 2), ('spots',))).spots == before.spots + 1
+
+
+def test_shards(directory):
+    dataset = Dataset(str(directory))
+    assert len(dataset) == 365 * 3
+    names = lambda start=None, end=None: [os.path.basename(name) for name in dataset.shards(start, end)]
+    assert names() == ['2001.sdb', '2002.sdb', '2003.sdb']
+    assert names(date(2002, 6, 1), date(2002, 7, 1)) == ['2002.sdb']
+    assert names(date(2001, 12, 31), date(2002, 1, 2)) == ['2001.sdb', '2002.sdb']
+    assert names(date(2002, 1, 1)) == ['2002.sdb', '2003.sdb']
+    assert names(end=date(2002, 1, 1)) == ['2001.sdb']
+    assert names(date(2004, 1, 1)) == []
+
+
+def test_manifest(directory, monkeypatch):
+    # shards are opened once to make the manifest, and then only when they change
+    Dataset(str(directory))
+    with open(directory / 'manifest.json', encoding='utf-8') as file:
+        manifest = json.load(file)
+    assert manifest['2002.sdb']['rows'] == 365 and manifest['2002.sdb']['start'] == '2002-01-01'
+    opened = []
+    class Counted(Database):
+        def __init__(self, filename, *args, **kwargs):
+            opened.append(os.path.basename(filename))
+            super().__init__(filename, *args, **kwargs)
+    monkeypatch.setattr('dataset.Database', Counted)
+    assert len(Dataset(str(directory))) == 365 * 3 and opened == []
+    db = Database(str(directory / '2003.sdb'))
+    db.new_row(date(2004, 1, 1)).save()
+    db.save()
+    make_database(str(directory / '2005.sdb'), date(2005, 1, 1), date(2005, 2, 1))
+    os.remove(directory / '2001.sdb')
+    data = Dataset(str(directory))
+    assert sorted(opened) == ['2003.sdb', '2005.sdb']
+    assert len(data) == 365 * 2 + 1 + 31
+    assert [os.path.basename(name) for name in data.shards(date(2004, 1, 1), date(2004, 1, 2))] == ['2003.sdb']
@@ -0,0 +1,156 @@
+
+import os
+import threading
+
+import pytest
+
+import fetch
+from fetch import FTPPool, FetchError, fetch_file, fetch_files, get_ftp_file
+
+pyftpdlib = pytest.importorskip('pyftpdlib')
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import FTPServer
+
+
+FILES = {f'{year}_DSD.txt': os.urandom(200000 + year) for year in range(2000, 2012)}
+
+
+class Handler(FTPHandler):
+    '''an ftp server that can be told to fail the next transfers, the test sets `faults` on the class'''
+
+    def ftp_RETR(self, file):
+        faults = self.faults
+        faults['retr'].append(self._restart_position)
+        if faults['temp']:
+            faults['temp'] -= 1
+            self.respond('451 Requested action aborted: local error in processing.')
+            return
+        if faults['cut']:
+            faults['cut'] -= 1
+            # sends the first half and then says the transfer was aborted
+            with open(file, 'rb') as source:
+                source.seek(self._restart_position)
+                data = source.read()
+            self._restart_position = 0
+            self.aborting = True
+            self.push_dtp_data(data[:len(data) // 2], cmd='RETR')
+            return
+        return super().ftp_RETR(file)
+
+    def ftp_REST(self, line):
+        if self.faults['no_rest']:
+            self.respond('502 Command not implemented.')
+            return
+        return super().ftp_REST(line)
+
+    def respond(self, resp, *args, **kwargs):
+        if resp.startswith('226') and getattr(self, 'aborting', False):
+            self.aborting = False
+            resp = '426 Connection closed; transfer aborted.'
+        super().respond(resp, *args, **kwargs)
+
+    def on_login(self, username):
+        self.faults['logins'] += 1
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / 'ftp'
+    (root / 'pub').mkdir(parents=True)
+    for name, data in FILES.items():
+        (root / 'pub' / name).write_bytes(data)
+    authorizer = DummyAuthorizer()
+    authorizer.add_anonymous(str(root))
+    handler = type('Handler', (Handler,), {'authorizer': authorizer})
+    handler.faults = {'temp': 0, 'cut': 0, 'no_rest': False, 'retr': [], 'logins': 0}
+    ftpd = FTPServer(('127.0.0.1', 0), handler)
+    stop = threading.Event()
+    def run():
+        while not stop.is_set():
+            ftpd.serve_forever(timeout=0.01, blocking=False)
+        ftpd.close_all()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    yield ftpd.address[1], handler.faults
+    stop.set()
+    thread.join()
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    out = []
+    monkeypatch.setattr(fetch, 'sleep', out.append)
+    return out
+
+
+def test_fetch_files(server, tmp_path):
+    port, faults = server
+    files = {f'pub/{name}': str(tmp_path / 'out' / name) for name in FILES}
+    with FTPPool('127.0.0.1', port, size=3) as pool:
+        results = fetch_files(pool, files)
+    assert results == files
+    for name, data in FILES.items():
+        with open(tmp_path / 'out' / name, 'rb') as file:
+            assert file.read() == data
+    # the connections are reused, never more than the pool's size
+    assert 1 <= faults['logins'] <= 3
+
+
+def test_missing_file(server, tmp_path, delays):
+    port, faults = server
+    with FTPPool('127.0.0.1', port) as pool:
+        results = fetch_files(pool, {'pub/missing.txt': str(tmp_path / 'missing.txt'), \
+                                     'pub/2000_DSD.txt': str(tmp_path / '2000_DSD.txt')})
+    # a 5xx reply isn't tried again and doesn't stop the other files
+    assert isinstance(results['pub/missing.txt'], FetchError)
+    assert results['pub/2000_DSD.txt'] == str(tmp_path / '2000_DSD.txt')
+    assert not os.path.exists(tmp_path / 'missing.txt')
+    assert not os.path.exists(tmp_path / 'missing.txt.part')
+    assert delays == []
+
+
+def test_retry_and_backoff(server, tmp_path, delays):
+    port, faults = server
+    faults['temp'] = 3
+    with FTPPool('127.0.0.1', port) as pool:
+        assert get_ftp_file(pool, 'pub/2001_DSD.txt', 'latin-1', retries=3, backoff=2) == FILES['2001_DSD.txt'].decode('latin-1')
+    assert len(faults['retr']) == 4
+    assert len(delays) == 3
+    for attempt, delay in enumerate(delays):
+        assert 2 * 2 ** attempt * 0.5 <= delay <= 2 * 2 ** attempt * 1.5
+
+
+def test_gives_up(server, tmp_path, delays):
+    port, faults = server
+    faults['temp'] = 10
+    with FTPPool('127.0.0.1', port) as pool:
+        with pytest.raises(FetchError):
+            fetch_file(pool, 'pub/2002_DSD.txt', str(tmp_path / '2002_DSD.txt'), retries=2)
+    assert len(faults['retr']) == 3
+    assert len(delays) == 2
+    assert not os.path.exists(tmp_path / '2002_DSD.txt')
+    assert not os.path.exists(tmp_path / '2002_DSD.txt.part')
+
+
+def test_resume(server, tmp_path, delays):
+    port, faults = server
+    faults['cut'] = 2
+    filename = str(tmp_path / '2003_DSD.txt')
+    with FTPPool('127.0.0.1', port) as pool:
+        fetch_file(pool, 'pub/2003_DSD.txt', filename)
+    with open(filename, 'rb') as file:
+        assert file.read() == FILES['2003_DSD.txt']
+    # each try after one that broke off asks only for the rest
+    size = len(FILES['2003_DSD.txt'])
+    assert faults['retr'] == [0, size // 2, size // 2 + (size - size // 2) // 2]
+
+
+def test_resume_not_supported(server, delays):
+    port, faults = server
+    faults['cut'] = 1
+    faults['no_rest'] = True
+    with FTPPool('127.0.0.1', port) as pool:
+        assert get_ftp_file(pool, 'pub/2004_DSD.txt', 'latin-1') == FILES['2004_DSD.txt'].decode('latin-1')
+    # the resumed try is refused before it gets to RETR, so the next one starts over
+    assert faults['retr'] == [0, 0]
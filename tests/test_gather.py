@@ -0,0 +1,120 @@
+
+import threading
+from time import monotonic
+from datetime import date
+
+import pytest
+
+import data
+from cache import CacheStore
+
+
+START, END = date(2020, 1, 1), date(2020, 1, 3)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = CacheStore(str(tmp_path / 'cache'))
+    monkeypatch.setattr(data, 'cache', store)
+    return store
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    '''the sources gather_data fetches, by name, each a cache key and the function that fetches it'''
+    sources = {}
+    monkeypatch.setattr(data, 'source_updates', lambda start, end, refresh=False: \
+                        {name: ([key], func) for name, (key, func) in sources.items()})
+    release = threading.Event()
+    yield sources, release
+    release.set()
+
+
+def test_deadlines(store, sources, monkeypatch):
+    sources, release = sources
+    monkeypatch.setattr(data, 'SOURCE_TIMEOUTS', {'slow': 0.2, 'fast': 5})
+    sources['fast'] = ('fast.txt', lambda: store.put('fast.txt', b'x', 60))
+    sources['slow'] = ('slow.txt', release.wait)
+    started = monotonic()
+    kp_ap, solar, goes, notes = data.gather_data(START, END, timeout=5)
+    # the slow source is given up on after its own timeout, the fast one isn't held up by it
+    assert monotonic() - started < 2
+    assert store.get('fast.txt') == b'x'
+    assert notes == ['slow didn\'t answer in time, using placeholder data']
+    # with nothing cached, the days get placeholders where the cli has them
+    assert kp_ap == solar == {}
+    assert goes and all((day.p1, day.p10, day.e2) == (-1, -1, -1) for day in goes.values())
+
+
+def test_gather_timeout(store, sources, monkeypatch):
+    # no source gets longer than all of them together
+    sources, release = sources
+    monkeypatch.setattr(data, 'SOURCE_TIMEOUTS', {'a': 60, 'b': 60})
+    sources['a'] = ('a.txt', release.wait)
+    sources['b'] = ('b.txt', release.wait)
+    started = monotonic()
+    notes = data.gather_data(START, END, timeout=0.2)[3]
+    assert monotonic() - started < 2
+    assert notes == ['a didn\'t answer in time, using placeholder data', 'b didn\'t answer in time, using placeholder data']
+
+
+def test_failed(store, sources):
+    # a source that fails is answered from the cache even if it expired, with how old it is
+    sources, _ = sources
+    store.put('old.txt', b'x', -1)
+    def fail():
+        raise OSError('no route to host')
+    sources['old'] = ('old.txt', fail)
+    sources['new'] = ('new.txt', fail)
+    notes = data.gather_data(START, END, refresh=True, timeout=5)[3]
+    assert notes[0] == 'old failed (no route to host), using cached data from 0.0 hours ago'
+    assert notes[1] == 'new failed (no route to host), using placeholder data'
+
+
+@pytest.fixture
+def revalidations(monkeypatch):
+    calls = []
+    monkeypatch.setattr(data, 'revalidate_later', lambda: calls.append(True))
+    monkeypatch.setattr(data, 'refresher_running', lambda: False)
+    return calls
+
+
+def test_stale_while_revalidate(store, sources, revalidations):
+    # an expired source that is still cached is answered from the cache and fetched in the background
+    sources, _ = sources
+    store.put('old.txt', b'x', -1)
+    sources['old'] = ('old.txt', lambda: pytest.fail('fetched in the foreground'))
+    assert data.gather_data(START, END, timeout=5)[3] == []
+    assert revalidations == [True]
+
+
+def test_refresher_running(store, sources, revalidations, monkeypatch):
+    # a refresher that is running fetches it, no process is started for it
+    sources, _ = sources
+    monkeypatch.setattr(data, 'refresher_running', lambda: True)
+    store.put('old.txt', b'x', -1)
+    sources['old'] = ('old.txt', lambda: pytest.fail('fetched in the foreground'))
+    assert data.gather_data(START, END, timeout=5)[3] == []
+    assert revalidations == []
+
+
+def test_refresh(store, sources, revalidations):
+    # refresh fetches even the stale sources now
+    sources, _ = sources
+    store.put('old.txt', b'x', -1)
+    sources['old'] = ('old.txt', lambda: store.put('old.txt', b'y', 60))
+    assert data.gather_data(START, END, refresh=True, timeout=5)[3] == []
+    assert store.get('old.txt') == b'y' and revalidations == []
+
+
+def test_revalidate_later(monkeypatch):
+    # the refresher is started once per run, in a session of its own so it outlives the cli
+    import subprocess
+    started = []
+    monkeypatch.setattr(subprocess, 'Popen', lambda args, **kwargs: started.append((args, kwargs)))
+    monkeypatch.setattr(data, '_revalidating', False)
+    data.revalidate_later()
+    data.revalidate_later()
+    assert len(started) == 1
+    args, kwargs = started[0]
+    assert args[1:] == [data.REFRESHER, '--once'] and kwargs['start_new_session']
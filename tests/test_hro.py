@@ -0,0 +1,36 @@
+
+import io
+from datetime import date, timedelta
+
+import pytest
+
+pytest.importorskip('numpy')
+
+import hro
+import data
+from const import Namespace, EARTH, AP
+
+
+def info(kps, aps):
+    return Namespace(kps=tuple(kps), aps=tuple(aps)) + data.solar_placeholder() + data.goes_placeholder()
+
+
+def test_daily():
+    # a day with fewer intervals is aggregated over the ones it has
+    infos = [info(['0', '9+', '5-'], [0, 500, 39]), info(['1', '1', '1+', '1+'], [4, 4, 5, 5])]
+    assert hro.daily(infos) == {
+        'kp': [14, 4], 'kp_min': [0, 3], 'kp_max': [28, 4],
+        'g': [1, 0], 'g_min': [0, 0], 'g_max': [5, 0],
+        'ap': [180, 4], 'ap_min': [0, 4], 'ap_max': [500, 5],
+    }
+
+
+def test_write():
+    first = date(2024, 1, 1)
+    days = ((first + timedelta(days=i), info(['2'] * 8, [7] * 8)) for i in range(hro.CHUNK + 3))
+    out = io.StringIO()
+    hro.write(Namespace(mode=EARTH | AP, data=days), out, nocolor=True)
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith('date')
+    assert len(lines) == hro.CHUNK + 4
+    assert lines[-1].split()[:4] == [(first + timedelta(days=hro.CHUNK + 2)).strftime('%x'), '2', '2', '2']
@@ -0,0 +1,51 @@
+
+import os
+from datetime import date
+
+import pytest
+
+import ingest
+from cache import CacheStore
+from database import Database
+from fetch import FetchError
+from synthetic import gfz_text, dsd_text, dpd_text
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CacheStore(str(tmp_path / 'cache'))
+    cache.put(ingest.GFZ_KEY, gfz_text(date(2003, 1, 1), date(2005, 1, 1)))
+    for year in (2003, 2004):
+        cache.put(ingest.warehouse_key(year, 'DSD'), dsd_text(year))
+        cache.put(ingest.warehouse_key(year, 'DPD'), dpd_text(year))
+    return cache
+
+
+def test_ingest(tmp_path, cache):
+    db_dir = str(tmp_path / 'db')
+    assert ingest.ingest([2003, 2004], db_dir, cache, workers=2) == {2003: 'done', 2004: 'done'}
+    db = Database(os.path.join(db_dir, '2003.sdb'))
+    assert len(db) == 365
+    assert len(db[date(2003, 6, 1)].kp) == 8 and db[date(2003, 6, 1)].f107 is not None
+    # nothing changed, nothing is written
+    assert ingest.ingest([2003, 2004], db_dir, cache, workers=2) == {2003: 'unchanged', 2004: 'unchanged'}
+
+
+def test_failed_year(tmp_path, cache):
+    db_dir = tmp_path / 'db'
+    db_dir.mkdir()
+    (db_dir / '2004.sdb').write_text('garbage\n')
+    out = ingest.ingest([2003, 2004], str(db_dir), cache, workers=2)
+    # the year that failed says why, the other one is done anyway
+    assert out[2003] == 'done'
+    assert out[2004].startswith('failed (DatabaseError: ') and 'no schema' in out[2004]
+
+
+def test_fetch_failed(tmp_path, cache, monkeypatch):
+    def fetch_files(pool, files):
+        return {path: FetchError(f'{path}: 550 not found') for path in files}
+    monkeypatch.setattr(ingest, 'swpc_pool', lambda: None)
+    monkeypatch.setattr(ingest, 'fetch_files', fetch_files)
+    out = ingest.ingest([2003, 2005], str(tmp_path / 'db'), cache, workers=1)
+    assert out[2003] == 'done'
+    assert out[2005] == 'failed (pub/warehouse/2005/2005_DSD.txt: 550 not found; pub/warehouse/2005/2005_DPD.txt: 550 not found)'
@@ -0,0 +1,88 @@
+
+import os
+import sys
+import subprocess
+import multiprocessing
+from time import sleep
+from datetime import date, timedelta
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import predict
+from windows import Windows
+from synthetic import make_database
+from conftest import ROOT
+
+
+class Constant:
+    '''a stand in for the keras model, predicts the same kp for every three hours'''
+
+    def __init__(self, kp: float) -> None:
+        self.kp = kp
+
+    def predict(self, x, verbose=0):
+        return np.full((len(x), 3 * 8), self.kp, dtype=np.float32)
+
+
+def server(directory, model_file, socket_file):
+    predict.serve(socket_file, predict.Predictor(model_file, directory, model=Constant(5 + 1 / 3)))
+
+
+@pytest.fixture
+def home(tmp_path):
+    # the databases up to yesterday, and a model that predicts 3 days past them, like ai.py's by default
+    directory = tmp_path / '.spacew'
+    directory.mkdir()
+    today = date.today()
+    for year in (today.year - 1, today.year):
+        end = min(date(year + 1, 1, 1), today)
+        if date(year, 1, 1) < end:
+            make_database(str(directory / f'{year}.sdb'), date(year, 1, 1), end, seed=year)
+    model_file = str(directory / 'model.keras')
+    predict.save_meta(model_file, Windows(str(directory)))
+    socket_file = str(directory / 'predict.sock')
+    proc = multiprocessing.Process(target=server, args=(str(directory), model_file, socket_file))
+    proc.start()
+    try:
+        while not os.path.exists(socket_file):
+            sleep(0.01)
+        yield tmp_path
+    finally:
+        proc.terminate()
+        proc.join()
+
+
+def cli(home, *args):
+    env = dict(os.environ, HOME=str(home))
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'spacew-old', 'main.py'), *args], env=env, \
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_horizon(tmp_path):
+    model_file = str(tmp_path / 'model.keras')
+    assert predict.horizon(model_file) is None
+    with open(predict.meta_file(model_file), 'w', encoding='utf-8') as file:
+        file.write('{"horizon": 4}')
+    assert predict.horizon(model_file) == 4
+
+
+def row(home, day):
+    # the sources aren't waited for, the days within the forecast get placeholders from them
+    result = cli(home, 'earth', str(day), '--ap', '--nocolor', '--timeout', '0')
+    assert result.returncode == 0, result.stderr
+    return next(line for line in result.stdout.splitlines() if line.startswith(day.strftime('%m/%d/%y')))
+
+
+def test_cli_prints_predictions(home):
+    # kp 5+ every three hours, and its ap
+    line = row(home, date.today() + timedelta(days=2))
+    assert line.split()[1:4] == ['5+', '5+', '5+']
+    assert line.count('5+ 56') == 8
+
+
+def test_cli_past_horizon(home):
+    # the model only reaches 3 days past yesterday
+    line = row(home, date.today() + timedelta(days=3))
+    assert line.split()[1:4] == ['0', '0', '0']
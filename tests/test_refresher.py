@@ -0,0 +1,74 @@
+
+from datetime import date
+
+import pytest
+
+import data
+import refresher
+from cache import CacheStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = CacheStore(str(tmp_path / 'cache'))
+    monkeypatch.setattr(data, 'cache', store)
+    return store
+
+
+def fill(store, ttl=None):
+    '''every source fresh, as if the refresher just ran'''
+    year = date.today().year
+    for name in refresher.INTERVALS:
+        for key in data.source(name, [year])[0]:
+            store.put(key, b'x', ttl)
+
+
+def test_nothing_due(store):
+    fill(store)
+    assert refresher.due() == {}
+
+
+def test_everything_due(store):
+    due = refresher.due()
+    assert set(due) == set(refresher.INTERVALS)
+    year = date.today().year
+    assert due['swpc DSD'][0] == [data.warehouse_key(year, 'DSD')]
+
+
+def test_interval(store, monkeypatch):
+    fill(store)
+    monkeypatch.setitem(refresher.INTERVALS, 'gfz nowcast', 0)
+    assert list(refresher.due()) == ['gfz nowcast']
+
+
+def test_past_year_expired(store):
+    # last year's file was fetched while it was the current year, with the current year's ttl
+    fill(store)
+    year = date.today().year
+    store.put(data.warehouse_key(year - 1, 'DSD'), b'x', -1)
+    store.put(data.warehouse_key(year - 5, 'DSD'), b'x')
+    assert data.expired_warehouse_years('DSD') == [year - 1]
+    assert data.expired_warehouse_years('DPD') == []
+    due = refresher.due()
+    assert list(due) == ['swpc DSD']
+    assert due['swpc DSD'][0] == [data.warehouse_key(year - 1, 'DSD')]
+
+
+def test_past_year_kept(store, monkeypatch):
+    # once it's fetched after its year ended, a file never expires
+    import fetch
+    def fetch_files(pool, files):
+        for filename in files.values():
+            with open(filename, 'wb') as file:
+                file.write(b'x')
+        return {path: filename for path, filename in files.items()}
+    monkeypatch.setattr(fetch, 'swpc_pool', lambda: None)
+    monkeypatch.setattr(fetch, 'fetch_files', fetch_files)
+    year = date.today().year
+    store.put(data.warehouse_key(year - 1, 'DSD'), b'x', -1)
+    keys, func = refresher.due()['swpc DSD']
+    func()
+    index = store._load_index()
+    assert index[data.warehouse_key(year - 1, 'DSD')]['ttl'] is None
+    assert index[data.warehouse_key(year, 'DSD')]['ttl'] == data.WAREHOUSE_TTL
+    assert data.expired_warehouse_years('DSD') == []
@@ -0,0 +1,97 @@
+
+from datetime import date, timedelta
+
+import pytest
+
+pytest.importorskip('numpy')
+
+import rollup
+import database
+from database import Database
+from dataset import Dataset
+from synthetic import make_database
+
+
+@pytest.fixture
+def directory(tmp_path):
+    make_database(str(tmp_path / '2003.sdb'), date(2003, 1, 1), date(2004, 1, 1), seed=3)
+    make_database(str(tmp_path / '2004.sdb'), date(2004, 1, 1), date(2004, 3, 1), seed=4)
+    return tmp_path
+
+
+def built(filename):
+    # the rollups worked out from scratch, as build would write them
+    db = Database(filename)
+    return {'version': rollup.ROLLUP_VERSION, 'fields': list(rollup.fields_of(db))} | rollup.aggregate(db)
+
+
+def without_stamp(state):
+    return {k: v for k, v in state.items() if k != 'stamp'}
+
+
+def edit(db, day, spots):
+    row = db[day] if day in db else db.new_row(day)
+    row.spots = spots
+    row.kp = [spots % 28] * 8
+    row.save()
+
+
+def test_update_matches_build(directory, monkeypatch):
+    filename = str(directory / '2003.sdb')
+    rollup.load(filename)
+    rotation_end = rollup.bounds('rotation', rollup.period('rotation', date(2003, 6, 1)))[1]
+    # the days either side of a month, a rotation and the year's end
+    days = [date(2003, 1, 31), date(2003, 2, 1), rotation_end - timedelta(days=1), rotation_end, date(2003, 12, 31)]
+    def fail(db):
+        raise AssertionError('built again')
+    monkeypatch.setattr(rollup, 'build', fail)
+    db = Database(filename)
+    for i, day in enumerate(days):
+        edit(db, day, 500 + i)
+        db.save()
+        assert without_stamp(rollup.load(filename)) == built(filename)
+    # a compaction folds the journal in, which doesn't change the aggregates
+    edit(db, date(2003, 7, 4), 1000)
+    db.compact()
+    assert without_stamp(rollup.load(filename)) == built(filename)
+
+
+def test_update_new_month(directory, monkeypatch):
+    filename = str(directory / '2004.sdb')
+    rollup.load(filename)
+    monkeypatch.setattr(rollup, 'build', lambda db: pytest.fail('built again'))
+    db = Database(filename)
+    edit(db, date(2004, 3, 1), 42)
+    db.save()
+    state = rollup.load(filename)
+    assert state['month']['2004-03']['rows'] == 1
+    assert without_stamp(state) == built(filename)
+
+
+def test_save_without_hook(directory, monkeypatch):
+    # a process that hasn't imported rollup doesn't update the file, load sees it's out of date
+    filename = str(directory / '2003.sdb')
+    rollup.load(filename)
+    monkeypatch.setattr(database, 'SAVE_HOOKS', [])
+    db = Database(filename)
+    edit(db, date(2003, 5, 5), 777)
+    db.save()
+    monkeypatch.undo()
+    assert rollup.load(filename)['stamp'] == rollup.stamp(filename)
+    assert without_stamp(rollup.load(filename)) == built(filename)
+    assert rollup.load(filename)['month']['2003-05']['spots'][3] >= 777
+
+
+def test_rotation_across_years(directory):
+    # a rotation that spans the end of 2003 is put together from both years' databases
+    dataset = Dataset(str(directory))
+    key = rollup.period('rotation', date(2003, 12, 31))
+    start, end = rollup.bounds('rotation', key)
+    assert start.year == 2003 and end.year == 2004
+    spots = [row.spots for row in dataset.rows(start, end, ('spots',), workers=1)]
+    out = dataset.aggregate('rotation', ('spots',), date(2003, 12, 31), date(2004, 1, 1))['spots']
+    assert list(out) == [key]
+    assert out[key]['rows'] == out[key]['count'] == len(spots) == rollup.BARTELS_DAYS
+    assert (out[key]['sum'], out[key]['min'], out[key]['max']) == (sum(spots), min(spots), max(spots))
+    year = dataset.aggregate('year', ('spots',))['spots']
+    assert year['2003']['sum'] == sum(row.spots for row in Database(str(directory / '2003.sdb')).range())
@@ -0,0 +1,43 @@
+
+import os
+import sys
+import subprocess
+from time import perf_counter
+
+from conftest import ROOT
+from suite import STARTUP_BUDGET
+
+
+MAIN = os.path.join(ROOT, 'spacew-old', 'main.py')
+# modules that take longer to import than the whole cli should, only the paths that use them load them
+HEAVY = ('numpy', 'keras', 'tensorflow', 'requests')
+
+
+def run(home, *args):
+    env = dict(os.environ, HOME=str(home))
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+
+def best(home, *args, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        run(home, *args)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def test_cli_imports(tmp_path):
+    # -X importtime lists every module the cli imports on stderr, --version exits once they're imported
+    result = run(tmp_path, '-X', 'importtime', MAIN, '--version')
+    modules = {line.split('|')[-1].strip() for line in result.stderr.splitlines() if line.startswith('import time:')}
+    assert 'hro' in modules and 'data' in modules
+    for name in HEAVY:
+        assert name not in modules, f'{name} is imported on the cli path'
+    # nor does anything write to the home directory
+    assert not os.path.exists(tmp_path / '.spacew')
+
+
+def test_startup_budget(tmp_path):
+    overhead = best(tmp_path, MAIN, '--version') - best(tmp_path, '-c', 'pass')
+    assert overhead < STARTUP_BUDGET, f'the cli takes {overhead * 1000:.0f}ms longer to start than python'
@@ -0,0 +1,183 @@
+
+import os
+import re
+import json
+import hashlib
+import threading
+import http.server
+
+import pytest
+import requests
+
+from fetch import sync_file
+
+
+class HTTPHandler(http.server.BaseHTTPRequestHandler):
+    '''serves `content` like a web server that does etags and ranges, the test sets the class attributes'''
+
+    content = b''
+    ranges = True
+    requests = []
+
+    def do_GET(self):
+        content = self.content
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        self.requests.append(dict(self.headers))
+        if self.path != '/Kp_ap_since_1932.txt':
+            self.send_error(404)
+            return
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        status, body = 200, content
+        match = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match and self.ranges:
+            start = int(match[1])
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(content)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status, body = 206, content[start:]
+        self.send_response(status)
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{len(content) - 1}/{len(content)}')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', 'Mon, 06 Jan 2025 00:00:00 GMT')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def web(tmp_path):
+    handler = type('HTTPHandler', (HTTPHandler,), {'content': b'', 'ranges': True, 'requests': []})
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    with requests.Session() as session:
+        yield handler, f'http://127.0.0.1:{httpd.server_address[1]}/Kp_ap_since_1932.txt', session
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def lines(first, last):
+    return b''.join(b'%04d 01 01 00.0 %5d\n' % (1932 + i // 2920, i) for i in range(first, last))
+
+
+def read(filename):
+    with open(filename, 'rb') as file:
+        return file.read()
+
+
+def test_sync_appends_tail(web, tmp_path):
+    handler, url, session = web
+    filename = str(tmp_path / 'kp.txt')
+    handler.content = lines(0, 1000)
+    assert sync_file(url, filename, session, overlap=100)
+    assert read(filename) == handler.content
+    # not modified, nothing comes back
+    assert not sync_file(url, filename, session, overlap=100)
+    assert handler.requests[-1]['If-None-Match']
+    size = len(handler.content)
+    handler.content += lines(1000, 1010)
+    assert sync_file(url, filename, session, overlap=100)
+    assert read(filename) == handler.content
+    # only the overlap and the new tail were asked for
+    assert handler.requests[-1]['Range'] == f'bytes={size - 100}-'
+    assert len(handler.requests) == 3
+    with open(filename + '.sync', 'r', encoding='utf-8') as file:
+        assert json.load(file)['size'] == len(handler.content)
+
+
+def test_sync_resumes_from_copy(web, tmp_path):
+    '''a copy that was synced before picks up from where it ends, however far behind it is'''
+    handler, url, session = web
+    filename = str(tmp_path / 'kp.txt')
+    handler.content = lines(0, 500)
+    sync_file(url, filename, session, overlap=100)
+    for last in (600, 2000, 2001):
+        size = len(handler.content)
+        handler.content = lines(0, last)
+        assert sync_file(url, filename, session, overlap=100)
+        assert read(filename) == handler.content
+        assert handler.requests[-1]['Range'] == f'bytes={size - 100}-'
+
+
+def test_sync_same_bytes(web, tmp_path):
+    '''a server that says the file changed when its bytes didn't'''
+    handler, url, session = web
+    filename = str(tmp_path / 'kp.txt')
+    handler.content = lines(0, 100)
+    sync_file(url, filename, session, overlap=100)
+    with open(filename + '.sync', 'r+', encoding='utf-8') as file:
+        state = json.load(file)
+        state['etag'] = '"old"'
+        file.seek(0)
+        file.truncate()
+        json.dump(state, file)
+    assert not sync_file(url, filename, session, overlap=100)
+    assert handler.requests[-1]['Range'] == f'bytes={len(handler.content) - 100}-'
+
+
+def test_sync_overlap_changed(web, tmp_path):
+    handler, url, session = web
+    filename = str(tmp_path / 'kp.txt')
+    handler.content = lines(0, 1000)
+    sync_file(url, filename, session, overlap=100)
+    # a correction near the end, inside the overlap, and new lines after it
+    handler.content = handler.content[:-50] + b'X' * 50 + lines(1000, 1010)
+    assert sync_file(url, filename, session, overlap=100)
+    assert read(filename) == handler.content
+    assert 'Range' in handler.requests[-2] and 'Range' not in handler.requests[-1]
+
+
+def test_sync_shorter(web, tmp_path):
+    '''a file that got shorter than where the range starts gives 416, and is fetched again whole'''
+    handler, url, session = web
+    filename = str(tmp_path / 'kp.txt')
+    handler.content = lines(0, 1000)
+    sync_file(url, filename, session, overlap=100)
+    handler.content = lines(0, 10)
+    assert sync_file(url, filename, session, overlap=100)
+    assert read(filename) == handler.content
+    assert 'Range' not in handler.requests[-1]
+
+
+def test_sync_without_ranges(web, tmp_path):
+    handler, url, session = web
+    handler.ranges = False
+    filename = str(tmp_path / 'kp.txt')
+    handler.content = lines(0, 1000)
+    sync_file(url, filename, session, overlap=100)
+    handler.content += lines(1000, 1010)
+    assert sync_file(url, filename, session, overlap=100)
+    assert read(filename) == handler.content
+    # the 200 to the range request is used as is, it isn't asked for again
+    assert 'Range' in handler.requests[-1]
+
+
+def test_sync_local_copy_changed(web, tmp_path):
+    '''a copy that isn't the size the last sync left it is fetched again whole'''
+    handler, url, session = web
+    filename = str(tmp_path / 'kp.txt')
+    handler.content = lines(0, 1000)
+    sync_file(url, filename, session, overlap=100)
+    with open(filename, 'ab') as file:
+        file.write(b'half a li')
+    assert sync_file(url, filename, session, overlap=100)
+    assert read(filename) == handler.content
+    assert 'Range' not in handler.requests[-1]
+
+
+def test_sync_error(web, tmp_path):
+    handler, url, session = web
+    filename = str(tmp_path / 'kp.txt')
+    with pytest.raises(requests.HTTPError):
+        sync_file(url.replace('Kp_ap', 'missing'), filename, session)
+    assert not os.path.exists(filename)
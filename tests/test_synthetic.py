@@ -0,0 +1,55 @@
+
+from datetime import date
+
+from database import Database
+from spacew_db import SCHEMA
+from textdata import TextFile, GFZ_KP, SWPC_DSD, SWPC_DPD
+from synthetic import KP_AP, days_of, synthetic_rows, make_database, gfz_text, dsd_text, dpd_text
+
+
+START, END = date(2003, 12, 25), date(2004, 1, 5)
+
+
+def test_days_of():
+    assert days_of(3, date(2025, 1, 1)) == (date(2022, 1, 1), date(2025, 1, 1))
+    assert days_of(1)[1] == date(date.today().year + 1, 1, 1)
+
+
+def test_rows():
+    rows = list(synthetic_rows(START, END, seed=1))
+    assert [day for day, _ in rows] == [date.fromordinal(START.toordinal() + i) for i in range((END - START).days)]
+    # the same seed gives the same data, another seed other data
+    assert rows == list(synthetic_rows(START, END, seed=1))
+    assert rows != list(synthetic_rows(START, END, seed=2))
+    for _, fields in rows:
+        assert fields.keys() == SCHEMA.keys()
+        assert len(fields['kp']) == len(fields['ap']) == 8 and fields['ap'] == [KP_AP[kp] for kp in fields['kp']]
+        assert len({len(fields[field]) for field in ('regions', 'region_spots', 'region_mags', 'region_locs')}) == 1
+        assert len({len(fields[field]) for field in ('flares', 'flare_regions', 'flare_starts')}) == 1
+        assert len(fields['wind_speed']) == 24
+
+
+def test_make_database(tmp_path):
+    filename = str(tmp_path / 'test.sdb')
+    make_database(filename, START, END, seed=1)
+    db = Database(filename)
+    rows = dict(synthetic_rows(START, END, seed=1))
+    assert len(db) == len(rows)
+    for row in db.range():
+        # empty lists read back as None
+        assert {field: row[field] for field in SCHEMA} == {field: value or None if isinstance(value, list) else value \
+                                                         for field, value in rows[row.name].items()}
+
+
+def test_texts():
+    with TextFile(gfz_text(START, END), GFZ_KP) as file:
+        records = list(file.records())
+    assert len(records) == 8 * (END - START).days
+    assert (records[0].date, records[-1].date) == (START, date(2004, 1, 4))
+    assert all(KP_AP[round(record.kp * 3)] == record.ap for record in records)
+    for make, fmt in ((dsd_text, SWPC_DSD), (dpd_text, SWPC_DPD)):
+        assert make(2004) == make(2004) != make(2004, seed=1)
+        with TextFile(make(2004), fmt) as file:
+            records = list(file.records())
+        assert len(records) == 366 and records[-1].date == date(2004, 12, 31)
+        assert None not in records[0]
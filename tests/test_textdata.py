@@ -0,0 +1,72 @@
+
+from datetime import date, timedelta
+
+import pytest
+
+from spacew_db import load_txt_data
+from textdata import TextFile, GFZ_KP, SWPC_DSD, SWPC_DPD, CHUNK
+from synthetic import gfz_text, dsd_text, dpd_text
+
+
+GFZ_START, GFZ_END = date(2000, 1, 1), date(2003, 1, 1)
+RANGES = [
+    (date(2000, 1, 1), date(2000, 1, 2)),
+    (date(2000, 12, 31), date(2001, 1, 2)),
+    (date(2001, 2, 28), date(2002, 7, 19)),
+    (date(2002, 12, 1), date(2002, 12, 31)),
+]
+
+
+@pytest.fixture(scope='module')
+def gfz():
+    text = gfz_text(GFZ_START, GFZ_END)
+    assert len(text) > 4 * CHUNK
+    return text
+
+
+@pytest.mark.parametrize('start, end', RANGES)
+def test_gfz_lines(gfz, tmp_path, start, end):
+    # the same lines as the old parser, from memory and from a memory map
+    expected = load_txt_data(gfz, start, end, GFZ_START, 8)
+    filename = tmp_path / 'kp.txt'
+    filename.write_text(gfz)
+    with TextFile(gfz, GFZ_KP) as data, TextFile.open(str(filename), GFZ_KP) as mapped:
+        for file in (data, mapped):
+            assert [tokens for _, tokens in file.lines(start, end)] == expected
+            records = list(file.records(start, end))
+            assert [(record.date, record.kp, record.ap) for record in records] == \
+                   [(date(*map(int, tokens[:3])), float(tokens[7]), int(tokens[8])) for tokens in expected]
+
+
+@pytest.mark.parametrize('make, fmt', [(dsd_text, SWPC_DSD), (dpd_text, SWPC_DPD)])
+def test_swpc_lines(make, fmt):
+    text = make(2004)
+    with TextFile(text, fmt) as file:
+        assert (file.first(), file.last()) == (date(2004, 1, 1), date(2004, 12, 31))
+        for start, end in ((date(2004, 1, 1), date(2004, 1, 31)), (date(2004, 2, 28), date(2004, 3, 2)), \
+                           (date(2004, 6, 1), date(2004, 12, 31))):
+            assert [tokens for _, tokens in file.lines(start, end)] == load_txt_data(text, start, end, date(2004, 1, 1))
+        assert len(list(file.lines())) == 366
+
+
+def test_gaps():
+    # days missing from the file, the range starts at the next day that's there
+    lines = dsd_text(2004).split('\n')
+    text = '\n'.join(line for line in lines if not line.startswith(('2004 03', '2004 12 31')))
+    with TextFile(text, SWPC_DSD) as file:
+        assert [day for day, _ in file.lines(date(2004, 2, 28), date(2004, 4, 2))] == \
+               [date(2004, 2, 28), date(2004, 2, 29), date(2004, 4, 1)]
+        assert list(file.lines(date(2004, 3, 5), date(2004, 3, 20))) == []
+        assert list(file.lines(date(2004, 12, 31))) == []
+        assert list(file.lines(date(2004, 5, 1), date(2004, 5, 1))) == []
+        assert file.last() == date(2004, 12, 30)
+        assert file.offset(date(2004, 3, 1)) == file.offset(date(2004, 4, 1))
+
+
+def test_empty(tmp_path):
+    filename = tmp_path / 'empty.txt'
+    filename.write_bytes(b'')
+    for file in (TextFile.open(str(filename), GFZ_KP), TextFile(':Product: header only\n#\n', SWPC_DSD)):
+        with file:
+            assert file.first() is None and file.last() is None
+            assert list(file.records()) == [] and list(file.lines(date(2000, 1, 1) + timedelta(days=1))) == []
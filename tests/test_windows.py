@@ -0,0 +1,66 @@
+
+import math
+from datetime import date
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import windows
+from windows import Windows
+from database import Database
+from synthetic import make_database
+
+
+HISTORY, HORIZON = 5, 2
+
+
+@pytest.fixture
+def directory(tmp_path):
+    make_database(str(tmp_path / '2003.sdb'), date(2003, 11, 1), date(2004, 1, 1), seed=3)
+    make_database(str(tmp_path / '2004.sdb'), date(2004, 1, 1), date(2004, 2, 1), seed=4)
+    return tmp_path
+
+
+def epoch(directory, **kwargs):
+    kwargs = {'history': HISTORY, 'horizon': HORIZON, 'batch_size': 16} | kwargs
+    return [(x.copy(), y.copy()) for x, y in Windows(str(directory), **kwargs).batches()]
+
+
+def test_flare_flux():
+    assert windows.flare_flux('M2.5') == pytest.approx(2.5e-5)
+    assert windows.flare_flux('X10') == pytest.approx(1e-3)
+    assert math.isnan(windows.flare_flux('')) and math.isnan(windows.flare_flux('Q1'))
+
+
+def test_shapes(directory):
+    data = Windows(str(directory), history=HISTORY, horizon=HORIZON, batch_size=16, shuffle=0)
+    batches = epoch(directory, shuffle=0)
+    features = len(data.names)
+    for x, y in batches:
+        assert x.dtype == y.dtype == np.float32
+        assert x.shape[1:] == (HISTORY, features) and y.shape == (len(x), HORIZON * 8)
+    assert [len(x) for x, _ in batches[:-1]] == [16] * (len(batches) - 1)
+    # every day has its kps, so every window of consecutive days is used, across the end of the year too
+    days = (date(2004, 2, 1) - date(2003, 11, 1)).days
+    assert sum(len(x) for x, _ in batches) == data.samples == days - HISTORY - HORIZON + 1
+    assert len(batches) == len(data)
+    # in date order, the first window's targets are the kps of the days after its history
+    kps = [row.kp for row in Database(str(directory / '2003.sdb')).range()][HISTORY:HISTORY + HORIZON]
+    assert batches[0][1][0].tolist() == pytest.approx([kp / 3 for day in kps for kp in day])
+
+
+def test_shuffle(directory):
+    ordered = epoch(directory, shuffle=0)
+    a = epoch(directory, shuffle=32, seed=1)
+    b = epoch(directory, shuffle=32, seed=1)
+    c = epoch(directory, shuffle=32, seed=2)
+    # the same seed gives the same order, another seed another one
+    assert all(np.array_equal(xa, xb) and np.array_equal(ya, yb) for (xa, ya), (xb, yb) in zip(a, b))
+    assert len(a) == len(b)
+    assert not all(np.array_equal(ya, yc) for (_, ya), (_, yc) in zip(a, c))
+    # and every window comes out once
+    def windows_of(batches):
+        return sorted(x.tobytes() + y.tobytes() for xs, ys in batches for x, y in zip(xs, ys))
+    assert windows_of(a) == windows_of(ordered) == windows_of(c)
+    assert [y.tobytes() for _, ys in a for y in ys] != [y.tobytes() for _, ys in ordered for y in ys]